@@ -2,9 +2,10 @@ from fastapi import APIRouter, Depends
 from app.core.db import db
 from app.deps.auth_deps import require_role
 from app.repositories.agents_repo import AgentsRepository
-from app.models.agent_models import AgentCreate
+from app.models.agent_models import AgentCreate, AgentSchedule
+from app.utils.bson_json import MongoJSONRoute
 
-router = APIRouter(prefix="/agents", tags=["Agents"])
+router = APIRouter(prefix="/agents", tags=["Agents"], route_class=MongoJSONRoute)
 
 
 def get_repo():
@@ -12,15 +13,20 @@ def get_repo():
 
 
 @router.post("/")
-def create_agent(payload: AgentCreate, _user=Depends(require_role("staff")), repo=Depends(get_repo)):
-    return repo.create(payload.model_dump())
+async def create_agent(payload: AgentCreate, _user=Depends(require_role("staff")), repo=Depends(get_repo)):
+    return await repo.create(payload.model_dump())
 
 
 @router.get("/{agent_id}")
-def get_agent(agent_id: str, _user=Depends(require_role("staff")), repo=Depends(get_repo)):
-    return repo.get_by_id(agent_id)
+async def get_agent(agent_id: str, _user=Depends(require_role("staff")), repo=Depends(get_repo)):
+    return await repo.get_by_id(agent_id)
+
+
+@router.put("/{agent_id}/schedule")
+async def update_agent_schedule(agent_id: str, payload: AgentSchedule, _user=Depends(require_role("staff")), repo=Depends(get_repo)):
+    return await repo.update_schedule(agent_id, payload.model_dump())
 
 
 @router.get("/")
-def list_agents(_user=Depends(require_role("staff")), repo=Depends(get_repo)):
-    return repo.list_active()
+async def list_agents(_user=Depends(require_role("staff")), repo=Depends(get_repo)):
+    return await repo.list_active()
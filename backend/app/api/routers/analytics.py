@@ -1,61 +1,121 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
 from fastapi import APIRouter, Depends, HTTPException
 from app.core.db import db
 from app.deps.auth_deps import require_role
+from app.repositories.kpi_counters_repo import KpiCountersRepository, counters_as_rows
+from app.services.heatmap_service import (
+    DEFAULT_ZOOM,
+    binned_heatmap,
+    parse_bbox,
+    parse_status_in,
+    zoom_to_cell_deg,
+)
+from app.services.heatmap_tile_cache import MAX_TILES_PER_REQUEST, heatmap_tile_cache, tile_count
+from app.services.sla_analytics import sla_compliance
+from app.services.sla_service import naive_utc
+from app.utils.bson_json import MongoJSONRoute
 
-router = APIRouter(prefix="/analytics", tags=["Analytics"])
+router = APIRouter(prefix="/analytics", tags=["Analytics"], route_class=MongoJSONRoute)
 
 
 # ----------------------------
 # KPIs (STAFF ONLY)
 # ----------------------------
+def get_counters_repo() -> KpiCountersRepository:
+    return KpiCountersRepository(db.kpi_counters)
+
+
 @router.get("/kpis")
-def kpis(_user=Depends(require_role("staff"))):
-    total = db.service_requests.count_documents({})
-    by_status = list(
-        db.service_requests.aggregate([
-            {"$group": {"_id": "$status", "count": {"$sum": 1}}}
-        ])
-    )
+async def kpis(_user=Depends(require_role("staff")), counters: KpiCountersRepository = Depends(get_counters_repo)):
+    doc = await counters.get()
+    if not counters.is_current(doc):
+        # first read on a fresh deployment (or after a new dimension): build the counters once
+        doc = (await counters.rebuild(db.service_requests))["counters"]
 
     return {
-        "total_requests": total,
-        "by_status": by_status,
+        "total_requests": int(doc.get("total", 0)),
+        "by_status": counters_as_rows(doc.get("by_status")),
+        "by_priority": counters_as_rows(doc.get("by_priority")),
+        "by_category": counters_as_rows(doc.get("by_category")),
+        "by_zone": counters_as_rows(doc.get("by_zone")),
+        "by_sla_state": counters_as_rows(doc.get("by_sla_state")),
     }
 
 
+@router.post("/kpis/reconcile")
+async def reconcile_kpis(_user=Depends(require_role("staff")), counters: KpiCountersRepository = Depends(get_counters_repo)):
+    """
+    Rebuild KPI counters from service_requests and report drift.
+    """
+    return await counters.rebuild(db.service_requests)
+
+
+# ----------------------------
+# SLA COMPLIANCE (STAFF ONLY)
+# ----------------------------
+@router.get("/sla/compliance")
+async def sla_compliance_report(
+    group_by: str = "category",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    _user=Depends(require_role("staff")),
+):
+    """
+    SLA compliance of requests created in [start, end) (default: last 30 days),
+    grouped by category, zone or priority. Offset-aware params are taken as UTC.
+    """
+    end = naive_utc(end) if end else datetime.utcnow()
+    start = naive_utc(start) if start else end - timedelta(days=30)
+    return await sla_compliance(db.service_requests, start, end, group_by)
+
+
 # ----------------------------
 # HEATMAP (PUBLIC)
 # ----------------------------
 @router.get("/geofeeds/heatmap")
-def heatmap():
+async def heatmap(
+    status_in: str = "",
+    zoom: int = DEFAULT_ZOOM,
+    resolution: Optional[float] = None,
+    bbox: str = "",
+):
     """
-    Returns [[lat, lng, weight], ...]
+    Returns [[lat, lng, weight], ...] with one entry per grid cell.
+    - status_in: comma separated statuses (empty = all)
+    - zoom: map zoom level, sets the cell size (ignored when resolution is given)
+    - resolution: explicit cell size in degrees
+    - bbox: min_lng,min_lat,max_lng,max_lat
+    zoom + bbox requests are served from the tile cache.
     """
-    points = []
+    if resolution is not None and resolution <= 0:
+        raise HTTPException(status_code=400, detail="resolution must be > 0")
+    cell_deg = resolution or zoom_to_cell_deg(zoom)
+    statuses = parse_status_in(status_in)
+    box = parse_bbox(bbox)
 
-    cursor = db.service_requests.find(
-        {"location.coordinates": {"$size": 2}},
-        {"location.coordinates": 1, "priority": 1}
-    )
+    if resolution is None and box is not None and tile_count(zoom, box) <= MAX_TILES_PER_REQUEST:
+        points = await heatmap_tile_cache.heatmap(db.service_requests, zoom, statuses, box)
+    else:
+        points = await binned_heatmap(db.service_requests, cell_deg=cell_deg, statuses=statuses, bbox=box)
 
-    for r in cursor:
-        lng, lat = r["location"]["coordinates"]
-        weight = 1
-        if r.get("priority") == "P1":
-            weight = 3
-        elif r.get("priority") == "P2":
-            weight = 2
+    return {"points": points, "cell_deg": cell_deg}
 
-        points.append([lat, lng, weight])
 
-    return {"points": points}
+@router.get("/geofeeds/heatmap/cache")
+async def heatmap_cache_stats(_user=Depends(require_role("staff"))):
+    """
+    Tile cache hit/miss counters (per process).
+    """
+    return heatmap_tile_cache.stats()
 
 
 # ----------------------------
 # COHORTS (STAFF ONLY – stub)
 # ----------------------------
 @router.get("/cohorts")
-def cohorts(_user=Depends(require_role("staff"))):
+async def cohorts(_user=Depends(require_role("staff"))):
     return {"message": "Cohorts analytics stub"}
 
 
@@ -63,5 +123,5 @@ def cohorts(_user=Depends(require_role("staff"))):
 # AGENTS (STAFF ONLY – stub)
 # ----------------------------
 @router.get("/agents")
-def agents(_user=Depends(require_role("staff"))):
+async def agents(_user=Depends(require_role("staff"))):
     return {"message": "Agents analytics stub"}
@@ -2,19 +2,31 @@ from fastapi import APIRouter, Depends
 from app.core.db import db
 from app.deps.auth_deps import require_role
 from app.repositories.requests_assignment_repo import RequestsAssignmentRepository
+from app.models.request_models import BatchAutoAssignPayload
+from app.utils.bson_json import MongoJSONRoute
 
-router = APIRouter(prefix="/requests", tags=["Assignment"])
+router = APIRouter(prefix="/requests", tags=["Assignment"], route_class=MongoJSONRoute)
 
 
 def get_repo():
-    return RequestsAssignmentRepository(db.service_requests, db.service_agents, db.performance_logs)
+    return RequestsAssignmentRepository(db.service_requests, db.service_agents, db.performance_logs, db.kpi_counters)
+
+
+@router.post("/auto-assign/batch")
+async def auto_assign_batch(payload: BatchAutoAssignPayload, _user=Depends(require_role("staff")), repo=Depends(get_repo)):
+    return await repo.auto_assign_batch(payload.request_ids or None, zone_id=payload.zone_id, limit=payload.limit)
 
 
 @router.post("/{request_id}/auto-assign")
-def auto_assign(request_id: str, _user=Depends(require_role("staff")), repo=Depends(get_repo)):
-    return repo.auto_assign(request_id)
+async def auto_assign(request_id: str, mode: str = "zone", _user=Depends(require_role("staff")), repo=Depends(get_repo)):
+    """
+    mode=zone: coverage zones + skills, least loaded agent.
+    mode=geo: agents whose coverage.geo_fence contains (or is nearest to) the
+    request location, ranked by workload and distance; falls back to zone.
+    """
+    return await repo.auto_assign(request_id, mode=mode)
 
 
 @router.post("/{request_id}/assign/{agent_id}")
-def assign_to_agent(request_id: str, agent_id: str, _user=Depends(require_role("staff")), repo=Depends(get_repo)):
-    return repo.set_assigned_agent(request_id, agent_id)
+async def assign_to_agent(request_id: str, agent_id: str, _user=Depends(require_role("staff")), repo=Depends(get_repo)):
+    return await repo.set_assigned_agent(request_id, agent_id)
@@ -1,23 +1,31 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from app.models.user_models import UserLogin
-from app.core.security import verify_password, create_access_token
+from app.core.app_config import settings
+from app.core.rate_limit import client_ip, login_rate_limiter
+from app.core.security import create_access_token, password_hasher
 from app.repositories.users_repo import UsersRepository
 from app.core.db import db
+from app.utils.bson_json import MongoJSONRoute
 
-router = APIRouter(prefix="/auth", tags=["Auth"])
+router = APIRouter(prefix="/auth", tags=["Auth"], route_class=MongoJSONRoute)
 repo = UsersRepository(db.users)
 
 
 @router.post("/staff/login")
-def staff_login(data: UserLogin):
-    user = repo.find_by_email(data.email)
+async def staff_login(data: UserLogin, request: Request):
+    login_rate_limiter.check(data.email, client_ip(request, settings.TRUSTED_PROXY_HOPS))
+
+    user = await repo.find_by_email(data.email)
 
     if not user or user.get("role") != "staff":
         raise HTTPException(status_code=401, detail="Invalid staff credentials")
 
-    if not verify_password(data.password, user["password_hash"]):
+    # bcrypt runs on its own bounded pool, not the shared threadpool
+    if not await password_hasher.verify(data.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid staff credentials")
 
+    login_rate_limiter.succeeded(data.email)
+
     token = create_access_token({
         "sub": str(user["_id"]),
         "role": "staff"
@@ -6,8 +6,10 @@ import random, hashlib
 from bson import ObjectId
 from app.core.db import db
 from app.models.user_models import CitizenCreate
+from app.services.display_name_cache import display_name_cache
+from app.utils.bson_json import MongoJSONRoute
 
-router = APIRouter(prefix="/citizens", tags=["Citizens"])
+router = APIRouter(prefix="/citizens", tags=["Citizens"], route_class=MongoJSONRoute)
 
 OTP_EXPIRE_MINUTES = 5
 OTP_MAX_ATTEMPTS = 5
@@ -24,7 +26,7 @@ def _oid(s: str):
     return ObjectId(s)
 
 @router.post("")
-def create_or_update_citizen(
+async def create_or_update_citizen(
     payload: CitizenCreate,
     x_citizen_id: str | None = Header(default=None, alias="X-Citizen-Id"),
 ):
@@ -48,16 +50,15 @@ def create_or_update_citizen(
     # Update existing
     if x_citizen_id:
         oid = _oid(x_citizen_id)
-        existing = db.citizens.find_one({"_id": oid})
+        existing = await db.citizens.find_one({"_id": oid})
         if not existing:
             raise HTTPException(status_code=404, detail="Citizen not found")
 
-        db.citizens.update_one({"_id": oid}, {"$set": doc})
-        c = db.citizens.find_one({"_id": oid})
+        await db.citizens.update_one({"_id": oid}, {"$set": doc})
+        display_name_cache.invalidate_doc(existing)
+        c = await db.citizens.find_one({"_id": oid})
         if not c:
             raise HTTPException(status_code=404, detail="Citizen not found")
-
-        c["_id"] = str(c["_id"])
         return {"citizen_id": str(oid), "citizen": c}
 
     # Create new
@@ -68,23 +69,21 @@ def create_or_update_citizen(
     }
     doc["created_at"] = _now()
 
-    res = db.citizens.insert_one(doc)
-    return {"citizen_id": str(res.inserted_id), "citizen": {**doc, "_id": str(res.inserted_id)}}
+    res = await db.citizens.insert_one(doc)
+    return {"citizen_id": str(res.inserted_id), "citizen": doc}
 
 @router.get("/me")
-def get_me(x_citizen_id: str | None = Header(default=None, alias="X-Citizen-Id")):
+async def get_me(x_citizen_id: str | None = Header(default=None, alias="X-Citizen-Id")):
     if not x_citizen_id:
         raise HTTPException(status_code=400, detail="Missing X-Citizen-Id")
 
-    c = db.citizens.find_one({"_id": _oid(x_citizen_id)})
+    c = await db.citizens.find_one({"_id": _oid(x_citizen_id)})
     if not c:
         raise HTTPException(status_code=404, detail="Citizen not found")
-
-    c["_id"] = str(c["_id"])
     return c
 
 @router.post("/otp/send")
-def otp_send(
+async def otp_send(
     channel: str = "email",
     x_citizen_id: str | None = Header(default=None, alias="X-Citizen-Id"),
 ):
@@ -92,7 +91,7 @@ def otp_send(
         raise HTTPException(status_code=400, detail="Missing X-Citizen-Id")
 
     oid = _oid(x_citizen_id)
-    citizen = db.citizens.find_one({"_id": oid})
+    citizen = await db.citizens.find_one({"_id": oid})
     if not citizen:
         raise HTTPException(status_code=404, detail="Citizen not found")
 
@@ -110,7 +109,7 @@ def otp_send(
     code = f"{random.randint(0, 999999):06d}"
     expires_at = _now() + timedelta(minutes=OTP_EXPIRE_MINUTES)
 
-    db.citizens.update_one(
+    await db.citizens.update_one(
         {"_id": oid},
         {"$set": {
             "otp": {
@@ -137,7 +136,7 @@ def otp_send(
     }
 
 @router.post("/otp/verify")
-def otp_verify(
+async def otp_verify(
     code: str,
     x_citizen_id: str | None = Header(default=None, alias="X-Citizen-Id"),
 ):
@@ -145,7 +144,7 @@ def otp_verify(
         raise HTTPException(status_code=400, detail="Missing X-Citizen-Id")
 
     oid = _oid(x_citizen_id)
-    citizen = db.citizens.find_one({"_id": oid})
+    citizen = await db.citizens.find_one({"_id": oid})
     if not citizen:
         raise HTTPException(status_code=404, detail="Citizen not found")
 
@@ -161,10 +160,10 @@ def otp_verify(
         raise HTTPException(status_code=400, detail="Too many attempts")
 
     if _hash_code(code.strip()) != otp.get("code_hash"):
-        db.citizens.update_one({"_id": oid}, {"$inc": {"otp.attempts": 1}, "$set": {"updated_at": _now()}})
+        await db.citizens.update_one({"_id": oid}, {"$inc": {"otp.attempts": 1}, "$set": {"updated_at": _now()}})
         raise HTTPException(status_code=400, detail="Invalid OTP")
 
-    db.citizens.update_one(
+    await db.citizens.update_one(
         {"_id": oid},
         {"$set": {
             "verification.state": "verified",
@@ -173,10 +172,9 @@ def otp_verify(
             "updated_at": _now(),
         }, "$unset": {"otp": ""}},
     )
+    display_name_cache.invalidate_doc(citizen)
 
-    updated = db.citizens.find_one({"_id": oid})
+    updated = await db.citizens.find_one({"_id": oid})
     if not updated:
         raise HTTPException(status_code=404, detail="Citizen not found")
-
-    updated["_id"] = str(updated["_id"])
     return {"ok": True, "citizen": updated}
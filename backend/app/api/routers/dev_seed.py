@@ -1,17 +1,18 @@
 from fastapi import APIRouter, HTTPException
 from app.core.db import db
 from app.repositories.users_repo import UsersRepository
+from app.utils.bson_json import MongoJSONRoute
 
-router = APIRouter(prefix="/dev", tags=["Dev"])
+router = APIRouter(prefix="/dev", tags=["Dev"], route_class=MongoJSONRoute)
 
 @router.post("/seed-staff")
-def seed_staff():
+async def seed_staff():
     repo = UsersRepository(db.users)
 
     email = "admin@cst.local"
-    exists = repo.find_by_email(email)
+    exists = await repo.find_by_email(email)
     if exists:
         return {"ok": True, "message": "Staff already exists", "email": email}
 
-    user = repo.create_staff("Admin", email, "admin123")
+    user = await repo.create_staff("Admin", email, "admin123")
     return {"ok": True, "email": email, "password": "admin123", "user_id": user["_id"]}
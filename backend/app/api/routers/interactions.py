@@ -2,63 +2,36 @@
 
 from fastapi import APIRouter, Depends, HTTPException
 from datetime import datetime
-from bson import ObjectId
 
 from app.core.db import db
 from app.deps.auth_deps import require_role
 from app.models.interaction_models import AddComment, AddRating
 from app.utils.objectid import validate_object_id
 from app.repositories.performance_logs_repo import PerformanceLogsRepository
+from app.services.display_name_cache import display_name_cache
+from app.utils.bson_json import MongoJSONRoute
 
-router = APIRouter(prefix="/requests", tags=["Interactions"])
+router = APIRouter(prefix="/requests", tags=["Interactions"], route_class=MongoJSONRoute)
 
 
 def get_logs_repo():
     return PerformanceLogsRepository(db.performance_logs)
 
 
-def _safe_find_display_name(citizen_id: str) -> str:
-    """
-    Try to load a citizen/user name from DB.
-    Priority:
-      1) db.citizens.full_name
-      2) db.users.name
-    """
-    if not citizen_id or citizen_id == "public-citizen":
-        return "Anonymous Citizen"
-
-    if ObjectId.is_valid(citizen_id):
-        oid = ObjectId(citizen_id)
-
-        c = db.citizens.find_one({"_id": oid})
-        if c:
-            return (c.get("full_name") or c.get("name") or "Verified Citizen")
-
-        u = db.users.find_one({"_id": oid})
-        if u:
-            return (u.get("name") or u.get("full_name") or "Verified Citizen")
-
-    # fallback if not ObjectId
-    c = db.citizens.find_one({"id": citizen_id}) or db.citizens.find_one({"citizen_id": citizen_id})
-    if c:
-        return (c.get("full_name") or c.get("name") or "Verified Citizen")
-
-    u = db.users.find_one({"email": citizen_id}) or db.users.find_one({"id": citizen_id})
-    if u:
-        return (u.get("name") or u.get("full_name") or "Verified Citizen")
-
-    return "Verified Citizen"
+async def _safe_find_display_name(citizen_id: str) -> str:
+    """Citizen/user display name (citizens.full_name, then users.name), cached per id."""
+    return await display_name_cache.display_name(db.citizens, db.users, citizen_id)
 
 
 @router.post("/{request_id}/comment")
-def add_comment(
+async def add_comment(
     request_id: str,
     payload: AddComment,
     user=Depends(require_role("citizen")),
     logs_repo: PerformanceLogsRepository = Depends(get_logs_repo),
 ):
     oid = validate_object_id(request_id)
-    req = db.service_requests.find_one({"_id": oid})
+    req = await db.service_requests.find_one({"_id": oid})
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
 
@@ -66,9 +39,9 @@ def add_comment(
     if req.get("citizen_id") != user["_id"]:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    display_name = _safe_find_display_name(str(user["_id"]))
+    display_name = await _safe_find_display_name(str(user["_id"]))
 
-    logs_repo.append_event(
+    await logs_repo.append_event(
         request_id=request_id,
         event_type="comment",
         actor_type="citizen",
@@ -84,14 +57,14 @@ def add_comment(
 
 
 @router.post("/{request_id}/rating")
-def rate_request(
+async def rate_request(
     request_id: str,
     payload: AddRating,
     user=Depends(require_role("citizen")),
     logs_repo: PerformanceLogsRepository = Depends(get_logs_repo),
 ):
     oid = validate_object_id(request_id)
-    req = db.service_requests.find_one({"_id": oid})
+    req = await db.service_requests.find_one({"_id": oid})
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
 
@@ -102,9 +75,9 @@ def rate_request(
     if req.get("status") not in ("resolved", "closed"):
         raise HTTPException(status_code=400, detail="Can only rate after resolution")
 
-    display_name = _safe_find_display_name(str(user["_id"]))
+    display_name = await _safe_find_display_name(str(user["_id"]))
 
-    logs_repo.append_event(
+    await logs_repo.append_event(
         request_id=request_id,
         event_type="rating",
         actor_type="citizen",
@@ -118,7 +91,7 @@ def rate_request(
     )
 
     # store quick snapshot on request doc
-    db.service_requests.update_one(
+    await db.service_requests.update_one(
         {"_id": oid},
         {"$set": {
             "citizen_feedback": {
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException
-from datetime import datetime
+from pymongo import ReturnDocument
 from typing import Dict, Any
 
 from app.core.db import db
@@ -8,44 +8,40 @@ from app.models.milestone_models import MilestonePayload
 from app.utils.objectid import validate_object_id
 from app.repositories.performance_logs_repo import PerformanceLogsRepository
 from app.models.request_models import STATUS_IN_PROGRESS, STATUS_RESOLVED
+from app.services.sla_service import apply_sla_update, build_sla_update_stages, utcnow_ms
+from app.repositories.kpi_counters_repo import KpiCountersRepository
+from app.services.heatmap_tile_cache import heatmap_tile_cache
+from app.services.sla_policy_cache import sla_policy_cache
+from app.utils.bson_json import MongoJSONRoute
+from app.utils.doc_paths import apply_set
 
-router = APIRouter(prefix="/requests", tags=["Milestones"])
+router = APIRouter(prefix="/requests", tags=["Milestones"], route_class=MongoJSONRoute)
 
 
 def get_logs_repo() -> PerformanceLogsRepository:
     return PerformanceLogsRepository(db.performance_logs)
 
 
+def get_counters_repo() -> KpiCountersRepository:
+    return KpiCountersRepository(db.kpi_counters)
+
+
 @router.patch("/{request_id}/milestone")
-def add_milestone(
+async def add_milestone(
     request_id: str,
     payload: MilestonePayload,
     user=Depends(get_current_user),
     logs_repo: PerformanceLogsRepository = Depends(get_logs_repo),
+    counters: KpiCountersRepository = Depends(get_counters_repo),
 ):
     # allow staff OR agent
     if user.get("role") not in ("staff", "agent"):
         raise HTTPException(status_code=403, detail="Forbidden")
 
     oid = validate_object_id(request_id)
-    req = db.service_requests.find_one({"_id": oid})
-    if req is None:
-        raise HTTPException(status_code=404, detail="Request not found")
-
-    # log milestone event (correct signature)
-    logs_repo.append_event(
-        request_id=request_id,  # request_id is string (same as _id string)
-        event_type=f"milestone:{payload.milestone}",
-        actor_type=user["role"],
-        actor_id=str(user["_id"]),
-        meta={
-            "note": payload.note,
-            "evidence_urls": payload.evidence_urls,
-        },
-    )
 
     # Minimal state effects + timestamps (important for SLA)
-    now = datetime.utcnow()
+    now = utcnow_ms()
     set_fields: Dict[str, Any] = {
         "updated_at": now,
         "timestamps.updated_at": now,
@@ -63,11 +59,33 @@ def add_milestone(
         # keep workflow state aligned if stored
         set_fields["workflow.current_state"] = set_fields["status"]
 
-    db.service_requests.update_one({"_id": oid}, {"$set": set_fields})
+    # zone/category-specific policies, same table transition_request resolves against
+    policies = await sla_policy_cache.policies(db.sla_policies)
 
-    updated = db.service_requests.find_one({"_id": oid})
-    if updated is None:
-        raise HTTPException(status_code=500, detail="Failed to fetch updated request")
+    # single round trip: apply effects and recompute SLA fields server-side;
+    # the post-image is derived from the returned pre-image
+    before = await db.service_requests.find_one_and_update(
+        {"_id": oid},
+        [{"$set": set_fields}] + build_sla_update_stages(now, policies=policies),
+        return_document=ReturnDocument.BEFORE,
+    )
+    if before is None:
+        raise HTTPException(status_code=404, detail="Request not found")
+
+    updated = apply_sla_update(apply_set(before, set_fields), now, policies)
+    await counters.record_change(before, updated)
+    if "status" in set_fields:
+        heatmap_tile_cache.invalidate_request(updated)
 
-    updated["_id"] = str(updated["_id"])
+    # log milestone event (correct signature)
+    await logs_repo.append_event(
+        request_id=request_id,  # request_id is string (same as _id string)
+        event_type=f"milestone:{payload.milestone}",
+        actor_type=user["role"],
+        actor_id=str(user["_id"]),
+        meta={
+            "note": payload.note,
+            "evidence_urls": payload.evidence_urls,
+        },
+    )
     return updated
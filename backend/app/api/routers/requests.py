@@ -1,23 +1,26 @@
 # app/api/routers/requests.py
 
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException, Header, Query
 from datetime import datetime
+from pymongo import ReturnDocument
 
 from app.core.db import db
 from app.deps.auth_deps import get_current_user, require_role
 
-from app.models.request_models import CreateServiceRequest, UpdatePriority, MergeDuplicatePayload
+from app.models.request_models import CreateServiceRequest, UpdatePriority, MergeDuplicatePayload, RequestView
 from app.models.workflow_models import TransitionPayload
 
 from app.repositories.requests_repo import RequestsRepository
 from app.repositories.performance_logs_repo import PerformanceLogsRepository
+from app.services.heatmap_service import DEFAULT_ZOOM, MAX_ZOOM, parse_bbox, parse_status_in
 from app.utils.objectid import validate_object_id
+from app.utils.bson_json import MongoJSONRoute
 
-router = APIRouter(prefix="/requests", tags=["Requests"])
+router = APIRouter(prefix="/requests", tags=["Requests"], route_class=MongoJSONRoute)
 
 
 def get_repo():
-    return RequestsRepository(db.service_requests, db.performance_logs)
+    return RequestsRepository(db.service_requests, db.performance_logs, db.kpi_counters)
 
 
 def get_logs_repo():
@@ -29,21 +32,24 @@ def get_logs_repo():
 # ----------------------------
 
 @router.post("/")
-def create_request(
+async def create_request(
     payload: CreateServiceRequest,
     user=Depends(require_role("citizen")),
     repo: RequestsRepository = Depends(get_repo),
     idempotency_key: str | None = Header(default=None, alias="Idempotency-Key"),
 ):
-    return repo.create_request(payload, citizen_id=user["_id"], idempotency_key=idempotency_key)
+    return await repo.create_request(payload, citizen_id=user["_id"], idempotency_key=idempotency_key)
 
 
 @router.get("/me")
-def my_requests(
+async def my_requests(
+    view: RequestView = "full",
+    page_size: int = 50,
+    after: str = "",
     user=Depends(require_role("citizen")),
     repo: RequestsRepository = Depends(get_repo),
 ):
-    return repo.list_by_citizen(user["_id"])
+    return await repo.list_by_citizen(user["_id"], view=view, page_size=page_size, after=after or None)
 
 
 # ----------------------------
@@ -51,13 +57,27 @@ def my_requests(
 # ----------------------------
 
 @router.get("/nearby")
-def nearby_requests(
-    lng: float,
-    lat: float,
+async def nearby_requests(
+    lng: float | None = None,
+    lat: float | None = None,
     radius_m: int = 1000,
+    view: RequestView = "map",
+    bbox: str = "",
+    zoom: int = Query(default=DEFAULT_ZOOM, ge=0, le=MAX_ZOOM),
+    status_in: str = "",
     repo: RequestsRepository = Depends(get_repo),
 ):
-    return repo.nearby(lng=lng, lat=lat, radius_m=radius_m)
+    """
+    - lng, lat, radius_m: the nearest requests (at most 200, `truncated` when capped)
+    - bbox=min_lng,min_lat,max_lng,max_lat + zoom: clustered mode, every request in
+      the box as {lat, lng, count} clusters plus individual points in sparse cells
+    """
+    box = parse_bbox(bbox)
+    if box is not None:
+        return await repo.nearby_clusters(box, zoom, statuses=parse_status_in(status_in))
+    if lng is None or lat is None:
+        raise HTTPException(status_code=400, detail="Provide lng and lat, or bbox")
+    return await repo.nearby(lng=lng, lat=lat, radius_m=radius_m, view=view)
 
 
 # ----------------------------
@@ -65,36 +85,39 @@ def nearby_requests(
 # ----------------------------
 
 @router.get("/")
-def list_requests(
+async def list_requests(
     status: str = "",
     category: str = "",
     priority: str = "",
     page: int = 1,
     page_size: int = 10,
+    after: str = "",
+    include_total: bool = True,
+    view: RequestView = "full",
     _user=Depends(require_role("staff")),
     repo: RequestsRepository = Depends(get_repo),
 ):
-    return repo.list_requests(status, category, priority, page, page_size)
+    return await repo.list_requests(status, category, priority, page, page_size, after, include_total, view)
 
 
 @router.patch("/{request_id}/transition")
-def transition_request(
+async def transition_request(
     request_id: str,
     payload: TransitionPayload,
     _user=Depends(require_role("staff")),
     repo: RequestsRepository = Depends(get_repo),
 ):
-    return repo.transition_request(request_id, payload.next_status.value)
+    return await repo.transition_request(request_id, payload.next_status.value)
 
 
 @router.patch("/{request_id}/priority")
-def set_priority(
+async def set_priority(
     request_id: str,
     payload: UpdatePriority,
     _user=Depends(require_role("staff")),
     repo: RequestsRepository = Depends(get_repo),
 ):
-    return repo.update_priority(request_id, payload.priority)
+    return await repo.update_priority(request_id, payload.priority)
 
 
 # ----------------------------
@@ -102,43 +125,32 @@ def set_priority(
 # ----------------------------
 
 @router.post("/{request_id}/escalate")
-def escalate_request(
+async def escalate_request(
     request_id: str,
     _user=Depends(require_role("staff")),
     logs: PerformanceLogsRepository = Depends(get_logs_repo),
 ):
     oid = validate_object_id(request_id)
-    req = db.service_requests.find_one({"_id": oid})
-    if not req:
-        raise HTTPException(status_code=404, detail="Request not found")
 
     now = datetime.utcnow()
-    db.service_requests.update_one(
+    updated = await db.service_requests.find_one_and_update(
         {"_id": oid},
         {"$inc": {"escalation_count": 1}, "$set": {"updated_at": now, "timestamps.updated_at": now}},
+        return_document=ReturnDocument.AFTER,
     )
+    if not updated:
+        raise HTTPException(status_code=404, detail="Request not found")
 
-    new_doc = db.service_requests.find_one({"_id": oid}, {"escalation_count": 1, "_id": 1})
-    esc_count = int((new_doc or {}).get("escalation_count", 1))
+    esc_count = int(updated.get("escalation_count", 1))
     step = "notify_dispatcher" if esc_count == 1 else "notify_manager"
 
-    logs.append_event(
+    await logs.append_event(
         request_id=request_id,
         event_type="sla_escalation",
         actor_type="staff",
         actor_id="staff",
         meta={"escalation_count": esc_count, "step": step},
     )
-
-    updated = db.service_requests.find_one({"_id": oid})
-
-    if not updated:
-        raise HTTPException(
-            status_code=404,
-            detail="Service request not found"
-            )
-
-    updated["_id"] = str(updated["_id"])
     return updated
 
 # ----------------------------
@@ -146,13 +158,13 @@ def escalate_request(
 # ----------------------------
 
 @router.post("/{request_id}/merge")
-def merge_duplicate(
+async def merge_duplicate(
     request_id: str,
     payload: MergeDuplicatePayload,
     _user=Depends(require_role("staff")),
     repo: RequestsRepository = Depends(get_repo),
 ):
-    return repo.merge_into_master(
+    return await repo.merge_into_master(
         duplicate_request_id=request_id,
         master_request_id=payload.master_request_id
     )
@@ -163,20 +175,30 @@ def merge_duplicate(
 # ----------------------------
 
 @router.get("/{request_id}/timeline")
-def request_timeline(
+async def request_timeline(
     request_id: str,
+    limit: int | None = Query(default=None, ge=1, le=500),
+    before: int | None = Query(default=None, ge=0),
+    after: int | None = Query(default=None, ge=0),
+    types: str = "",
     user=Depends(get_current_user),
     logs: PerformanceLogsRepository = Depends(get_logs_repo),
 ):
+    """
+    - limit: page size (newest events first when no after= cursor)
+    - before / after: event seq cursors (use first_seq / last_seq from a previous page)
+    - types: comma separated, e.g. "comment" or "milestone:*"
+    """
     oid = validate_object_id(request_id)
-    req = db.service_requests.find_one({"_id": oid})
+    req = await db.service_requests.find_one({"_id": oid}, {"citizen_id": 1})
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
 
     if user["role"] == "citizen" and req.get("citizen_id") != user["_id"]:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    return logs.get_timeline(request_id)
+    type_list = [t.strip() for t in types.split(",") if t.strip()]
+    return await logs.get_timeline(request_id, limit=limit, before=before, after=after, types=type_list or None)
 
 
 # ----------------------------
@@ -185,12 +207,12 @@ def request_timeline(
 # ----------------------------
 
 @router.get("/{request_id}")
-def get_request(
+async def get_request(
     request_id: str,
     user=Depends(get_current_user),
     repo: RequestsRepository = Depends(get_repo),
 ):
-    r = repo.get_by_id(request_id)
+    r = await repo.get_by_id(request_id)
 
     if user["role"] == "citizen" and r.get("citizen_id") != user["_id"]:
         raise HTTPException(status_code=403, detail="Forbidden")
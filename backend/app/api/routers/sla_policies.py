@@ -0,0 +1,44 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends
+from app.core.db import db
+from app.deps.auth_deps import require_role
+from app.models.sla_models import SlaPolicyUpsert
+from app.repositories.sla_policies_repo import SlaPoliciesRepository
+from app.services.sla_policy_cache import sla_policy_cache
+from app.utils.bson_json import MongoJSONRoute
+
+router = APIRouter(prefix="/sla/policies", tags=["SLA Policies"], route_class=MongoJSONRoute)
+
+
+def get_repo():
+    return SlaPoliciesRepository(db.sla_policies)
+
+
+@router.get("/")
+async def list_policies(_user=Depends(require_role("staff")), repo=Depends(get_repo)):
+    return await repo.list_all()
+
+
+@router.get("/resolve")
+async def resolve_policy(
+    priority: str = "P2",
+    category: str = "general",
+    zone_id: Optional[str] = None,
+    _user=Depends(require_role("staff")),
+):
+    """
+    The policy a request with these fields would get (from this process's cache).
+    """
+    policies = await sla_policy_cache.policies(db.sla_policies)
+    return {"policy": policies.resolve(category=category, priority=priority, zone_id=zone_id), "cache": sla_policy_cache.stats()}
+
+
+@router.put("/{policy_id}")
+async def upsert_policy(policy_id: str, payload: SlaPolicyUpsert, _user=Depends(require_role("staff")), repo=Depends(get_repo)):
+    return await repo.upsert(policy_id, payload.model_dump())
+
+
+@router.delete("/{policy_id}")
+async def delete_policy(policy_id: str, _user=Depends(require_role("staff")), repo=Depends(get_repo)):
+    return await repo.delete(policy_id)
@@ -9,4 +9,58 @@ class Settings:
     DB_NAME = os.getenv("DB_NAME", "cst_db")
     CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:5173").split(",")
 
+    # Mongo connection pool
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+
+    # Heatmap tile cache (in-process)
+    HEATMAP_CACHE_MAX_TILES = int(os.getenv("HEATMAP_CACHE_MAX_TILES", "5000"))
+    HEATMAP_CACHE_TTL_SECONDS = float(os.getenv("HEATMAP_CACHE_TTL_SECONDS", "300"))
+
+    # Clustered /requests/nearby (bbox + zoom)
+    MAP_CLUSTER_POINT_THRESHOLD = int(os.getenv("MAP_CLUSTER_POINT_THRESHOLD", "5"))
+    MAP_CLUSTER_MAX_CELLS = int(os.getenv("MAP_CLUSTER_MAX_CELLS", "512"))
+
+    # Active agent roster cache (in-process, dropped on local agent writes)
+    AGENT_ROSTER_TTL_SECONDS = float(os.getenv("AGENT_ROSTER_TTL_SECONDS", "30"))
+
+    # Near-duplicate suggestions at request creation: "background", "inline" or "off"
+    DEDUP_MODE = os.getenv("DEDUP_MODE", "background")
+    DEDUP_RADIUS_M = float(os.getenv("DEDUP_RADIUS_M", "200"))
+    DEDUP_WINDOW_DAYS = float(os.getenv("DEDUP_WINDOW_DAYS", "7"))
+    DEDUP_MIN_SIMILARITY = float(os.getenv("DEDUP_MIN_SIMILARITY", "0.4"))
+    DEDUP_MAX_SUGGESTIONS = int(os.getenv("DEDUP_MAX_SUGGESTIONS", "5"))
+    DEDUP_CANDIDATE_LIMIT = int(os.getenv("DEDUP_CANDIDATE_LIMIT", "200"))
+
+    # Citizen/user display names for comments and ratings (in-process)
+    DISPLAY_NAME_CACHE_SIZE = int(os.getenv("DISPLAY_NAME_CACHE_SIZE", "10000"))
+    DISPLAY_NAME_CACHE_TTL_SECONDS = float(os.getenv("DISPLAY_NAME_CACHE_TTL_SECONDS", "300"))
+
+    # Performance log writes: "durable-sync" (on the request path) or "batched" (write-behind)
+    EVENT_LOG_MODE = os.getenv("EVENT_LOG_MODE", "durable-sync")
+    EVENT_LOG_BATCH_SIZE = int(os.getenv("EVENT_LOG_BATCH_SIZE", "500"))
+    EVENT_LOG_FLUSH_INTERVAL_MS = int(os.getenv("EVENT_LOG_FLUSH_INTERVAL_MS", "200"))
+    EVENT_LOG_MAX_QUEUE = int(os.getenv("EVENT_LOG_MAX_QUEUE", "10000"))
+
+    # Background SLA sweeper (recomputes sla_state of open requests at their boundaries).
+    # Off in the API by default: run `python -m app.jobs.sweep_sla --loop` once per
+    # deployment, or enable it in a single designated API process.
+    SLA_SWEEP_ENABLED = os.getenv("SLA_SWEEP_ENABLED", "false").lower() in ("1", "true", "yes")
+    SLA_SWEEP_INTERVAL_SECONDS = float(os.getenv("SLA_SWEEP_INTERVAL_SECONDS", "60"))
+    SLA_SWEEP_BATCH_SIZE = int(os.getenv("SLA_SWEEP_BATCH_SIZE", "500"))
+
+    # SLA policy table: how often each process checks sla_policy_meta for a new version
+    SLA_POLICY_REFRESH_SECONDS = float(os.getenv("SLA_POLICY_REFRESH_SECONDS", "30"))
+
+    # Auth: bcrypt runs on its own pool; login attempts are rate limited per email and per client IP
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+    LOGIN_RATE_WINDOW_SECONDS = float(os.getenv("LOGIN_RATE_WINDOW_SECONDS", "60"))
+    LOGIN_RATE_MAX_PER_EMAIL = int(os.getenv("LOGIN_RATE_MAX_PER_EMAIL", "5"))
+    LOGIN_RATE_MAX_PER_IP = int(os.getenv("LOGIN_RATE_MAX_PER_IP", "30"))  # 0 = no per-IP limit
+    # reverse proxies in front of the API that append to X-Forwarded-For (0 = use the socket peer)
+    TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+    JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "1024"))
+
 settings = Settings()
@@ -1,10 +1,18 @@
 # app/core/db.py
 
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient
 from .app_config import settings
 
-client = MongoClient(settings.MONGO_URI)
+client = AsyncMongoClient(
+    settings.MONGO_URI,
+    maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+    minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+    waitQueueTimeoutMS=settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+)
 db = client[settings.DB_NAME]
 
 def get_db():
     return db
+
+async def close_db():
+    await client.close()
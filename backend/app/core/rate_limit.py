@@ -0,0 +1,112 @@
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional
+
+from fastapi import HTTPException, Request
+
+from app.core.app_config import settings
+
+
+class SlidingWindowLimiter:
+    """
+    In-process sliding-window limiter: at most `limit` hits per key within
+    window_seconds. Keys are kept in LRU order and capped at max_keys, so a
+    flood of distinct keys cannot grow memory without bound. Per process;
+    with several workers the effective limit is per worker.
+    """
+
+    def __init__(self, limit: int, window_seconds: float, max_keys: int = 100_000):
+        self.limit = max(limit, 1)
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        self._hits: "OrderedDict[str, Deque[float]]" = OrderedDict()
+        self.rejected = 0
+
+    def retry_after(self, key: str, now: Optional[float] = None) -> float:
+        """Seconds until key may hit again (0 = allowed now)."""
+        now = time.monotonic() if now is None else now
+        hits = self._hits.get(key)
+        if not hits:
+            return 0.0
+        while hits and hits[0] <= now - self.window_seconds:
+            hits.popleft()
+        if len(hits) < self.limit:
+            return 0.0
+        return hits[0] + self.window_seconds - now
+
+    def hit(self, key: str, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        hits = self._hits.get(key)
+        if hits is None:
+            hits = self._hits[key] = deque(maxlen=self.limit)
+        hits.append(now)
+        self._hits.move_to_end(key)
+        while len(self._hits) > self.max_keys:
+            self._hits.popitem(last=False)
+
+    def reset(self, key: str) -> None:
+        self._hits.pop(key, None)
+
+
+def client_ip(request: Request, trusted_hops: int = 0) -> Optional[str]:
+    """
+    The client address: the socket peer, or with trusted_hops proxies in front
+    the X-Forwarded-For entry the outermost trusted proxy appended (entries
+    further left are client-supplied and ignored).
+    """
+    peer = request.client.host if request.client else None
+    if trusted_hops <= 0:
+        return peer
+    forwarded = [h.strip() for h in request.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+    if len(forwarded) < trusted_hops:
+        return peer  # did not come through the configured proxies
+    return forwarded[-trusted_hops]
+
+
+class LoginRateLimiter:
+    """
+    Login attempts per email and per client IP; a 429 when either is
+    exhausted. max_per_ip <= 0 turns the per-IP limit off.
+    """
+
+    def __init__(self, window_seconds: float, max_per_email: int, max_per_ip: int):
+        self.by_email = SlidingWindowLimiter(max_per_email, window_seconds)
+        self.by_ip = SlidingWindowLimiter(max_per_ip, window_seconds) if max_per_ip > 0 else None
+
+    def check(self, email: str, ip: Optional[str]) -> None:
+        """Record an attempt, or raise 429 (the rejected attempt is not recorded)."""
+        email_key = email.strip().lower()
+        ip_key = ip or "unknown"
+        now = time.monotonic()
+        wait = self.by_email.retry_after(email_key, now)
+        if self.by_ip is not None:
+            wait = max(wait, self.by_ip.retry_after(ip_key, now))
+        if wait > 0:
+            self.by_email.rejected += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Too many login attempts, retry later",
+                headers={"Retry-After": str(max(math.ceil(wait), 1))},
+            )
+        self.by_email.hit(email_key, now)
+        if self.by_ip is not None:
+            self.by_ip.hit(ip_key, now)
+
+    def succeeded(self, email: str) -> None:
+        # a successful login clears that account's failures (the IP budget stays)
+        self.by_email.reset(email.strip().lower())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "emails": len(self.by_email._hits),
+            "ips": len(self.by_ip._hits) if self.by_ip is not None else None,
+            "rejected": self.by_email.rejected,
+        }
+
+
+login_rate_limiter = LoginRateLimiter(
+    window_seconds=settings.LOGIN_RATE_WINDOW_SECONDS,
+    max_per_email=settings.LOGIN_RATE_MAX_PER_EMAIL,
+    max_per_ip=settings.LOGIN_RATE_MAX_PER_IP,
+)
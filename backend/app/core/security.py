@@ -1,9 +1,18 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Callable, Dict, Optional, Tuple
 
+from fastapi import HTTPException
 from jose import jwt, JWTError
 import bcrypt
 
+from app.core.app_config import settings
+
 SECRET_KEY = "CHANGE_ME_SUPER_SECRET"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
@@ -25,6 +34,65 @@ def verify_password(password: str, password_hash: str) -> bool:
     return bcrypt.checkpw(pw, password_hash.encode("utf-8"))
 
 
+# -------------------------
+# password hashing executor
+# -------------------------
+class PasswordHasher:
+    """
+    bcrypt on its own small thread pool, so a burst of logins queues here
+    instead of occupying the shared threadpool that sync endpoints use.
+    At most max_workers hashes run at once; beyond max_pending waiting calls
+    callers get a 503 rather than an ever-growing queue.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max(max_workers, 1)
+        self.max_pending = max(max_pending, self.max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self.rejected = 0
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Authentication busy, retry shortly", headers={"Retry-After": "1"})
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(), fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        return await self._run(verify_password, password, password_hash)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "rejected": self.rejected,
+        }
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -37,3 +105,61 @@ def decode_token(token: str):
         return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         return None
+
+
+# -------------------------
+# decoded token cache
+# -------------------------
+class TokenCache:
+    """
+    LRU of decoded, validated JWT claims keyed by the token's SHA-256, each
+    entry dropped at the token's exp. Only valid tokens are cached, so a hit
+    is exactly what decode_token would have returned.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max(max_size, 1)
+        self._entries: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def decode(self, token: str) -> Optional[Dict[str, Any]]:
+        key = hashlib.sha256(token.encode("utf-8")).digest()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(entry[1])
+                del self._entries[key]
+            self.misses += 1
+
+        claims = decode_token(token)
+        exp = (claims or {}).get("exp")
+        if claims is None or not isinstance(exp, (int, float)):
+            return claims
+
+        with self._lock:
+            self._entries[key] = (float(exp), claims)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return dict(claims)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TokenCache(max_size=settings.JWT_CACHE_SIZE)
+
+
+def decode_token_cached(token: str) -> Optional[Dict[str, Any]]:
+    """decode_token through token_cache, for bearer auth once it replaces the X-Role stub."""
+    return token_cache.decode(token)
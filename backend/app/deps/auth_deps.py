@@ -3,7 +3,8 @@ from fastapi import Depends, HTTPException, Header
 
 ALLOWED_ROLES = {"citizen", "staff", "agent"}
 
-def get_current_user(
+# async: plain header parsing is cheaper than a threadpool hop
+async def get_current_user(
     x_role: str = Header(default="citizen", alias="X-Role"),
     x_citizen_id: str | None = Header(default=None, alias="X-Citizen-Id"),
 ):
@@ -19,7 +20,7 @@ def get_current_user(
     }
 
 def require_role(role: str):
-    def checker(user=Depends(get_current_user)):
+    async def checker(user=Depends(get_current_user)):
         if user["role"] != role:
             raise HTTPException(status_code=403, detail="Forbidden")
         return user
@@ -0,0 +1,249 @@
+# app/jobs/cluster_duplicates.py
+"""
+Cluster the open backlog into duplicate groups and link each group to its
+oldest request, with the same fields and events as POST /requests/{id}/merge.
+
+    python -m app.jobs.cluster_duplicates
+
+Runs against a snapshot: only open master requests created at or before the
+run's snapshot_at are considered, and every write is guarded on the request
+still being open and unmerged, so concurrent staff merges or transitions win.
+A duplicate whose master stopped qualifying before it could be linked is
+rolled back to a standalone request. Candidate pairs come from geohash cells + MinHash LSH bands
+(see cluster_duplicates), so the cost stays near-linear in the backlog.
+
+Restartable: the run (snapshot_at, parameters) is stored in dedup_runs and an
+interrupted run is resumed with the same snapshot. Clustering is deterministic
+and already-merged duplicates drop out of the snapshot, so a re-run picks up
+the remaining merges; masters are re-linked from the run's duplicates first.
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.core.app_config import settings
+from app.core.db import db, close_db
+from app.repositories.performance_logs_repo import PerformanceLogsRepository
+from app.services.duplicate_clustering import cluster_duplicates, cluster_size_histogram
+from app.services.sla_service import SLA_TERMINAL_STATUSES
+
+RUNS_COLLECTION = "dedup_runs"
+MERGE_BATCH = 500  # clusters per batched write
+LOAD_BATCH = 5000
+
+SNAPSHOT_PROJECTION = {
+    "category": 1,
+    "description": 1,
+    "dedup": 1,
+    "location.coordinates": 1,
+    "timestamps.created_at": 1,
+}
+
+
+def _ms(start: float) -> int:
+    return int((time.perf_counter() - start) * 1000)
+
+
+async def _start_or_resume_run() -> Dict[str, Any]:
+    runs = db[RUNS_COLLECTION]
+    run = await runs.find_one({"status": "running"}, sort=[("started_at", -1)])
+    if run is not None:
+        print(f"resuming run {run['_id']} (snapshot {run['snapshot_at']:%Y-%m-%d %H:%M:%S})")
+        return run
+    now = datetime.utcnow()
+    run = {
+        "_id": ObjectId(),
+        "status": "running",
+        "snapshot_at": now,
+        "started_at": now,
+        "params": {
+            "radius_m": settings.DEDUP_RADIUS_M,
+            "window_days": settings.DEDUP_WINDOW_DAYS,
+            "min_similarity": settings.DEDUP_MIN_SIMILARITY,
+        },
+    }
+    await runs.insert_one(run)
+    return run
+
+
+async def _link_masters(run_id: str, masters: List[ObjectId]) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    $addToSet the run's marked duplicates onto their masters, guarded on the
+    master still being open and unmerged. Duplicates that did not end up on
+    their master's linked_duplicates are rolled back.
+    Returns (linked duplicates, number rolled back).
+    """
+    query: Dict[str, Any] = {"duplicates.merged_by_run": run_id}
+    if masters:
+        query["duplicates.master_request_id"] = {"$in": [str(m) for m in masters]}
+    marked = await db.service_requests.find(query, {"duplicates.master_request_id": 1}).to_list(length=None)
+
+    by_master: Dict[str, List[str]] = {}
+    for d in marked:
+        by_master.setdefault(d["duplicates"]["master_request_id"], []).append(str(d["_id"]))
+    if not by_master:
+        return [], 0
+
+    now = datetime.utcnow()
+    await db.service_requests.bulk_write([
+        UpdateOne(
+            {
+                "_id": ObjectId(master),
+                "status": {"$nin": list(SLA_TERMINAL_STATUSES)},
+                "duplicates.is_master": {"$ne": False},
+            },
+            {"$set": {
+                "duplicates.is_master": True,
+                "duplicates.master_request_id": None,
+                "updated_at": now,
+                "timestamps.updated_at": now,
+            }, "$addToSet": {"duplicates.linked_duplicates": {"$each": dups}}},
+        )
+        for master, dups in by_master.items()
+    ], ordered=False)
+
+    # linked now, or on an earlier pass before the master was closed or merged
+    on_master = {
+        str(m["_id"]): set((m.get("duplicates") or {}).get("linked_duplicates") or [])
+        for m in await db.service_requests.find(
+            {"_id": {"$in": [ObjectId(m) for m in by_master]}}, {"duplicates.linked_duplicates": 1},
+        ).to_list(length=None)
+    }
+    linked, orphaned = [], []
+    for d in marked:
+        master = d["duplicates"]["master_request_id"]
+        (linked if str(d["_id"]) in on_master.get(master, ()) else orphaned).append(d)
+
+    if orphaned:
+        await db.service_requests.bulk_write([
+            UpdateOne(
+                {
+                    "_id": d["_id"],
+                    "duplicates.merged_by_run": run_id,
+                    "duplicates.master_request_id": d["duplicates"]["master_request_id"],
+                },
+                {"$set": {
+                    "duplicates.is_master": True,
+                    "duplicates.master_request_id": None,
+                    "updated_at": now,
+                    "timestamps.updated_at": now,
+                }, "$unset": {"duplicates.merged_by_run": ""}},
+            )
+            for d in orphaned
+        ], ordered=False)
+    return linked, len(orphaned)
+
+
+async def _apply_batch(
+    run_id: str, clusters: Dict[ObjectId, List[ObjectId]], logs: PerformanceLogsRepository,
+) -> Tuple[int, int]:
+    """
+    Mark the duplicates (guarded), link them on their masters, log events;
+    returns (merges applied, duplicates rolled back).
+    """
+    now = datetime.utcnow()
+    await db.service_requests.bulk_write([
+        UpdateOne(
+            {
+                "_id": dup,
+                "status": {"$nin": list(SLA_TERMINAL_STATUSES)},
+                "duplicates.is_master": {"$ne": False},
+            },
+            {"$set": {
+                "duplicates.is_master": False,
+                "duplicates.master_request_id": str(master),
+                "duplicates.merged_by_run": run_id,
+                "updated_at": now,
+                "timestamps.updated_at": now,
+            }},
+        )
+        for master, dups in clusters.items()
+        for dup in dups
+    ], ordered=False)
+
+    batch_dups = {dup for dups in clusters.values() for dup in dups}
+    linked, rolled_back = await _link_masters(run_id, list(clusters))
+    linked = [d for d in linked if d["_id"] in batch_dups]
+
+    events = []
+    for d in linked:
+        master = d["duplicates"]["master_request_id"]
+        events.append((master, PerformanceLogsRepository.build_event(
+            "duplicate_linked", "system", "dedup_job", {"duplicate_id": str(d["_id"]), "run_id": run_id}, at=now,
+        )))
+        events.append((str(d["_id"]), PerformanceLogsRepository.build_event(
+            "duplicate_marked", "system", "dedup_job", {"master_id": master, "run_id": run_id}, at=now,
+        )))
+    if events:
+        await logs.append_events(events)
+    return len(linked), rolled_back
+
+
+async def main() -> None:
+    try:
+        run = await _start_or_resume_run()
+        run_id = str(run["_id"])
+        params = run["params"]
+        logs = PerformanceLogsRepository(db.performance_logs)
+        timings: Dict[str, int] = {}
+
+        # a crash between the duplicate and master writes leaves masters unlinked
+        t = time.perf_counter()
+        _, rolled_back = await _link_masters(run_id, [])
+        timings["relink_ms"] = _ms(t)
+
+        t = time.perf_counter()
+        docs = await db.service_requests.find(
+            {
+                "status": {"$nin": list(SLA_TERMINAL_STATUSES)},
+                "duplicates.is_master": {"$ne": False},
+                "timestamps.created_at": {"$lte": run["snapshot_at"]},
+            },
+            SNAPSHOT_PROJECTION,
+            batch_size=LOAD_BATCH,
+        ).to_list(length=None)
+        timings["load_ms"] = _ms(t)
+
+        t = time.perf_counter()
+        clusters = cluster_duplicates(docs, params["radius_m"], params["window_days"], params["min_similarity"])
+        timings["cluster_ms"] = _ms(t)
+
+        t = time.perf_counter()
+        merged = 0
+        items = list(clusters.items())
+        for i in range(0, len(items), MERGE_BATCH):
+            applied, dropped = await _apply_batch(run_id, dict(items[i:i + MERGE_BATCH]), logs)
+            merged += applied
+            rolled_back += dropped
+        timings["apply_ms"] = _ms(t)
+
+        sizes = cluster_size_histogram(clusters)
+        stats = {
+            "requests": len(docs),
+            "clusters": len(clusters),
+            "duplicates": sum(len(d) for d in clusters.values()),
+            "merged": merged,
+            "rolled_back": rolled_back,
+            "cluster_sizes": {str(k): v for k, v in sizes.items()},
+            **timings,
+        }
+        await db[RUNS_COLLECTION].update_one(
+            {"_id": run["_id"]},
+            {"$set": {"status": "done", "finished_at": datetime.utcnow(), "stats": stats}},
+        )
+    finally:
+        await close_db()
+
+    print(f"run {run_id}: {stats['requests']} open requests, {stats['clusters']} clusters, "
+          f"{stats['duplicates']} duplicates ({stats['merged']} merged, {stats['rolled_back']} rolled back: master no longer open)")
+    for size, count in sizes.items():
+        print(f"  size {size}: {count} clusters")
+    print("  " + ", ".join(f"{k}={v}" for k, v in timings.items()))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,137 @@
+# app/jobs/migrate_performance_logs.py
+"""
+Split legacy performance_logs documents (one unbounded event_stream array per
+request) into performance_log_buckets, then create the unique request_id index.
+
+    python -m app.jobs.migrate_performance_logs
+
+Legacy events keep the lowest seqs, ahead of any event appended in the new
+format since deploy (those start after them, see build_header_update).
+
+Restartable: each header is claimed by reserving its sequence range
+(migration.base / migration.count) before events are copied, and a re-run
+resumes any header still carrying that marker. Buckets are rewritten with
+$pull + $push on the reserved seq range, so re-copying is idempotent.
+"""
+import asyncio
+from typing import Any, Dict, List
+
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
+
+from app.core.db import db, close_db
+from app.repositories.performance_logs_repo import EVENTS_PER_BUCKET
+
+
+async def merge_duplicate_headers() -> int:
+    """Fold duplicate headers for one request_id into the oldest one."""
+    merged = 0
+    cursor = await db.performance_logs.aggregate([
+        {"$group": {"_id": "$request_id", "ids": {"$push": "$_id"}, "n": {"$sum": 1}}},
+        {"$match": {"n": {"$gt": 1}}},
+    ], allowDiskUse=True)
+    async for group in cursor:
+        ids = sorted(group["ids"])
+        keep, extra = ids[0], ids[1:]
+        events: List[Dict[str, Any]] = []
+        async for d in db.performance_logs.find({"_id": {"$in": extra}}, {"event_stream": 1}):
+            events.extend(d.get("event_stream") or [])
+        await db.performance_logs.update_one({"_id": keep}, {"$push": {"event_stream": {"$each": events}}})
+        await db.performance_logs.delete_many({"_id": {"$in": extra}})
+        merged += len(extra)
+    return merged
+
+
+async def _claim(header: Dict[str, Any]) -> Dict[str, Any] | None:
+    """
+    Reserve seqs [0, n) for the n legacy events: free when no event was
+    appended since deploy, or when appends started after them (legacy_events,
+    see build_header_update). Only a header whose event_stream grew after its
+    first new-format append falls back to [event_count, event_count + n).
+    """
+    n = len(header.get("event_stream") or [])
+    fits = {"$or": [
+        {"$eq": [{"$type": "$event_count"}, "missing"]},
+        {"$gte": [{"$ifNull": ["$legacy_events", -1]}, n]},
+    ]}
+    return await db.performance_logs.find_one_and_update(
+        {"_id": header["_id"], "event_stream": {"$size": n}, "migration": {"$exists": False}},
+        [{"$set": {
+            "migration": {"base": {"$cond": [fits, 0, "$event_count"]}, "count": n},
+            "event_count": {"$cond": [
+                fits, {"$max": [{"$ifNull": ["$event_count", 0]}, n]}, {"$add": ["$event_count", n]},
+            ]},
+        }}],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _copy_events(header: Dict[str, Any]) -> None:
+    request_id = header["request_id"]
+    base = int(header["migration"]["base"])
+    events = header.get("event_stream") or []  # $push order is chronological
+    end = base + len(events)
+
+    by_bucket: Dict[int, List[Dict[str, Any]]] = {}
+    for i, evt in enumerate(events):
+        seq = base + i
+        by_bucket.setdefault(seq // EVENTS_PER_BUCKET, []).append({"seq": seq, **evt})
+
+    for bucket, bucket_events in by_bucket.items():
+        key = {"request_id": request_id, "bucket": bucket}
+        # idempotent on resume: drop anything already copied from this range first
+        before = await db.performance_log_buckets.find_one_and_update(
+            key,
+            {"$pull": {"events": {"seq": {"$gte": base, "$lt": end}}}},
+            projection={"events.seq": 1},
+            return_document=ReturnDocument.BEFORE,
+        )
+        removed = sum(1 for e in (before or {}).get("events", []) if base <= e.get("seq", -1) < end)
+
+        update: Dict[str, Any] = {
+            "$push": {"events": {"$each": bucket_events, "$sort": {"seq": 1}}},
+            "$inc": {"count": len(bucket_events) - removed},
+            "$min": {"first_seq": bucket_events[0]["seq"]},
+            "$max": {"last_seq": bucket_events[-1]["seq"]},
+        }
+        ats = [e["at"] for e in bucket_events if e.get("at") is not None]
+        if ats:
+            update["$min"]["first_at"] = min(ats)
+            update["$max"]["last_at"] = max(ats)
+        await db.performance_log_buckets.update_one(key, update, upsert=True)
+
+    await db.performance_logs.update_one(
+        {"_id": header["_id"]},
+        {"$unset": {"event_stream": "", "migration": "", "legacy_events": ""}},
+    )
+
+
+async def main() -> None:
+    try:
+        merged = await merge_duplicate_headers()
+        print(f"merged {merged} duplicate headers")
+
+        migrated = 0
+        # resume interrupted headers first, then claim untouched ones
+        async for header in db.performance_logs.find({"migration": {"$exists": True}}):
+            await _copy_events(header)
+            migrated += 1
+        async for header in db.performance_logs.find({"event_stream": {"$exists": True}, "migration": {"$exists": False}}):
+            claimed = await _claim(header)
+            if claimed is not None:
+                await _copy_events(claimed)
+                migrated += 1
+        print(f"migrated {migrated} headers into buckets of {EVENTS_PER_BUCKET}")
+
+        try:
+            await db.performance_logs.create_index("request_id", unique=True)
+            print("unique index on performance_logs.request_id ok")
+        except OperationFailure as e:
+            print(f"unique index failed (re-run the job): {e}")
+        await db.performance_log_buckets.create_index([("request_id", 1), ("bucket", 1)], unique=True)
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,34 @@
+# app/jobs/normalize_citizen_ids.py
+"""
+Store service_requests.citizen_id as a string everywhere (legacy documents
+carry an ObjectId), so GET /requests/me is one equality match on the
+(citizen_id, created_at, _id) index.
+
+    python -m app.jobs.normalize_citizen_ids
+
+Idempotent and restartable: one pipeline update converts whatever is still
+an ObjectId; re-running it finds nothing left to convert.
+"""
+import asyncio
+
+from app.core.db import db, close_db
+
+
+async def main() -> None:
+    try:
+        res = await db.service_requests.update_many(
+            {"citizen_id": {"$type": "objectId"}},
+            [{"$set": {"citizen_id": {"$toString": "$citizen_id"}}}],
+        )
+        await db.service_requests.create_index([("citizen_id", 1), ("created_at", -1), ("_id", -1)])
+        left = await db.service_requests.count_documents({"citizen_id": {"$exists": True, "$not": {"$type": "string"}}})
+    finally:
+        await close_db()
+
+    print(f"converted {res.modified_count} ObjectId citizen_id values to strings")
+    if left:
+        print(f"  {left} requests still have a non-string citizen_id (inspect them manually)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
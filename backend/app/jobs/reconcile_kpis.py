@@ -0,0 +1,28 @@
+# app/jobs/reconcile_kpis.py
+"""
+Rebuild kpi_counters from service_requests and print any drift.
+
+    python -m app.jobs.reconcile_kpis
+"""
+import asyncio
+
+from app.core.db import db, close_db
+from app.repositories.kpi_counters_repo import KpiCountersRepository
+
+
+async def main() -> None:
+    try:
+        report = await KpiCountersRepository(db.kpi_counters).rebuild(db.service_requests)
+    finally:
+        await close_db()
+
+    drift = report["drift"]
+    print(f"reconciled kpi_counters in {report['duration_ms']} ms, total={report['counters']['total']}")
+    if not drift:
+        print("no drift")
+    for key, delta in sorted(drift.items()):
+        print(f"  drift {key}: {delta:+d}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,46 @@
+# app/jobs/sweep_sla.py
+"""
+Run one SLA sweep now (same work as the background sweeper in the API).
+Open requests written before sla_next_check_at existed are marked due first,
+so the first run also backfills them. With --loop it keeps sweeping every
+SLA_SWEEP_INTERVAL_SECONDS: the one sweeper process of a deployment (the API
+only runs it where SLA_SWEEP_ENABLED is set).
+
+    python -m app.jobs.sweep_sla [--loop]
+"""
+import asyncio
+import logging
+import sys
+from datetime import datetime
+
+from app.core.db import db, close_db
+from app.services.sla_service import SLA_TERMINAL_STATUSES
+from app.services.sla_sweeper import build_sla_sweeper
+
+
+async def main(loop: bool = False) -> None:
+    now = datetime.utcnow()
+    sweeper = build_sla_sweeper()
+    try:
+        backfill = await db.service_requests.update_many(
+            {
+                "sla_next_check_at": {"$exists": False},
+                "status": {"$nin": list(SLA_TERMINAL_STATUSES)},
+                "timestamps.resolved_at": None,
+            },
+            {"$set": {"sla_next_check_at": now}},
+        )
+        print(f"marked {backfill.modified_count} open requests without sla_next_check_at as due")
+        if loop:
+            print(f"sweeping every {sweeper.interval_s:g}s")
+            logging.basicConfig(level=logging.INFO)  # per-sweep stats are logged by the sweeper
+            await sweeper.run()
+        stats = await sweeper.sweep_once(now)
+    finally:
+        await close_db()
+
+    print(f"swept {stats['due']} due requests: {stats['updated']} updated, {stats['escalations']} escalation events")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(loop="--loop" in sys.argv[1:]))
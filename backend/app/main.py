@@ -1,16 +1,35 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.app_config import settings
+from app.core.db import close_db
+from app.core.security import password_hasher
+from app.utils.bson_json import MongoJSONResponse
 from app.api.routers import requests, citizens, agents, analytics, interactions, milestones, assignment
-from app.api.routers import dev_seed, auth
+from app.api.routers import dev_seed, auth, sla_policies
 from app.services.indexes import ensure_indexes
+from app.services.event_log_sink import start_event_sink, stop_event_sink
+from app.services.sla_sweeper import start_sla_sweeper, stop_sla_sweeper
+from app.services.duplicate_service import drain_duplicate_tasks
 from app.api.routers import citizens
 
 
-app = FastAPI(title=settings.PROJECT_NAME)
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    await ensure_indexes()
+    await start_event_sink()
+    start_sla_sweeper()
+    yield
+    await stop_sla_sweeper()
+    await drain_duplicate_tasks()
+    await stop_event_sink()
+    password_hasher.shutdown()
+    await close_db()
+
 
-ensure_indexes()
+app = FastAPI(title=settings.PROJECT_NAME, lifespan=lifespan, default_response_class=MongoJSONResponse)
 
 # ✅ Staff auth (JWT)
 app.include_router(auth.router)
@@ -25,6 +44,7 @@ app.include_router(analytics.router)
 app.include_router(interactions.router)
 app.include_router(milestones.router)
 app.include_router(assignment.router)
+app.include_router(sla_policies.router)
 app.include_router(dev_seed.router)
 
 app.add_middleware(
@@ -37,6 +57,5 @@ app.add_middleware(
 
 
 @app.get("/")
-def root():
+async def root():
     return {"status": "CST backend running"}
-
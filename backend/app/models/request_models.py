@@ -14,6 +14,9 @@ RequestStatus = Literal[
     "closed",
 ]
 
+# named projection profiles for list/map endpoints (see requests_repo.REQUEST_VIEWS)
+RequestView = Literal["summary", "map", "full"]
+
 STATUS_IN_PROGRESS: RequestStatus = "in_progress"
 STATUS_RESOLVED: RequestStatus = "resolved"
 
@@ -74,3 +77,10 @@ class UpdatePriority(BaseModel):
 
 class MergeDuplicatePayload(BaseModel):
     master_request_id: str
+
+
+class BatchAutoAssignPayload(BaseModel):
+    # either explicit request ids, or every triaged request in zone_id
+    request_ids: List[str] = Field(default_factory=list)
+    zone_id: Optional[str] = None
+    limit: int = Field(5000, ge=1, le=10000)
@@ -0,0 +1,49 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+from app.models.request_models import Priority
+
+
+class EscalationStep(BaseModel):
+    after_hours: float = Field(..., gt=0)
+    action: str  # "notify_dispatcher", "notify_manager", ...
+
+
+class BusinessHours(BaseModel):
+    day: str  # "Mon", "Tue", ...
+    start: str  # "08:00"
+    end: str    # "17:00"
+
+
+class BusinessCalendar(BaseModel):
+    timezone: str = "Asia/Jerusalem"
+    hours: List[BusinessHours]
+
+
+class SlaPolicyUpsert(BaseModel):
+    # match: unset fields match any request; the most specific policy wins
+    category: Optional[str] = None
+    zone_id: Optional[str] = None
+    priority: Optional[Priority] = None
+
+    target_hours: int = Field(..., ge=1)
+    breach_threshold_hours: Optional[int] = Field(None, ge=1)  # default ceil(target * 1.25)
+    escalation_steps: Optional[List[EscalationStep]] = None  # default: dispatcher at target, manager at breach
+    calendar: Optional[BusinessCalendar] = None  # count business hours only
+    active: bool = True
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "category": "pothole",
+                "zone_id": "ZONE-DT-01",
+                "priority": "P1",
+                "target_hours": 24,
+                "breach_threshold_hours": 36,
+                "calendar": {
+                    "timezone": "Asia/Jerusalem",
+                    "hours": [{"day": d, "start": "08:00", "end": "17:00"} for d in ("Sun", "Mon", "Tue", "Wed", "Thu")],
+                },
+            }
+        }
+    }
@@ -1,7 +1,7 @@
 from typing import Optional
-from pymongo.collection import Collection
+from pymongo.asynchronous.collection import AsyncCollection
 
 class RequestsRepository:
-    def __init__(self, collection: Collection, logs_collection: Optional[Collection] = None):
+    def __init__(self, collection: AsyncCollection, logs_collection: Optional[AsyncCollection] = None):
         self.collection = collection
         self.logs_collection = logs_collection
@@ -1,31 +1,55 @@
-from pymongo.collection import Collection
+import logging
+
+from pymongo.asynchronous.collection import AsyncCollection
 from datetime import datetime
 from typing import Dict
 from fastapi import HTTPException
+from pymongo import ReturnDocument
+from pymongo.errors import WriteError
 from app.utils.objectid import validate_object_id
+from app.services.agent_roster_cache import agent_roster_cache
+from app.services.assignment_service import shift_index
+
+logger = logging.getLogger(__name__)
 
 
 class AgentsRepository:
-    def __init__(self, collection: Collection):
+    def __init__(self, collection: AsyncCollection):
         self.collection = collection
 
-    def create(self, data: dict) -> Dict:
+    async def create(self, data: dict) -> Dict:
         doc = {**data, "created_at": datetime.utcnow()}
-        r = self.collection.insert_one(doc)
-        doc["_id"] = str(r.inserted_id)
+        try:
+            await self.collection.insert_one(doc)
+        except WriteError as e:
+            # rejected by the coverage.geo_fence 2dsphere index; server details stay in the log
+            logger.warning("agent insert rejected: %s", e)
+            raise HTTPException(status_code=400, detail="Invalid agent document: check coverage.geo_fence")
+        agent_roster_cache.invalidate()
+        return doc
+
+    async def get_by_id(self, agent_id: str) -> Dict:
+        oid = validate_object_id(agent_id)
+        doc = await self.collection.find_one({"_id": oid})
+        if not doc:
+            raise HTTPException(status_code=404, detail="Agent not found")
         return doc
 
-    def get_by_id(self, agent_id: str) -> Dict:
+    async def update_schedule(self, agent_id: str, schedule: dict) -> Dict:
         oid = validate_object_id(agent_id)
-        doc = self.collection.find_one({"_id": oid})
+        doc = await self.collection.find_one_and_update(
+            {"_id": oid},
+            # schedule_version keys the shift bitmap caches of every process
+            {"$set": {"schedule": schedule, "updated_at": datetime.utcnow()}, "$inc": {"schedule_version": 1}},
+            return_document=ReturnDocument.AFTER,
+        )
         if not doc:
             raise HTTPException(status_code=404, detail="Agent not found")
-        doc["_id"] = str(doc["_id"])
+        shift_index.invalidate(agent_id)
+        agent_roster_cache.invalidate()
         return doc
 
-    def list_active(self) -> Dict:
-        items = []
-        for a in self.collection.find({"active": True}).sort("created_at", -1).limit(200):
-            a["_id"] = str(a["_id"])
-            items.append(a)
+    async def list_active(self) -> Dict:
+        roster = await agent_roster_cache.roster(self.collection)
+        items = sorted(roster.agents, key=lambda a: a.get("created_at") or datetime.min, reverse=True)
         return {"items": items}
@@ -0,0 +1,297 @@
+# app/repositories/kpi_counters_repo.py
+from __future__ import annotations
+
+from bson import ObjectId
+from pymongo.asynchronous.collection import AsyncCollection
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+COUNTERS_ID = "global"
+
+# bumped when a counter dimension is added; older documents are rebuilt before use
+COUNTERS_VERSION = 2
+
+# counter dimension -> request field it counts
+KPI_DIMENSIONS = {
+    "by_status": "status",
+    "by_priority": "priority",
+    "by_category": "category",
+    "by_zone": "location.zone_id",
+    "by_sla_state": "sla_state",
+}
+
+# dimensions that request mutations can change (category/zone are fixed at create)
+MUTABLE_DIMENSIONS = {
+    "by_status": "status",
+    "by_priority": "priority",
+    "by_sla_state": "sla_state",
+}
+
+# per-agent open workload: requests in OPEN_STATUSES keyed by assigned agent
+WORKLOAD_DIMENSION = "open_by_agent"
+ASSIGNED_AGENT_PATH = "assignment.assigned_agent_id"
+OPEN_STATUSES = ("assigned", "in_progress")
+
+# kpi_batch entries older than this belong to a batch writer that died before
+# taking them back; recover_kpi_batches applies them
+KPI_BATCH_STALE_AFTER_S = 600
+
+# kpi_prev key -> request field captured before the write
+_SNAPSHOT_FIELDS = {
+    **{path: path for path in MUTABLE_DIMENSIONS.values()},
+    "assigned_agent_id": ASSIGNED_AGENT_PATH,
+}
+
+
+def build_kpi_snapshot_stage() -> Dict[str, Any]:
+    """
+    Pipeline-update stage that records the mutable KPI dimensions as they were
+    before the write (kpi_prev). Must be the FIRST stage; only for bulk_write
+    batches, whose build_kpi_batch_stages move it into kpi_batch in the same
+    write. Single-document writes diff their BEFORE image instead (record_change).
+    """
+    return {"$set": {"kpi_prev": {k: {"$ifNull": [f"${path}", None]} for k, path in _SNAPSHOT_FIELDS.items()}}}
+
+
+def build_kpi_batch_stages(batch_id: str) -> List[Dict[str, Any]]:
+    """
+    Last stages of a pipeline update applied through bulk_write (no post-images):
+    append this write's pre/post KPI values to kpi_batch as one entry keyed by
+    batch_id, so concurrent batches touching the same request each keep their
+    own delta for take_kpi_batch, and drop kpi_prev in the same write.
+    """
+    entry = {
+        "id": batch_id,
+        "prev": "$kpi_prev",
+        "post": {k: {"$ifNull": [f"${path}", None]} for k, path in _SNAPSHOT_FIELDS.items()},
+    }
+    return [
+        {"$set": {"kpi_batch": {"$concatArrays": [{"$ifNull": ["$kpi_batch", []]}, [entry]]}}},
+        {"$unset": "kpi_prev"},
+    ]
+
+
+def _keep_kpi_batch_stages(keep: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # keeps the kpi_batch entries matching keep ($$this), and drops kpi_batch once empty
+    kept = {"$filter": {"input": {"$ifNull": ["$kpi_batch", []]}, "cond": keep}}
+    return [
+        {"$set": {"kpi_batch": kept}},
+        {"$set": {"kpi_batch": {"$cond": [{"$eq": ["$kpi_batch", []]}, "$$REMOVE", "$kpi_batch"]}}},
+    ]
+
+
+async def take_kpi_batch(requests_col: AsyncCollection, batch_id: str) -> List[Dict[str, Any]]:
+    """
+    Read back and remove the kpi_batch entries written by batch_id: one
+    {"_id", "prev", "post"} per request the batch actually updated.
+    """
+    docs = await requests_col.find({"kpi_batch.id": batch_id}, {"kpi_batch": 1}).to_list(length=None)
+    if not docs:
+        return []
+    await requests_col.update_many(
+        {"kpi_batch.id": batch_id}, _keep_kpi_batch_stages({"$ne": ["$$this.id", batch_id]}),
+    )
+    return [
+        {"_id": d["_id"], "prev": e.get("prev"), "post": e.get("post")}
+        for d in docs for e in d.get("kpi_batch") or [] if e.get("id") == batch_id
+    ]
+
+
+def _stale_batch_cutoff(stale_after_s: float) -> str:
+    # batch ids are ObjectId strings: hex, timestamp first, so they sort by creation time
+    return str(ObjectId.from_datetime(datetime.now(timezone.utc) - timedelta(seconds=stale_after_s)))
+
+
+def _key(value: Any) -> str:
+    # counter keys become field names: no dots, no leading "$"
+    if value is None or value == "":
+        return "unknown"
+    return str(value).replace(".", "_").lstrip("$") or "unknown"
+
+
+def _get_path(doc: Dict[str, Any], path: str) -> Any:
+    cur: Any = doc
+    for part in path.split("."):
+        if not isinstance(cur, dict):
+            return None
+        cur = cur.get(part)
+    return cur
+
+
+def kpi_snapshot(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """The mutable KPI dimensions of a request, keyed like kpi_prev."""
+    return {k: _get_path(doc, path) for k, path in _SNAPSHOT_FIELDS.items()}
+
+
+def _open_agent(status: Any, agent_id: Any) -> Optional[str]:
+    """Counter key of the agent a request counts against, None if it is not open work."""
+    if status not in OPEN_STATUSES or not agent_id:
+        return None
+    return _key(agent_id)
+
+
+class KpiCountersRepository:
+    """
+    Materialized dashboard counters kept in a single kpi_counters document and
+    maintained with $inc by the request write paths, so /analytics/kpis is O(1).
+    """
+
+    def __init__(self, col: AsyncCollection):
+        self.col = col
+
+    async def _inc(self, inc: Dict[str, int]) -> None:
+        inc = {k: v for k, v in inc.items() if v}
+        if not inc:
+            return
+        await self.col.update_one(
+            {"_id": COUNTERS_ID},
+            {"$inc": inc, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+
+    async def record_created(self, doc: Dict[str, Any]) -> None:
+        inc: Dict[str, int] = {"total": 1}
+        for dim, path in KPI_DIMENSIONS.items():
+            inc[f"{dim}.{_key(_get_path(doc, path))}"] = 1
+        agent = _open_agent(doc.get("status"), _get_path(doc, ASSIGNED_AGENT_PATH))
+        if agent is not None:
+            inc[f"{WORKLOAD_DIMENSION}.{agent}"] = 1
+        await self._inc(inc)
+
+    @staticmethod
+    def _add_change(inc: Dict[str, int], prev: Dict[str, Any], post: Dict[str, Any]) -> None:
+        # prev/post are keyed like kpi_prev (see _SNAPSHOT_FIELDS)
+        for dim, path in MUTABLE_DIMENSIONS.items():
+            old_k = _key(prev.get(path))
+            new_k = _key(post.get(path))
+            if old_k != new_k:
+                inc[f"{dim}.{old_k}"] = inc.get(f"{dim}.{old_k}", 0) - 1
+                inc[f"{dim}.{new_k}"] = inc.get(f"{dim}.{new_k}", 0) + 1
+
+        old_agent = _open_agent(prev.get("status"), prev.get("assigned_agent_id"))
+        new_agent = _open_agent(post.get("status"), post.get("assigned_agent_id"))
+        if old_agent != new_agent:
+            if old_agent is not None:
+                inc[f"{WORKLOAD_DIMENSION}.{old_agent}"] = inc.get(f"{WORKLOAD_DIMENSION}.{old_agent}", 0) - 1
+            if new_agent is not None:
+                inc[f"{WORKLOAD_DIMENSION}.{new_agent}"] = inc.get(f"{WORKLOAD_DIMENSION}.{new_agent}", 0) + 1
+
+    async def record_change(self, before: Dict[str, Any], after: Dict[str, Any]) -> None:
+        """Apply the deltas between a request's pre-image and post-image."""
+        inc: Dict[str, int] = {}
+        self._add_change(inc, kpi_snapshot(before), kpi_snapshot(after))
+        await self._inc(inc)
+
+    async def record_batch(self, entries: List[Dict[str, Any]]) -> None:
+        """Apply the deltas of kpi_batch entries (see take_kpi_batch) as one $inc."""
+        inc: Dict[str, int] = {}
+        for entry in entries:
+            if isinstance(entry.get("prev"), dict):
+                self._add_change(inc, entry["prev"], entry.get("post") or {})
+        await self._inc(inc)
+
+    async def recover_batches(self, requests_col: AsyncCollection, stale_after_s: float = KPI_BATCH_STALE_AFTER_S) -> int:
+        """
+        Apply the kpi_batch entries left behind by batch writers that died
+        between their bulk_write and take_kpi_batch. Each entry is removed with
+        a guarded update before its delta counts, so concurrent recoveries never
+        apply it twice. Returns the number of entries applied.
+        """
+        cutoff = _stale_batch_cutoff(stale_after_s)
+        docs = await requests_col.find({"kpi_batch.id": {"$lt": cutoff}}, {"kpi_batch": 1}).to_list(length=None)
+        recovered: List[Dict[str, Any]] = []
+        for d in docs:
+            for entry in d.get("kpi_batch") or []:
+                batch_id = entry.get("id")
+                if not isinstance(batch_id, str) or batch_id >= cutoff:
+                    continue
+                res = await requests_col.update_one(
+                    {"_id": d["_id"], "kpi_batch.id": batch_id},
+                    _keep_kpi_batch_stages({"$ne": ["$$this.id", batch_id]}),
+                )
+                if res.modified_count:
+                    recovered.append(entry)
+        await self.record_batch(recovered)
+        return len(recovered)
+
+    async def get(self) -> Optional[Dict[str, Any]]:
+        return await self.col.find_one({"_id": COUNTERS_ID})
+
+    @staticmethod
+    def is_current(doc: Optional[Dict[str, Any]]) -> bool:
+        """True when doc was built by rebuild() with the current set of dimensions."""
+        return bool(doc) and "reconciled_at" in doc and doc.get("version") == COUNTERS_VERSION
+
+    async def get_workloads(self, agent_ids: List[str]) -> Optional[Dict[str, int]]:
+        """
+        Open workload per agent id from the counters document (one read).
+        None when the counters are missing or predate the workload dimension.
+        """
+        doc = await self.col.find_one({"_id": COUNTERS_ID}, {WORKLOAD_DIMENSION: 1, "reconciled_at": 1, "version": 1})
+        if not self.is_current(doc):
+            return None
+        counts = doc.get(WORKLOAD_DIMENSION) or {}
+        return {aid: max(int(counts.get(_key(aid), 0)), 0) for aid in agent_ids}
+
+    async def rebuild(self, requests_col: AsyncCollection) -> Dict[str, Any]:
+        """
+        Recount every dimension from service_requests, replace the counters
+        document and report drift (expected - stored) for every key that differed.
+        """
+        started = datetime.utcnow()
+        facets = {
+            dim: [{"$group": {"_id": {"$ifNull": [f"${path}", None]}, "count": {"$sum": 1}}}]
+            for dim, path in KPI_DIMENSIONS.items()
+        }
+        facets[WORKLOAD_DIMENSION] = [
+            {"$match": {"status": {"$in": list(OPEN_STATUSES)}, ASSIGNED_AGENT_PATH: {"$nin": [None, ""]}}},
+            {"$group": {"_id": f"${ASSIGNED_AGENT_PATH}", "count": {"$sum": 1}}},
+        ]
+        facets["total"] = [{"$count": "count"}]
+        cursor = await requests_col.aggregate([{"$facet": facets}], allowDiskUse=True)
+        result = (await cursor.to_list(length=1) or [{}])[0]
+
+        dimensions = list(KPI_DIMENSIONS) + [WORKLOAD_DIMENSION]
+        expected: Dict[str, Any] = {"total": (result.get("total") or [{"count": 0}])[0]["count"]}
+        for dim in dimensions:
+            counts: Dict[str, int] = {}
+            for row in result.get(dim, []):
+                k = _key(row["_id"])
+                counts[k] = counts.get(k, 0) + int(row["count"])
+            expected[dim] = counts
+
+        stored = await self.get() or {}
+        drift: Dict[str, int] = {}
+        if stored.get("total", 0) != expected["total"]:
+            drift["total"] = expected["total"] - int(stored.get("total", 0))
+        for dim in dimensions:
+            old = stored.get(dim) or {}
+            new = expected[dim]
+            for k in set(old) | set(new):
+                d = int(new.get(k, 0)) - int(old.get(k, 0))
+                if d:
+                    drift[f"{dim}.{k}"] = d
+
+        # stale batch deltas: the recount above already includes them
+        cutoff = _stale_batch_cutoff(KPI_BATCH_STALE_AFTER_S)
+        await requests_col.update_many(
+            {"kpi_batch.id": {"$lt": cutoff}}, _keep_kpi_batch_stages({"$gte": ["$$this.id", cutoff]}),
+        )
+
+        # zero-count keys are dropped by replacing the whole document
+        await self.col.replace_one(
+            {"_id": COUNTERS_ID},
+            {**expected, "version": COUNTERS_VERSION, "updated_at": datetime.utcnow(), "reconciled_at": datetime.utcnow()},
+            upsert=True,
+        )
+
+        return {
+            "drift": drift,
+            "counters": expected,
+            "duration_ms": int((datetime.utcnow() - started).total_seconds() * 1000),
+        }
+
+
+def counters_as_rows(counts: Optional[Dict[str, int]]) -> List[Dict[str, Any]]:
+    """[{"_id": key, "count": n}, ...] (same shape the old $group returned), zero rows dropped."""
+    return [{"_id": k, "count": int(v)} for k, v in (counts or {}).items() if v]
@@ -1,61 +1,293 @@
 # app/repositories/performance_logs_repo.py
 from __future__ import annotations
 
-from pymongo.collection import Collection
+import asyncio
+import math
+
+from fastapi import HTTPException
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.asynchronous.collection import AsyncCollection
 from datetime import datetime
-from typing import Any, Dict, Optional, List
+from typing import Any, Dict, Optional, List, Tuple
+
+# events per performance_log_buckets document
+EVENTS_PER_BUCKET = 100
+
+# write-behind sink used by append_event in EVENT_LOG_MODE=batched (set at startup)
+_event_sink: Any = None
+
+
+def set_event_sink(sink: Any) -> None:
+    global _event_sink
+    _event_sink = sink
 
 
 class PerformanceLogsRepository:
-    def __init__(self, col: Collection):
-        self.col = col
+    """
+    Event log per request, stored as:
+      - performance_logs: one header per request_id (unique) holding
+        event_count (sequence counter), computed_kpis, created_at/updated_at
+      - performance_log_buckets: fixed-size buckets of events,
+        {request_id, bucket, count, events: [{seq, type, by, at, meta}, ...]}
+    Event seq is 0-based and bucket = seq // EVENTS_PER_BUCKET. On a legacy
+    header (unmigrated event_stream) the first reservation starts after the
+    legacy events and records their number as legacy_events, so the migration
+    gives them the lowest seqs.
+    """
 
-    def append_event(
+    def __init__(
         self,
-        request_id: str,
+        col: AsyncCollection,
+        buckets_col: Optional[AsyncCollection] = None,
+        sink: Any = None,
+    ):
+        self.col = col
+        self.buckets = buckets_col if buckets_col is not None else col.database.performance_log_buckets
+        self.sink = sink if sink is not None else _event_sink
+
+    @staticmethod
+    def build_event(
         event_type: str,
         actor_type: str,
         actor_id: str,
         meta: Optional[Dict[str, Any]] = None,
-    ) -> None:
-        evt = {
+        at: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+        return {
             "type": event_type,
             "by": {"actor_type": actor_type, "actor_id": actor_id},
-            "at": datetime.utcnow(),
+            "at": at or datetime.utcnow(),
             "meta": meta or {},
         }
-        self.col.update_one(
+
+    @staticmethod
+    def build_header_update(count: int, at: datetime, computed_kpis: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Reserve `count` seqs on the header (and optionally store the KPI snapshot)."""
+        legacy = {"$size": {"$ifNull": ["$event_stream", []]}}
+        first_reservation = {"$eq": [{"$type": "$event_count"}, "missing"]}
+        fields: Dict[str, Any] = {
+            "event_count": {"$add": [{"$ifNull": ["$event_count", legacy]}, count]},
+            "legacy_events": {"$cond": [
+                {"$and": [first_reservation, {"$gt": [legacy, 0]}]}, legacy, {"$ifNull": ["$legacy_events", "$$REMOVE"]},
+            ]},
+            "updated_at": at,
+            "created_at": {"$ifNull": ["$created_at", at]},
+        }
+        if computed_kpis is not None:
+            fields["computed_kpis"] = {"$literal": computed_kpis}
+        return [{"$set": fields}]
+
+    @staticmethod
+    def build_bucket_updates(
+        request_id: str, first_seq: int, events: List[Dict[str, Any]]
+    ) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """(filter, update) upserts pushing events (seqs first_seq, first_seq + 1, ...) into their buckets."""
+        by_bucket: Dict[int, List[Dict[str, Any]]] = {}
+        for i, evt in enumerate(events):
+            seq = first_seq + i
+            by_bucket.setdefault(seq // EVENTS_PER_BUCKET, []).append({"seq": seq, **evt})
+
+        return [
+            (
+                {"request_id": request_id, "bucket": bucket},
+                {
+                    "$push": {"events": {"$each": bucket_events}},
+                    "$inc": {"count": len(bucket_events)},
+                    "$min": {"first_seq": bucket_events[0]["seq"], "first_at": bucket_events[0]["at"]},
+                    "$max": {"last_seq": bucket_events[-1]["seq"], "last_at": bucket_events[-1]["at"]},
+                },
+            )
+            for bucket, bucket_events in by_bucket.items()
+        ]
+
+    async def reserve_seqs(
+        self,
+        request_id: str,
+        count: int,
+        at: Optional[datetime] = None,
+        computed_kpis: Optional[Dict[str, Any]] = None,
+    ) -> int:
+        """Atomically reserve `count` consecutive seqs for request_id; returns the first one."""
+        header = await self.col.find_one_and_update(
             {"request_id": request_id},
-            {
-                "$push": {"event_stream": evt},
-                "$setOnInsert": {"created_at": datetime.utcnow()},
-            },
+            self.build_header_update(count, at or datetime.utcnow(), computed_kpis),
+            projection={"event_count": 1},
             upsert=True,
+            return_document=ReturnDocument.AFTER,
         )
+        return int(header["event_count"]) - count
 
-    def add_computed_kpis(self, request_id: str, kpis: Dict[str, Any]) -> None:
+    async def append_event(
+        self,
+        request_id: str,
+        event_type: str,
+        actor_type: str,
+        actor_id: str,
+        meta: Optional[Dict[str, Any]] = None,
+        computed_kpis: Optional[Dict[str, Any]] = None,
+    ) -> Optional[int]:
+        """
+        Append one event and return its sequence number. When computed_kpis is
+        given, the KPI snapshot is stored on the header in the same update.
+        In batched mode the event is queued on the write-behind sink instead
+        and None is returned (the seq is assigned at flush time).
+        """
+        evt = self.build_event(event_type, actor_type, actor_id, meta)
+
+        if self.sink is not None:
+            await self.sink.enqueue(request_id, evt, computed_kpis)
+            return None
+
+        seq = await self.reserve_seqs(request_id, 1, evt["at"], computed_kpis)
+        bucket_filter, bucket_update = self.build_bucket_updates(request_id, seq, [evt])[0]
+        await self.buckets.update_one(bucket_filter, bucket_update, upsert=True)
+        return seq
+
+    async def append_events(self, events: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """
+        Append many (request_id, event) pairs (events from build_event): one
+        seq reservation per distinct request, run concurrently, then a single
+        bulk_write for all bucket pushes. Queued on the sink in batched mode.
+        """
+        if self.sink is not None:
+            for request_id, evt in events:
+                await self.sink.enqueue(request_id, evt, None)
+            return
+
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for request_id, evt in events:
+            groups.setdefault(request_id, []).append(evt)
+        if not groups:
+            return
+
+        first_seqs = await asyncio.gather(*(
+            self.reserve_seqs(rid, len(evts), evts[-1]["at"]) for rid, evts in groups.items()
+        ))
+        ops = [
+            UpdateOne(f, u, upsert=True)
+            for (rid, evts), first_seq in zip(groups.items(), first_seqs)
+            for f, u in self.build_bucket_updates(rid, first_seq, evts)
+        ]
+        await self.buckets.bulk_write(ops, ordered=False)
+
+    async def add_computed_kpis(self, request_id: str, kpis: Dict[str, Any]) -> None:
         """
         Store computed KPIs snapshot (SLA state, elapsed, etc.) for analytics.
         """
-        self.col.update_one(
+        await self.col.update_one(
             {"request_id": request_id},
             {"$set": {"computed_kpis": kpis, "updated_at": datetime.utcnow()}},
             upsert=True,
         )
 
-    def get_timeline(self, request_id: str) -> Dict[str, Any]:
-        doc = self.col.find_one({"request_id": request_id}, {"_id": 0})
+    @staticmethod
+    def _type_condition(types: List[str]) -> Dict[str, Any]:
+        """
+        $filter condition on $$e.type. "comment" matches exactly, "milestone:*"
+        (any trailing "*") matches by prefix.
+        """
+        conds: List[Dict[str, Any]] = []
+        for t in types:
+            if t.endswith("*"):
+                prefix = t[:-1]
+                conds.append({"$eq": [{"$substrCP": ["$$e.type", 0, len(prefix)]}, prefix]})
+            else:
+                conds.append({"$eq": ["$$e.type", t]})
+        return {"$or": conds}
+
+    @staticmethod
+    def _type_matches(event_type: str, types: List[str]) -> bool:
+        return any(
+            event_type.startswith(t[:-1]) if t.endswith("*") else event_type == t
+            for t in types
+        )
+
+    async def get_timeline(
+        self,
+        request_id: str,
+        limit: Optional[int] = None,
+        before: Optional[int] = None,
+        after: Optional[int] = None,
+        types: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Events in seq order, filtered inside Mongo:
+          - after=S: events with seq > S (oldest first, up to limit)
+          - before=S: the newest events with seq < S (up to limit)
+          - neither: all events, or the newest `limit` when limit is given
+          - types: exact types or "prefix*" patterns, e.g. ["comment", "milestone:*"]
+        The response carries has_more plus the seq cursors to continue in
+        either direction (before=first_seq for older, after=last_seq for newer).
+        Paged reads of a log still in the legacy event_stream form are
+        rejected (409) until app.jobs.migrate_performance_logs has run.
+        """
+        doc = await self.col.find_one({"request_id": request_id}, {"_id": 0, "legacy_events": 0})
         if not doc:
-            return {"request_id": request_id, "event_stream": []}
+            return {"request_id": request_id, "event_stream": [], "has_more": False}
+
+        paged = limit is not None or before is not None or after is not None
+        newest_first = after is None and paged
+
+        # legacy header not yet migrated to buckets: its events have no seq,
+        # so they can be returned whole but not paged
+        legacy = doc.pop("event_stream", None) or []
+        if legacy and paged:
+            raise HTTPException(
+                status_code=409,
+                detail="Event log not migrated yet; run app.jobs.migrate_performance_logs to page it",
+            )
+        legacy = [e for e in legacy if not types or self._type_matches(e.get("type", ""), types)]
+
+        bucket_range: Dict[str, int] = {}
+        conds: List[Dict[str, Any]] = []
+        if after is not None:
+            bucket_range["$gte"] = (after + 1) // EVENTS_PER_BUCKET
+            conds.append({"$gt": ["$$e.seq", after]})
+        if before is not None:
+            bucket_range["$lte"] = max(before - 1, 0) // EVENTS_PER_BUCKET
+            conds.append({"$lt": ["$$e.seq", before]})
+        if types:
+            conds.append(self._type_condition(types))
+
+        match: Dict[str, Any] = {"request_id": request_id}
+        if bucket_range:
+            match["bucket"] = bucket_range
+        direction = -1 if newest_first else 1
+
+        events_expr: Any = "$events"
+        if conds:
+            events_expr = {"$filter": {"input": "$events", "as": "e", "cond": {"$and": conds}}}
+
+        pipeline: List[Dict[str, Any]] = [{"$match": match}]
+        if limit is not None and not types:
+            # limit + 1 events span at most this many buckets past the cursor
+            # (the first one may be partly before it, the newest partly filled);
+            # with a type filter any bucket may match nothing, so none are cut
+            pipeline += [
+                {"$sort": {"bucket": direction}},
+                {"$limit": math.ceil((limit + 1) / EVENTS_PER_BUCKET) + 1},
+            ]
+        pipeline += [
+            {"$project": {"_id": 0, "events": events_expr}},
+            {"$unwind": "$events"},
+            {"$replaceRoot": {"newRoot": "$events"}},
+            {"$sort": {"seq": direction}},
+        ]
+        if limit is not None:
+            # one extra row tells whether more events exist
+            pipeline.append({"$limit": limit + 1})
 
-        # stringify datetimes for JSON
-        for e in doc.get("event_stream", []):
-            if "at" in e and hasattr(e["at"], "isoformat"):
-                e["at"] = e["at"].isoformat()
+        cursor = await self.buckets.aggregate(pipeline)
+        events: List[Dict[str, Any]] = await cursor.to_list(length=None)
 
-        if "created_at" in doc and hasattr(doc["created_at"], "isoformat"):
-            doc["created_at"] = doc["created_at"].isoformat()
-        if "updated_at" in doc and hasattr(doc["updated_at"], "isoformat"):
-            doc["updated_at"] = doc["updated_at"].isoformat()
+        has_more = limit is not None and len(events) > limit
+        if limit is not None:
+            events = events[:limit]
+        if newest_first:
+            events.reverse()
 
+        doc["event_stream"] = legacy + events
+        doc["has_more"] = has_more
+        doc["first_seq"] = events[0]["seq"] if events else None
+        doc["last_seq"] = events[-1]["seq"] if events else None
         return doc
@@ -1,97 +1,217 @@
-from pymongo.collection import Collection
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.asynchronous.collection import AsyncCollection
 from fastapi import HTTPException
-from datetime import datetime
+from starlette.concurrency import run_in_threadpool
+from bson import ObjectId
+from datetime import datetime, timezone
 from typing import Dict, Any, List, Optional
 
 from app.utils.objectid import validate_object_id
+from app.services.sla_service import apply_sla_update, build_sla_update_stages, utcnow_ms
+from app.utils.doc_paths import apply_set
+from app.repositories.performance_logs_repo import PerformanceLogsRepository
+from app.repositories.kpi_counters_repo import (
+    ASSIGNED_AGENT_PATH,
+    OPEN_STATUSES,
+    KpiCountersRepository,
+    build_kpi_batch_stages,
+    build_kpi_snapshot_stage,
+    take_kpi_batch,
+)
+from app.services.heatmap_tile_cache import heatmap_tile_cache
+from app.services.sla_policy_cache import CompiledSlaPolicies, sla_policy_cache
+from app.services.agent_roster_cache import GENERAL_SKILL, AgentRoster, agent_roster_cache
+from app.services.assignment_service import shift_index
+from app.services.assignment_matching import (
+    DISTANCE_WEIGHT_PER_KM,
+    LOAD_WEIGHT,
+    MatchTask,
+    agent_anchor,
+    as_lng_lat,
+    solve_assignment,
+)
+from app.services.workflow_service import allowed_sources
+
+# upper bound on requests per batch auto-assign call
+BATCH_ASSIGN_MAX = 10000
+
+# auto_assign modes: "zone" matches coverage zones, "geo" uses coverage.geo_fence
+ASSIGNMENT_MODES = ("zone", "geo")
+GEO_SEARCH_RADIUS_KM = 25.0
+GEO_CANDIDATES = 50
 
 
 class RequestsAssignmentRepository:
-    def __init__(self, requests_col: Collection, agents_col: Collection, logs_col: Optional[Collection] = None):
+    def __init__(
+        self,
+        requests_col: AsyncCollection,
+        agents_col: AsyncCollection,
+        logs_col: Optional[AsyncCollection] = None,
+        counters_col: Optional[AsyncCollection] = None,
+    ):
         self.requests = requests_col
         self.agents = agents_col
-        self.logs = logs_col  # db.performance_logs (optional)
+        self.logs = PerformanceLogsRepository(logs_col) if logs_col is not None else None  # db.performance_logs (optional)
+        self.counters = KpiCountersRepository(counters_col) if counters_col is not None else None  # db.kpi_counters (optional)
 
     # -------------------------
     # helpers: logs
     # -------------------------
-    def _append_event(self, request_id: str, event_type: str, actor_type: str, actor_id: str, meta: Dict[str, Any]):
+    async def _append_event(self, request_id: str, event_type: str, actor_type: str, actor_id: str, meta: Dict[str, Any]):
         if self.logs is None:
             return
-        evt = {
-            "type": event_type,
-            "by": {"actor_type": actor_type, "actor_id": actor_id},
-            "at": datetime.utcnow(),
-            "meta": meta or {},
+        await self.logs.append_event(request_id, event_type, actor_type, actor_id, meta)
+
+    # -------------------------
+    # helpers: SLA policies
+    # -------------------------
+    async def _sla_policies(self) -> CompiledSlaPolicies:
+        # same compiled table transition_request resolves against
+        return await sla_policy_cache.policies(self.requests.database.sla_policies)
+
+    # -------------------------
+    # helpers: assignment write
+    # -------------------------
+    @staticmethod
+    def _assignment_fields(assignment: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+        return {
+            "status": "assigned",
+            "assignment": assignment,
+            "timestamps.assigned_at": now,
+            "timestamps.updated_at": now,
+            "updated_at": now,
+            "workflow.current_state": "assigned",
         }
-        self.logs.update_one(
-            {"request_id": request_id},
-            {"$push": {"event_stream": evt}, "$setOnInsert": {"created_at": datetime.utcnow()}},
-            upsert=True,
+
+    @classmethod
+    def _assignment_pipeline(
+        cls, assignment: Dict[str, Any], now: datetime, policies: CompiledSlaPolicies,
+    ) -> List[Dict[str, Any]]:
+        fields = {**cls._assignment_fields(assignment, now), "assignment": {"$literal": assignment}}
+        return [{"$set": fields}] + build_sla_update_stages(now, policies=policies)
+
+    async def _apply_assignment(self, oid: ObjectId, assignment: Dict[str, Any], now: datetime) -> Optional[Dict[str, Any]]:
+        """
+        Single round trip: set assignment/status/timestamps, recompute SLA fields
+        server-side and return the updated document (None if the request is gone).
+        The write returns the pre-image, which feeds the KPI deltas; the
+        post-image is derived from it (apply_sla_update).
+        """
+        policies = await self._sla_policies()
+        before = await self.requests.find_one_and_update(
+            {"_id": oid},
+            self._assignment_pipeline(assignment, now, policies),
+            return_document=ReturnDocument.BEFORE,
         )
+        if before is None:
+            return None
+        updated = apply_sla_update(apply_set(before, self._assignment_fields(assignment, now)), now, policies)
+        heatmap_tile_cache.invalidate_request(updated)
+        if self.counters is not None:
+            await self.counters.record_change(before, updated)
+        return updated
 
     # -------------------------
     # helpers: selection policy
     # -------------------------
-    def _agent_matches_zone(self, agent: Dict[str, Any], zone_id: Optional[str]) -> bool:
-        if not zone_id:
-            return True
-        # try common shapes:
-        # agent.coverage_zones: ["ZONE-1", ...] OR agent.zone_id: "ZONE-1"
-        zones = agent.get("coverage_zones")
-        if isinstance(zones, list):
-            return zone_id in zones
-        if agent.get("zone_id") == zone_id:
-            return True
-        return False
-
-    def _agent_matches_skill(self, agent: Dict[str, Any], category: Optional[str]) -> bool:
-        if not category:
-            return True
-        skills = agent.get("skills")
-        if isinstance(skills, list) and skills:
-            return category in skills or "general" in skills
-        return True  # if no skills field, don't block
-
-    def _compute_workload(self, agent_id_str: str) -> int:
-        # workload = number of assigned or in_progress tasks for this agent
-        return int(self.requests.count_documents({
-            "assignment.assigned_agent_id": agent_id_str,
-            "status": {"$in": ["assigned", "in_progress"]}
-        }))
-
-    def _pick_best_agent(self, candidates: List[Dict[str, Any]], category: Optional[str], zone_id: Optional[str]) -> Dict[str, Any]:
-        # Filter by zone
-        zone_filtered = [a for a in candidates if self._agent_matches_zone(a, zone_id)]
-        pool = zone_filtered if zone_filtered else candidates
-
-        # Filter by skills
-        skill_filtered = [a for a in pool if self._agent_matches_skill(a, category)]
-        pool2 = skill_filtered if skill_filtered else pool
+    async def _compute_workloads(self, agent_ids: List[str]) -> Dict[str, int]:
+        """
+        workload = number of assigned or in_progress tasks per agent.
+        Read from the maintained kpi_counters open_by_agent counters when
+        available, otherwise one $group over the open requests of these agents.
+        """
+        if self.counters is not None:
+            workloads = await self.counters.get_workloads(agent_ids)
+            if workloads is not None:
+                return workloads
+
+        cursor = await self.requests.aggregate([
+            {"$match": {
+                ASSIGNED_AGENT_PATH: {"$in": agent_ids},
+                "status": {"$in": list(OPEN_STATUSES)},
+            }},
+            {"$group": {"_id": f"${ASSIGNED_AGENT_PATH}", "count": {"$sum": 1}}},
+        ])
+        counts = {row["_id"]: int(row["count"]) async for row in cursor}
+        return {aid: counts.get(aid, 0) for aid in agent_ids}
+
+    async def _pick_best_agent(self, roster: AgentRoster, category: Optional[str], zone_id: Optional[str]) -> Dict[str, Any]:
+        # zone + skill filtering comes from the roster indexes
+        pool = roster.candidates(zone_id, category)
 
         # Choose by minimal workload
+        workloads = await self._compute_workloads([str(a.get("_id")) for a in pool])
         best = None
         best_load = float("inf")
 
-        for a in pool2:
-            aid = str(a.get("_id"))
-            wl = self._compute_workload(aid)
-
+        for a in pool:
+            wl = workloads[str(a.get("_id"))]
             if wl < best_load:
                 best = a
                 best_load = wl
 
-
         if best is None:
             raise HTTPException(status_code=400, detail="No suitable agents found")
         return best
 
+    async def _pick_geo_agent(self, coordinates: Any, category: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        One $geoNear over service_agents on coverage.geo_fence (distance 0 =
+        the fence contains the request), the candidates' open workloads in one
+        _compute_workloads read, then rank by skill match, fence coverage and
+        LOAD_WEIGHT * workload + DISTANCE_WEIGHT_PER_KM * km; the best agent
+        on shift wins.
+        None when the request has no point or no fence is within range.
+        """
+        point = as_lng_lat(coordinates)
+        if point is None:
+            return None
+
+        skills = {"$ifNull": ["$skills", []]}
+        skill_match: Any = True
+        if category:
+            skill_match = {"$or": [
+                {"$in": [category, skills]},
+                {"$in": [GENERAL_SKILL, skills]},
+                {"$eq": [{"$size": skills}, 0]},
+            ]}
+
+        cursor = await self.agents.aggregate([
+            {"$geoNear": {
+                "near": {"type": "Point", "coordinates": list(point)},
+                "key": "coverage.geo_fence",
+                "distanceField": "distance_m",
+                "maxDistance": GEO_SEARCH_RADIUS_KM * 1000,
+                "spherical": True,
+                "query": {"active": True},
+            }},
+            {"$limit": GEO_CANDIDATES},
+            {"$addFields": {
+                "skill_match": {"$cond": [skill_match, 1, 0]},
+                "covers": {"$cond": [{"$eq": ["$distance_m", 0]}, 1, 0]},
+            }},
+        ])
+        ranked = await cursor.to_list(length=None)
+        if not ranked:
+            return None
+
+        workloads = await self._compute_workloads([str(a["_id"]) for a in ranked])
+        for a in ranked:
+            a["workload"] = workloads[str(a["_id"])]
+            a["geo_cost"] = LOAD_WEIGHT * a["workload"] + DISTANCE_WEIGHT_PER_KM * a["distance_m"] / 1000
+        ranked.sort(key=lambda a: (-a["skill_match"], -a["covers"], a["geo_cost"], a["distance_m"]))
+        # best agent on shift; the best overall if nobody is
+        now = datetime.now(timezone.utc)
+        return next((a for a in ranked if shift_index.bitmap(a).on_shift(now)), ranked[0])
+
     # -------------------------
     # auto assign
     # -------------------------
-    def auto_assign(self, request_id: str) -> Dict[str, Any]:
+    async def auto_assign(self, request_id: str, mode: str = "zone") -> Dict[str, Any]:
+        if mode not in ASSIGNMENT_MODES:
+            raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(ASSIGNMENT_MODES)}")
         oid = validate_object_id(request_id)
-        req = self.requests.find_one({"_id": oid})
+        req = await self.requests.find_one({"_id": oid}, {"category": 1, "location": 1})
         if not req:
             raise HTTPException(status_code=404, detail="Request not found")
 
@@ -100,93 +220,195 @@ class RequestsAssignmentRepository:
         loc = req.get("location") or {}
         zone_id = loc.get("zone_id")
 
-        # candidates
-        candidates = list(self.agents.find({"active": True}).limit(200))
-        if not candidates:
-            raise HTTPException(status_code=400, detail="No active agents available")
+        chosen = None
+        tie_breaker = "min_workload"
+        if mode == "geo":
+            chosen = await self._pick_geo_agent(loc.get("coordinates"), category)
+            tie_breaker = "geo_fence_distance_workload"
 
-        chosen = self._pick_best_agent(candidates, category=category, zone_id=zone_id)
+        if chosen is None:
+            # zone mode, or no geo-fenced agent near the request
+            roster = await agent_roster_cache.roster(self.agents)
+            if not roster.agents:
+                raise HTTPException(status_code=400, detail="No active agents available")
+            chosen = await self._pick_best_agent(roster, category=category, zone_id=zone_id)
+            tie_breaker = "min_workload"
         chosen_id = str(chosen["_id"])
 
-        now = datetime.utcnow()
-        update_doc = {
-            "status": "assigned",
-            "assignment": {
-                "assigned_agent_id": chosen_id,
-                "assigned_at": now,
-                "method": "auto",
-                "policy": {
-                    "zone_id": zone_id,
-                    "category": category,
-                    "tie_breaker": "min_workload"
-                }
-            },
-            "timestamps.assigned_at": now,
-            "timestamps.updated_at": now,
-            "updated_at": now,
-            "workflow.current_state": "assigned",
-        }
-
-        self.requests.update_one({"_id": oid}, {"$set": update_doc})
+        now = utcnow_ms()
+        updated = await self._apply_assignment(oid, {
+            "assigned_agent_id": chosen_id,
+            "assigned_at": now,
+            "method": "auto",
+            "policy": {
+                "zone_id": zone_id,
+                "category": category,
+                "tie_breaker": tie_breaker,
+            }
+        }, now)
+        if not updated:
+            raise HTTPException(status_code=404, detail="Request not found")
 
         # log
-        self._append_event(
+        await self._append_event(
             request_id=request_id,
             event_type="assigned",
             actor_type="staff",
             actor_id="staff",
-            meta={"method": "auto", "agent_id": chosen_id, "zone_id": zone_id, "category": category},
+            meta={"method": "auto", "mode": mode, "agent_id": chosen_id, "zone_id": zone_id, "category": category},
         )
-
-        updated = self.requests.find_one({"_id": oid})
-        if not updated:
-            raise HTTPException(status_code=500, detail="Failed to fetch updated request")
-        updated["_id"] = str(updated["_id"])
         return updated
 
+    # -------------------------
+    # batch auto assign
+    # -------------------------
+    async def auto_assign_batch(
+        self,
+        request_ids: Optional[List[str]] = None,
+        zone_id: Optional[str] = None,
+        limit: int = BATCH_ASSIGN_MAX,
+    ) -> Dict[str, Any]:
+        """
+        Jointly assign a wave of triaged requests (explicit ids, or every
+        triaged request in zone_id) with a min-cost matching over the same
+        zone/skill constraints as auto_assign, minimising workload imbalance
+        plus travel distance. All writes go out in one bulk_write.
+        """
+        started = datetime.utcnow()
+        sources = allowed_sources("assigned")
+        query: Dict[str, Any] = {"status": {"$in": sources}}
+        if request_ids:
+            if len(request_ids) > limit:
+                raise HTTPException(status_code=400, detail=f"At most {limit} request_ids per batch")
+            oids = [validate_object_id(rid) for rid in request_ids]
+            query["_id"] = {"$in": oids}
+        elif zone_id:
+            query["location.zone_id"] = zone_id
+        else:
+            raise HTTPException(status_code=400, detail="Provide request_ids or zone_id")
+
+        docs = await self.requests.find(
+            query, {"category": 1, "location": 1},
+        ).limit(limit).to_list(length=None)
+        by_oid = {d["_id"]: d for d in docs}
+
+        skipped: List[Dict[str, Any]] = []
+        if request_ids:
+            for oid in oids:
+                if oid not in by_oid:
+                    skipped.append({"request_id": str(oid), "reason": "not found or not triaged"})
+
+        roster = await agent_roster_cache.roster(self.agents)
+        if not roster.agents:
+            raise HTTPException(status_code=400, detail="No active agents available")
+
+        tasks: List[MatchTask] = []
+        shift_at = datetime.now(timezone.utc)
+        for d in docs:
+            loc = d.get("location") or {}
+            eligible = [str(a["_id"]) for a in roster.candidates(loc.get("zone_id"), d.get("category"), shift_at)]
+            tasks.append(MatchTask(d["_id"], as_lng_lat(loc.get("coordinates")), eligible))
+
+        agent_ids = sorted({aid for t in tasks for aid in t.eligible})
+        workloads = await self._compute_workloads(agent_ids)
+        anchors = {aid: agent_anchor(roster.by_id[aid]) for aid in agent_ids}
+
+        # CPU-bound: keep the event loop free while the matching runs
+        plan = await run_in_threadpool(solve_assignment, tasks, workloads, anchors)
+
+        batch_id = str(ObjectId())
+        now = datetime.utcnow()
+        policies = await self._sla_policies()
+        ops = []
+        for oid, (agent_id, _km) in plan.items():
+            d = by_oid[oid]
+            ops.append(UpdateOne(
+                {"_id": oid, "status": {"$in": sources}},
+                [build_kpi_snapshot_stage()] + self._assignment_pipeline({
+                    "assigned_agent_id": agent_id,
+                    "assigned_at": now,
+                    "method": "auto_batch",
+                    "batch_id": batch_id,
+                    "policy": {
+                        "zone_id": (d.get("location") or {}).get("zone_id"),
+                        "category": d.get("category"),
+                        "tie_breaker": "min_cost_matching",
+                    },
+                }, now, policies) + build_kpi_batch_stages(batch_id),
+            ))
+        if ops:
+            await self.requests.bulk_write(ops, ordered=False)
+
+        # requests that changed status in between were left alone by the filter
+        written = await take_kpi_batch(self.requests, batch_id)
+        if written and self.counters is not None:
+            await self.counters.record_batch(written)
+        written_oids = {w["_id"] for w in written}
+
+        assigned: List[Dict[str, Any]] = []
+        events = []
+        for oid, (agent_id, km) in plan.items():
+            if oid not in written_oids:
+                skipped.append({"request_id": str(oid), "reason": "status changed during assignment"})
+                continue
+            d = by_oid[oid]
+            heatmap_tile_cache.invalidate_request(d)
+            assigned.append({
+                "request_id": str(oid),
+                "agent_id": agent_id,
+                "distance_km": round(km, 2) if km is not None else None,
+            })
+            zone = (d.get("location") or {}).get("zone_id")
+            events.append((str(oid), PerformanceLogsRepository.build_event(
+                "assigned", "staff", "staff",
+                {"method": "auto_batch", "agent_id": agent_id, "zone_id": zone,
+                 "category": d.get("category"), "batch_id": batch_id},
+            )))
+        for t in tasks:
+            if t.key not in plan:
+                skipped.append({"request_id": str(t.key), "reason": "no suitable agents"})
+
+        if self.logs is not None and events:
+            await self.logs.append_events(events)
+
+        per_agent: Dict[str, int] = {}
+        for a in assigned:
+            per_agent[a["agent_id"]] = per_agent.get(a["agent_id"], 0) + 1
+
+        return {
+            "batch_id": batch_id,
+            "assigned": assigned,
+            "skipped": skipped,
+            "per_agent": per_agent,
+            "duration_ms": int((datetime.utcnow() - started).total_seconds() * 1000),
+        }
+
     # -------------------------
     # manual assign
     # -------------------------
-    def set_assigned_agent(self, request_id: str, agent_id: str) -> Dict[str, Any]:
+    async def set_assigned_agent(self, request_id: str, agent_id: str) -> Dict[str, Any]:
         roid = validate_object_id(request_id)
         aoid = validate_object_id(agent_id)
 
-        req = self.requests.find_one({"_id": roid})
-        if not req:
-            raise HTTPException(status_code=404, detail="Request not found")
-
-        agent = self.agents.find_one({"_id": aoid})
+        agent = await self.agents.find_one({"_id": aoid}, {"_id": 1})
         if not agent:
             raise HTTPException(status_code=404, detail="Agent not found")
 
-        now = datetime.utcnow()
-        update_doc = {
-            "status": "assigned",
-            "assignment": {
-                "assigned_agent_id": str(agent["_id"]),
-                "assigned_at": now,
-                "method": "manual",
-            },
-            "timestamps.assigned_at": now,
-            "timestamps.updated_at": now,
-            "updated_at": now,
-            "workflow.current_state": "assigned",
-        }
-
-        self.requests.update_one({"_id": roid}, {"$set": update_doc})
+        now = utcnow_ms()
+        updated = await self._apply_assignment(roid, {
+            "assigned_agent_id": str(agent["_id"]),
+            "assigned_at": now,
+            "method": "manual",
+        }, now)
+        if not updated:
+            raise HTTPException(status_code=404, detail="Request not found")
 
         # log
-        self._append_event(
+        await self._append_event(
             request_id=request_id,
             event_type="assigned",
             actor_type="staff",
             actor_id="staff",
             meta={"method": "manual", "agent_id": str(agent["_id"])},
         )
-
-        updated = self.requests.find_one({"_id": roid})
-        if not updated:
-            raise HTTPException(status_code=500, detail="Failed to fetch updated request")
-
-        updated["_id"] = str(updated["_id"])
         return updated
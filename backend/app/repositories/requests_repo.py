@@ -1,58 +1,119 @@
-from pymongo.collection import Collection
+from pymongo import ReturnDocument
+from pymongo.asynchronous.collection import AsyncCollection
 from datetime import datetime
-from typing import Dict, Optional, Any
+from typing import Dict, List, Optional, Any
 
 from fastapi import HTTPException
 from bson import ObjectId
 
-from app.models.request_models import CreateServiceRequest
+from app.models.request_models import CreateServiceRequest, RequestView
 from app.utils.objectid import validate_object_id
-from app.services.workflow_service import build_transition_update
-from app.services.sla_service import build_sla_fields_from_request
+from app.utils.pagination import encode_cursor, keyset_filter
+from app.repositories.performance_logs_repo import PerformanceLogsRepository
+from app.repositories.kpi_counters_repo import KpiCountersRepository
+from app.services.duplicate_service import attach_duplicate_suggestions, build_dedup_fields
+from app.core.app_config import settings
+from app.services.heatmap_service import BBox
+from app.services.heatmap_tile_cache import heatmap_tile_cache
+from app.services.map_clusters import cluster_requests
+from app.services.workflow_service import allowed_sources, build_transition_pipeline, transition_fields, validate_transition
+from app.services.sla_service import (
+    apply_sla_update,
+    build_sla_fields_from_request,
+    build_sla_update_stages,
+    next_sla_check_at,
+    utcnow_ms,
+)
+from app.utils.doc_paths import apply_set
+from app.services.sla_policy_cache import CompiledSlaPolicies, sla_policy_cache
+
+# Projection profiles, applied in the Mongo query: "map" is what a pin and
+# its popup need, "summary" a list/table row, "full" (None) the whole document
+# including sla_*, workflow, duplicates and idempotency.
+REQUEST_VIEWS: Dict[str, Optional[Dict[str, int]]] = {
+    "map": {
+        "category": 1,
+        "status": 1,
+        "priority": 1,
+        "description": 1,
+        "location.coordinates": 1,
+    },
+    "summary": {
+        "request_id": 1,
+        "category": 1,
+        "description": 1,
+        "priority": 1,
+        "status": 1,
+        "sla_state": 1,
+        "location": 1,
+        "created_at": 1,
+        "timestamps.created_at": 1,
+        "timestamps.updated_at": 1,
+        "assignment.assigned_agent_id": 1,
+    },
+    "full": None,
+}
+
+NEARBY_LIMIT = 200
+
+
+def view_projection(view: RequestView, *required: str) -> Optional[Dict[str, int]]:
+    """Projection for a view, plus fields the caller needs (e.g. the keyset sort key)."""
+    projection = REQUEST_VIEWS[view]
+    if projection is None:
+        return None
+    return {**projection, **{f: 1 for f in required}}
 
 
 class RequestsRepository:
-    def __init__(self, collection: Collection, logs_collection: Optional[Collection] = None):
+    def __init__(
+        self,
+        collection: AsyncCollection,
+        logs_collection: Optional[AsyncCollection] = None,
+        counters_collection: Optional[AsyncCollection] = None,
+    ):
         self.collection = collection
         self.logs_collection = logs_collection
+        self.logs = PerformanceLogsRepository(logs_collection) if logs_collection is not None else None
+        self.counters = KpiCountersRepository(counters_collection) if counters_collection is not None else None
+
+    # -------------------------
+    # helpers: SLA policies
+    # -------------------------
+    async def _sla_policies(self) -> CompiledSlaPolicies:
+        # compiled in-process; the DB is only asked for the table version every few seconds
+        return await sla_policy_cache.policies(self.collection.database.sla_policies)
 
     # -------------------------
     # helpers: logs
     # -------------------------
-    def _append_event(
+    async def _append_event(
         self,
         request_oid: ObjectId,
         event_type: str,
         actor_type: str,
         actor_id: str,
         meta: Optional[Dict[str, Any]] = None,
+        computed_kpis: Optional[Dict[str, Any]] = None,
     ) -> None:
-        if self.logs_collection is None:
+        """
+        Append an event to the request's performance log. When computed_kpis is
+        given, the KPI snapshot is stored in the same header update.
+        """
+        if self.logs is None:
             return
-
-        rid = str(request_oid)
-        evt = {
-            "type": event_type,
-            "by": {"actor_type": actor_type, "actor_id": actor_id},
-            "at": datetime.utcnow(),
-            "meta": meta or {},
-        }
-        self.logs_collection.update_one(
-            {"request_id": rid},
-            {"$push": {"event_stream": evt}, "$setOnInsert": {"created_at": datetime.utcnow()}},
-            upsert=True,
+        await self.logs.append_event(
+            str(request_oid), event_type, actor_type, actor_id, meta, computed_kpis=computed_kpis,
         )
 
-    def _set_computed_kpis(self, request_oid: ObjectId, kpis: Dict[str, Any]) -> None:
-        if self.logs_collection is None:
+    # -------------------------
+    # helpers: KPI counters
+    # -------------------------
+    async def _record_kpi_change(self, before: Dict[str, Any], updated: Dict[str, Any]) -> None:
+        heatmap_tile_cache.invalidate_request(updated)
+        if self.counters is None:
             return
-
-        rid = str(request_oid)
-        self.logs_collection.update_one(
-            {"request_id": rid},
-            {"$set": {"computed_kpis": kpis, "updated_at": datetime.utcnow()}},
-            upsert=True,
-        )
+        await self.counters.record_change(before, updated)
 
     # -------------------------
     # helpers: timestamps shape
@@ -80,25 +141,18 @@ class RequestsRepository:
     # -------------------------
     # helpers: duplicates merge
     # -------------------------
-    def merge_into_master(self, duplicate_request_id: str, master_request_id: str) -> Dict[str, Any]:
+    async def merge_into_master(self, duplicate_request_id: str, master_request_id: str) -> Dict[str, Any]:
         dup_oid = validate_object_id(duplicate_request_id)
         master_oid = validate_object_id(master_request_id)
 
         if dup_oid == master_oid:
             raise HTTPException(status_code=400, detail="master_request_id cannot equal request_id")
 
-        dup = self.collection.find_one({"_id": dup_oid})
-        master = self.collection.find_one({"_id": master_oid})
-        if not dup:
-            raise HTTPException(status_code=404, detail="Duplicate request not found")
-        if not master:
-            raise HTTPException(status_code=404, detail="Master request not found")
-
-        # ensure master marked correctly
         now = datetime.utcnow()
 
         # 1) update duplicate: mark as non-master, set master_request_id
-        self.collection.update_one(
+        #    (pre-image kept so the link can be undone if the master is missing)
+        dup_before = await self.collection.find_one_and_update(
             {"_id": dup_oid},
             {"$set": {
                 "duplicates.is_master": False,
@@ -106,10 +160,14 @@ class RequestsRepository:
                 "updated_at": now,
                 "timestamps.updated_at": now,
             }},
+            projection={"duplicates": 1},
+            return_document=ReturnDocument.BEFORE,
         )
+        if dup_before is None:
+            raise HTTPException(status_code=404, detail="Duplicate request not found")
 
         # 2) update master: ensure is_master and add linked duplicate id
-        self.collection.update_one(
+        updated_master = await self.collection.find_one_and_update(
             {"_id": master_oid},
             {"$set": {
                 "duplicates.is_master": True,
@@ -118,23 +176,28 @@ class RequestsRepository:
                 "timestamps.updated_at": now,
             },
              "$addToSet": {"duplicates.linked_duplicates": str(dup_oid)}},
+            return_document=ReturnDocument.AFTER,
         )
-
-        # logs (optional)
-        self._append_event(master_oid, "duplicate_linked", "staff", "staff", {"duplicate_id": str(dup_oid)})
-        self._append_event(dup_oid, "duplicate_marked", "staff", "staff", {"master_id": str(master_oid)})
-
-        updated_master = self.collection.find_one({"_id": master_oid})
         if updated_master is None:
-            raise HTTPException(status_code=500, detail="Failed to fetch master request")
+            await self.collection.update_one(
+                {"_id": dup_oid},
+                {"$set": {"duplicates": dup_before.get("duplicates") or {
+                    "is_master": True,
+                    "master_request_id": None,
+                    "linked_duplicates": [],
+                }}},
+            )
+            raise HTTPException(status_code=404, detail="Master request not found")
 
-        updated_master["_id"] = str(updated_master["_id"])
+        # logs (optional)
+        await self._append_event(master_oid, "duplicate_linked", "staff", "staff", {"duplicate_id": str(dup_oid)})
+        await self._append_event(dup_oid, "duplicate_marked", "staff", "staff", {"master_id": str(master_oid)})
         return updated_master
 
     # -------------------------
     # create (with idempotency)
     # -------------------------
-    def create_request(
+    async def create_request(
         self,
         data: CreateServiceRequest,
         citizen_id: str,
@@ -143,12 +206,11 @@ class RequestsRepository:
 
         # ✅ Idempotency: if key exists for same citizen, return existing request
         if idempotency_key:
-            existing = self.collection.find_one({
+            existing = await self.collection.find_one({
                 "idempotency.key": idempotency_key,
                 "citizen_id": citizen_id,
             })
             if existing:
-                existing["_id"] = str(existing["_id"])
                 return existing
 
         doc = data.dict()
@@ -166,6 +228,8 @@ class RequestsRepository:
             "master_request_id": None,
             "linked_duplicates": [],
         }
+        # MinHash of the description, compared by the near-duplicate finder
+        doc["dedup"] = build_dedup_fields(doc.get("description"))
 
         if idempotency_key:
             doc["idempotency"] = {
@@ -175,36 +239,58 @@ class RequestsRepository:
 
         doc = self._ensure_timestamps_shape(doc)
 
-        sla_fields = build_sla_fields_from_request(doc)
+        sla_fields = build_sla_fields_from_request(doc, policies=await self._sla_policies())
         doc["sla_policy"] = sla_fields["sla_policy"]
         doc["sla_state"] = sla_fields["computed_kpis"]["sla_state"]
         doc["sla_computed"] = sla_fields["computed_kpis"]
+        next_check = next_sla_check_at(
+            doc["sla_policy"], doc["sla_computed"]["milestones"]["created_at"], doc.get("status"),
+        )
+        if next_check is not None:
+            doc["sla_next_check_at"] = next_check
 
-        result = self.collection.insert_one(doc)
-        oid = result.inserted_id
+        # request_id = _id string (id generated client-side so the insert is the only write)
+        oid = ObjectId()
+        doc["_id"] = oid
+        doc["request_id"] = str(oid)
 
-        # request_id = _id string
-        self.collection.update_one({"_id": oid}, {"$set": {"request_id": str(oid)}})
+        await self.collection.insert_one(doc)
 
-        doc["_id"] = str(oid)
-        doc["request_id"] = str(oid)
+        heatmap_tile_cache.invalidate_request(doc)
+        if self.counters is not None:
+            await self.counters.record_created(doc)
 
-        self._append_event(oid, "created", "citizen", str(citizen_id), {"channel": "web"})
-        self._set_computed_kpis(oid, sla_fields["computed_kpis"])
+        await self._append_event(
+            oid, "created", "citizen", str(citizen_id), {"channel": "web"},
+            computed_kpis=sla_fields["computed_kpis"],
+        )
+
+        # advisory only: runs after the insert and never fails the create
+        await attach_duplicate_suggestions(self.collection, doc)
 
         return doc
 
     # -------------------------
     # list (staff)
     # -------------------------
-    def list_requests(
+    async def list_requests(
         self,
         status: Optional[str] = None,
         category: Optional[str] = None,
         priority: Optional[str] = None,
         page: int = 1,
         page_size: int = 10,
+        after: Optional[str] = None,
+        include_total: bool = True,
+        view: RequestView = "full",
     ) -> Dict[str, Any]:
+        """
+        Newest-first listing, projected to `view`. With `after` (a next_cursor from a previous page)
+        the page is located by keyset on (created_at, _id) instead of skip, so
+        deep pages cost the same as the first one. `total` is exact when
+        filtered, an estimate from collection metadata when unfiltered, and
+        None when include_total is False.
+        """
         query: Dict[str, Any] = {}
         if status:
             query["status"] = status
@@ -215,89 +301,96 @@ class RequestsRepository:
 
         page = max(page, 1)
         page_size = min(max(page_size, 1), 100)
-        skip = (page - 1) * page_size
 
+        find_query = dict(query)
+        if after:
+            find_query.update(keyset_filter(after))
+            skip = 0
+        else:
+            skip = (page - 1) * page_size
+
+        # fetch one extra row to know whether another page exists
         cursor = (
-            self.collection.find(query)
-            .sort("created_at", -1)
+            self.collection.find(find_query, view_projection(view, "created_at"))
+            .sort([("created_at", -1), ("_id", -1)])
             .skip(skip)
-            .limit(page_size)
+            .limit(page_size + 1)
         )
 
-        items = []
-        for r in cursor:
-            r["_id"] = str(r["_id"])
-            items.append(r)
-
-        total = self.collection.count_documents(query)
-        return {"items": items, "page": page, "page_size": page_size, "total": total}
+        items = await cursor.to_list(length=None)
+
+        has_more = len(items) > page_size
+        items = items[:page_size]
+        next_cursor = encode_cursor(items[-1]) if has_more else None
+        total: Optional[int] = None
+        if include_total:
+            if query:
+                total = await self.collection.count_documents(query)
+            else:
+                total = await self.collection.estimated_document_count()
+
+        return {
+            "items": items,
+            "page": page,
+            "page_size": page_size,
+            "total": total,
+            "next_cursor": next_cursor,
+        }
 
     # -------------------------
     # get by id
     # -------------------------
-    def get_by_id(self, request_id: str) -> Dict[str, Any]:
+    async def get_by_id(self, request_id: str) -> Dict[str, Any]:
         oid = validate_object_id(request_id)
-        r = self.collection.find_one({"_id": oid})
+        r = await self.collection.find_one({"_id": oid})
         if not r:
             raise HTTPException(status_code=404, detail="Not found")
-        r["_id"] = str(r["_id"])
         return r
 
     # -------------------------
     # workflow transition (staff)
     # -------------------------
-    def transition_request(self, request_id: str, next_status: str) -> Dict[str, Any]:
+    async def transition_request(self, request_id: str, next_status: str) -> Dict[str, Any]:
         oid = validate_object_id(request_id)
+        now = utcnow_ms()
 
-        request = self.collection.find_one({"_id": oid})
-        if not request:
-            raise HTTPException(status_code=404, detail="Request not found")
-
-        current_status = request.get("status", "new")
-
-        update = build_transition_update(current_status=current_status, next_status=next_status)
+        policies = await self._sla_policies()
 
-        existing_ts = request.get("timestamps") or {}
-        for k in ["triaged_at", "assigned_at", "work_started_at", "resolved_at", "closed_at"]:
-            if existing_ts.get(k) is not None:
-                update["$set"].pop(f"timestamps.{k}", None)
-
-        res = self.collection.update_one({"_id": oid}, update)
-        if res.matched_count == 0:
-            raise HTTPException(status_code=404, detail="Request not found")
-
-        updated = self.collection.find_one({"_id": oid})
-        if updated is None:
-            raise HTTPException(status_code=500, detail="Failed to fetch updated request")
-
-        updated = self._ensure_timestamps_shape(updated)
-        sla_fields = build_sla_fields_from_request(updated)
-
-        self.collection.update_one(
-            {"_id": oid},
-            {"$set": {
-                "sla_policy": sla_fields["sla_policy"],
-                "sla_state": sla_fields["computed_kpis"]["sla_state"],
-                "sla_computed": sla_fields["computed_kpis"],
-                "updated_at": datetime.utcnow(),
-                "timestamps.updated_at": datetime.utcnow(),
-            }},
+        # status guard in the filter makes validate + write a single atomic round trip;
+        # the pre-image feeds the KPI deltas and the post-image is derived from it
+        before = await self.collection.find_one_and_update(
+            {"_id": oid, "status": {"$in": allowed_sources(next_status)}},
+            build_transition_pipeline(next_status, now) + build_sla_update_stages(now, policies=policies),
+            return_document=ReturnDocument.BEFORE,
         )
 
-        self._append_event(oid, "transition", "staff", "staff", {"from": current_status, "to": next_status})
-        self._set_computed_kpis(oid, sla_fields["computed_kpis"])
+        if before is None:
+            current = await self.collection.find_one({"_id": oid}, {"status": 1})
+            if not current:
+                raise HTTPException(status_code=404, detail="Request not found")
+            validate_transition(current.get("status", "new"), next_status)
+            raise HTTPException(status_code=409, detail="Request status changed concurrently, retry")
 
-        updated2 = self.collection.find_one({"_id": oid})
-        if updated2 is None:
-            raise HTTPException(status_code=500, detail="Failed to fetch updated request")
+        updated = apply_sla_update(apply_set(before, transition_fields(before, next_status, now)), now, policies)
+        await self._record_kpi_change(before, updated)
 
-        updated2["_id"] = str(updated2["_id"])
-        return updated2
+        current_status = (updated.get("workflow") or {}).get("previous_state", "new")
+        await self._append_event(
+            oid, "transition", "staff", "staff", {"from": current_status, "to": next_status},
+            computed_kpis=updated.get("sla_computed"),
+        )
+        return updated
 
     # -------------------------
     # geo nearby
     # -------------------------
-    def nearby(self, lng: float, lat: float, radius_m: int = 1000) -> Dict[str, Any]:
+    async def nearby(
+        self,
+        lng: float,
+        lat: float,
+        radius_m: int = 1000,
+        view: RequestView = "map",
+    ) -> Dict[str, Any]:
         query = {
             "location": {
                 "$near": {
@@ -307,64 +400,86 @@ class RequestsRepository:
             }
         }
 
-        items = []
-        for r in self.collection.find(query).limit(200):
-            r["_id"] = str(r["_id"])
-            items.append(r)
+        items = await self.collection.find(query, view_projection(view)).limit(NEARBY_LIMIT).to_list(length=None)
+
+        # a full page means closer-than-radius points hid the rest: use the clustered mode
+        return {"items": items, "truncated": len(items) == NEARBY_LIMIT}
 
-        return {"items": items}
+    async def nearby_clusters(
+        self,
+        bbox: BBox,
+        zoom: int,
+        statuses: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """Every request in bbox as grid clusters (dense cells) and map-view points (sparse cells)."""
+        return await cluster_requests(
+            self.collection,
+            bbox,
+            zoom,
+            statuses=statuses,
+            point_threshold=settings.MAP_CLUSTER_POINT_THRESHOLD,
+            max_cells=settings.MAP_CLUSTER_MAX_CELLS,
+        )
 
     # -------------------------
     # citizen list
     # -------------------------
-    def list_by_citizen(self, citizen_id: str) -> Dict[str, Any]:
+    async def list_by_citizen(
+        self,
+        citizen_id: str,
+        view: RequestView = "full",
+        page_size: int = 50,
+        after: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        A citizen's requests, newest first, keyset-paged on (created_at, _id)
+        over the (citizen_id, created_at, _id) index. citizen_id is stored as a
+        string (python -m app.jobs.normalize_citizen_ids converts legacy
+        ObjectIds), so this is a single equality match.
+        """
+        page_size = min(max(page_size, 1), 100)
         q: Dict[str, Any] = {"citizen_id": citizen_id}
-        if ObjectId.is_valid(citizen_id):
-            q = {"$or": [{"citizen_id": citizen_id}, {"citizen_id": ObjectId(citizen_id)}]}
+        if after:
+            q.update(keyset_filter(after))
 
-        cursor = self.collection.find(q).sort("created_at", -1)
-        items = []
-        for r in cursor:
-            r["_id"] = str(r["_id"])
-            items.append(r)
-
-        return {"items": items}
+        cursor = (
+            self.collection.find(q, view_projection(view, "created_at"))
+            .sort([("created_at", -1), ("_id", -1)])
+            .limit(page_size + 1)
+        )
+        items = await cursor.to_list(length=None)
+
+        has_more = len(items) > page_size
+        items = items[:page_size]
+        return {
+            "items": items,
+            "page_size": page_size,
+            "next_cursor": encode_cursor(items[-1]) if has_more else None,
+        }
 
     # -------------------------
     # priority update (staff)
     # -------------------------
-    def update_priority(self, request_id: str, priority: str) -> Dict[str, Any]:
+    async def update_priority(self, request_id: str, priority: str) -> Dict[str, Any]:
         oid = validate_object_id(request_id)
+        now = utcnow_ms()
+        policies = await self._sla_policies()
+        fields = {"priority": priority, "updated_at": now, "timestamps.updated_at": now}
 
-        self.collection.update_one(
+        # the policy depends on priority: resolve it again, in the pipeline
+        before = await self.collection.find_one_and_update(
             {"_id": oid},
-            {"$set": {"priority": priority, "updated_at": datetime.utcnow(), "timestamps.updated_at": datetime.utcnow()}},
+            [{"$set": fields}] + build_sla_update_stages(now, policies=policies, reresolve=True),
+            return_document=ReturnDocument.BEFORE,
         )
-
-        updated = self.collection.find_one({"_id": oid})
-        if not updated:
+        if not before:
             raise HTTPException(status_code=404, detail="Request not found")
 
-        updated = self._ensure_timestamps_shape(updated)
-        sla_fields = build_sla_fields_from_request(updated)
+        updated = apply_sla_update(apply_set(before, fields), now, policies, reresolve=True)
+        await self._record_kpi_change(before, updated)
 
-        self.collection.update_one(
-            {"_id": oid},
-            {"$set": {
-                "sla_policy": sla_fields["sla_policy"],
-                "sla_state": sla_fields["computed_kpis"]["sla_state"],
-                "sla_computed": sla_fields["computed_kpis"],
-                "updated_at": datetime.utcnow(),
-                "timestamps.updated_at": datetime.utcnow(),
-            }},
+        await self._append_event(
+            oid, "priority_updated", "staff", "staff", {"priority": priority},
+            computed_kpis=updated.get("sla_computed"),
         )
-
-        self._append_event(oid, "priority_updated", "staff", "staff", {"priority": priority})
-        self._set_computed_kpis(oid, sla_fields["computed_kpis"])
-
-        updated2 = self.collection.find_one({"_id": oid})
-        if updated2 is None:
-            raise HTTPException(status_code=500, detail="Failed to fetch updated request")
-
-        updated2["_id"] = str(updated2["_id"])
-        return updated2
+        return updated
@@ -0,0 +1,69 @@
+from pymongo import ReturnDocument
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime
+from typing import Any, Dict
+from fastapi import HTTPException
+
+from app.services.sla_calendar import compile_calendar
+from app.services.sla_policy_cache import META_COLLECTION, META_ID, sla_policy_cache
+
+
+class SlaPoliciesRepository:
+    """
+    sla_policies: per category / zone / priority SLA overrides, keyed by
+    policy_id. Every write bumps the table version in sla_policy_meta, which
+    is how the policy caches in all processes notice the change.
+    """
+
+    def __init__(self, collection: AsyncCollection):
+        self.collection = collection
+        self.meta = collection.database[META_COLLECTION]
+
+    async def _bump_version(self) -> int:
+        meta = await self.meta.find_one_and_update(
+            {"_id": META_ID},
+            {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        sla_policy_cache.invalidate()
+        return int(meta["version"])
+
+    async def list_all(self) -> Dict[str, Any]:
+        items = await self.collection.find({}).sort("policy_id", 1).to_list(length=None)
+        meta = await self.meta.find_one({"_id": META_ID})
+        return {"items": items, "version": int((meta or {}).get("version", 0))}
+
+    async def upsert(self, policy_id: str, data: dict) -> Dict[str, Any]:
+        breach = data.get("breach_threshold_hours")
+        if breach is not None and breach < data["target_hours"]:
+            raise HTTPException(status_code=400, detail="breach_threshold_hours must be >= target_hours")
+        if data.get("calendar"):
+            try:
+                data["calendar"] = compile_calendar(data["calendar"])
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        now = datetime.utcnow()
+        try:
+            doc = await self.collection.find_one_and_update(
+                {"policy_id": policy_id},
+                {"$set": {**data, "policy_id": policy_id, "updated_at": now}, "$setOnInsert": {"created_at": now}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            raise HTTPException(
+                status_code=409,
+                detail="Another policy already matches this category / zone_id / priority",
+            )
+        await self._bump_version()
+        return doc
+
+    async def delete(self, policy_id: str) -> Dict[str, Any]:
+        res = await self.collection.delete_one({"policy_id": policy_id})
+        if res.deleted_count == 0:
+            raise HTTPException(status_code=404, detail="SLA policy not found")
+        version = await self._bump_version()
+        return {"deleted": policy_id, "version": version}
@@ -1,36 +1,36 @@
-from pymongo.collection import Collection
+from pymongo.asynchronous.collection import AsyncCollection
 from datetime import datetime
-from app.core.security import hash_password
+from app.core.security import password_hasher
+from app.services.display_name_cache import display_name_cache
 
 class UsersRepository:
-    def __init__(self, collection: Collection):
+    def __init__(self, collection: AsyncCollection):
         self.collection = collection
-        self.collection.create_index("email", unique=True)
 
-    def create_citizen(self, name: str, email: str, password: str):
+    async def create_citizen(self, name: str, email: str, password: str):
         user = {
             "name": name,
             "email": email,
-            "password_hash": hash_password(password),
+            "password_hash": await password_hasher.hash(password),
             "role": "citizen",
             "created_at": datetime.utcnow()
         }
-        self.collection.insert_one(user)
-        user["_id"] = str(user["_id"])
+        await self.collection.insert_one(user)
+        display_name_cache.invalidate(email)
         return user
 
     # ✅ NEW
-    def create_staff(self, name: str, email: str, password: str):
+    async def create_staff(self, name: str, email: str, password: str):
         user = {
             "name": name,
             "email": email,
-            "password_hash": hash_password(password),
+            "password_hash": await password_hasher.hash(password),
             "role": "staff",
             "created_at": datetime.utcnow()
         }
-        self.collection.insert_one(user)
-        user["_id"] = str(user["_id"])
+        await self.collection.insert_one(user)
+        display_name_cache.invalidate(email)
         return user
 
-    def find_by_email(self, email: str):
-        return self.collection.find_one({"email": email})
+    async def find_by_email(self, email: str):
+        return await self.collection.find_one({"email": email})
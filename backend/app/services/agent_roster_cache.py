@@ -0,0 +1,152 @@
+# app/services/agent_roster_cache.py
+from __future__ import annotations
+
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set
+
+from pymongo.asynchronous.collection import AsyncCollection
+
+from app.core.app_config import settings
+from app.services.assignment_service import ShiftBitmap, shift_index
+
+# agents with this skill can take any category
+GENERAL_SKILL = "general"
+
+
+def agent_zones(agent: Dict[str, Any]) -> Set[str]:
+    """
+    Zones an agent covers: coverage.zone_ids (AgentCreate shape) plus the
+    legacy coverage_zones / zone_id fields.
+    """
+    zones: Set[str] = set()
+    coverage = agent.get("coverage") or {}
+    if isinstance(coverage, dict) and isinstance(coverage.get("zone_ids"), list):
+        zones.update(str(z) for z in coverage["zone_ids"] if z)
+    if isinstance(agent.get("coverage_zones"), list):
+        zones.update(str(z) for z in agent["coverage_zones"] if z)
+    if agent.get("zone_id"):
+        zones.add(str(agent["zone_id"]))
+    return zones
+
+
+def agent_skills(agent: Dict[str, Any]) -> Set[str]:
+    skills = agent.get("skills")
+    return {str(s) for s in skills if s} if isinstance(skills, list) else set()
+
+
+class AgentRoster:
+    """Immutable snapshot of the active agents, indexed by zone and skill."""
+
+    def __init__(self, agents: List[Dict[str, Any]]):
+        self.agents = agents
+        self.by_id: Dict[str, Dict[str, Any]] = {str(a["_id"]): a for a in agents}
+        self.by_zone: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_skill: Dict[str, List[Dict[str, Any]]] = {}
+        self.unskilled: List[Dict[str, Any]] = []
+        self.shifts: Dict[str, ShiftBitmap] = {}
+        for a in agents:
+            self.shifts[str(a["_id"])] = shift_index.bitmap(a)
+            for z in agent_zones(a):
+                self.by_zone.setdefault(z, []).append(a)
+            skills = agent_skills(a)
+            if not skills:
+                self.unskilled.append(a)
+            for s in skills:
+                self.by_skill.setdefault(s, []).append(a)
+
+    def on_shift(self, agents: List[Dict[str, Any]], at: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Agents on shift at `at` (now): one bitmap lookup each, one tz conversion per timezone."""
+        at = at or datetime.now(timezone.utc)
+        minute_by_tz: Dict[Any, int] = {}
+        result = []
+        for a in agents:
+            bm = self.shifts[str(a["_id"])]
+            if bm.always:
+                result.append(a)
+                continue
+            m = minute_by_tz.get(bm.tz)
+            if m is None:
+                m = minute_by_tz[bm.tz] = bm.minute_of_week(at)
+            if bm.bits[m >> 3] >> (m & 7) & 1:
+                result.append(a)
+        return result
+
+    def candidates(
+        self,
+        zone_id: Optional[str],
+        category: Optional[str],
+        at: Optional[datetime] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Agents eligible for a request, in roster order:
+          - zone: agents covering zone_id (all agents if none do)
+          - skill: agents with the category or "general" skill, or no skills
+            at all (the zone pool if none match)
+          - shift: agents on shift at `at` (now), or on call (the skill pool
+            if nobody is)
+        """
+        pool = (self.by_zone.get(zone_id) if zone_id else None) or self.agents
+        if category:
+            skilled = {
+                id(a)
+                for a in self.by_skill.get(category, []) + self.by_skill.get(GENERAL_SKILL, []) + self.unskilled
+            }
+            pool = [a for a in pool if id(a) in skilled] or pool
+
+        return self.on_shift(pool, at) or pool
+
+
+class AgentRosterCache:
+    """
+    Process-local cache of the active agent roster. Reloaded after ttl_seconds
+    or when AgentsRepository writes call invalidate(). Invalidation is per
+    process; the TTL bounds staleness across workers.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._roster: Optional[AgentRoster] = None
+        self._expires_at = 0.0
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self.loads = 0
+        self.hits = 0
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._roster = None
+
+    async def roster(self, col: AsyncCollection) -> AgentRoster:
+        roster = self._roster
+        if roster is not None and self._expires_at > time.monotonic():
+            self.hits += 1
+            return roster
+
+        async with self._lock:
+            # another caller may have reloaded while we waited
+            if self._roster is not None and self._expires_at > time.monotonic():
+                self.hits += 1
+                return self._roster
+            generation = self._generation
+            agents = await col.find({"active": True}).to_list(length=None)
+            roster = AgentRoster(agents)
+            shift_index.retain(roster.by_id)
+            self.loads += 1
+            # an agent write during the load leaves the cache empty for the next caller
+            if generation == self._generation:
+                self._roster = roster
+                self._expires_at = time.monotonic() + self.ttl_seconds
+            return roster
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "agents": len(self._roster.agents) if self._roster is not None else None,
+            "ttl_seconds": self.ttl_seconds,
+            "loads": self.loads,
+            "hits": self.hits,
+        }
+
+
+agent_roster_cache = AgentRosterCache(ttl_seconds=settings.AGENT_ROSTER_TTL_SECONDS)
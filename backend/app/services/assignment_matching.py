@@ -0,0 +1,256 @@
+# app/services/assignment_matching.py
+from __future__ import annotations
+
+import heapq
+import math
+import sys
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+# Cost model for batch auto-assignment (all costs in "load units"):
+#   - giving an agent its k-th extra task costs LOAD_WEIGHT * (open workload + k),
+#     the marginal cost of sum(load^2)/2, so minimising the total spreads work evenly
+#   - travel adds DISTANCE_WEIGHT_PER_KM per km between the request and the agent
+#     anchor (geo_fence centroid); unknown positions add nothing
+LOAD_WEIGHT = 1.0
+DISTANCE_WEIGHT_PER_KM = 0.2
+
+# the solver works in integer costs (tenths of a load unit), so augmenting
+# paths of equal length tie exactly and many are pushed per Dijkstra phase
+COST_SCALE = 10
+
+# requests with the same eligible agents in the same cell are solved as one
+# supply node (distance is measured from the cell, ~500 m)
+CLASS_CELL_DEG = 0.005
+
+EARTH_RADIUS_KM = 6371.0
+
+LngLat = Tuple[float, float]
+
+
+def haversine_km(a: LngLat, b: LngLat) -> float:
+    lng1, lat1 = map(math.radians, a)
+    lng2, lat2 = map(math.radians, b)
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(h)))
+
+
+def as_lng_lat(coordinates: Any) -> Optional[LngLat]:
+    try:
+        lng, lat = (float(v) for v in coordinates)
+    except (TypeError, ValueError):
+        return None
+    return lng, lat
+
+
+def agent_anchor(agent: Dict[str, Any]) -> Optional[LngLat]:
+    """Centroid of the agent's coverage.geo_fence outer ring (vertex mean), if any."""
+    fence = (agent.get("coverage") or {}).get("geo_fence") or {}
+    coords = fence.get("coordinates")
+    ring: Sequence[Any] = []
+    if fence.get("type") == "Polygon" and coords:
+        ring = coords[0]
+    elif fence.get("type") == "MultiPolygon" and coords and coords[0]:
+        ring = coords[0][0]
+    points = [p for p in (as_lng_lat(v) for v in ring) if p is not None]
+    if not points:
+        return None
+    return sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points)
+
+
+class MatchTask:
+    """One request to place: its position and the agents allowed to take it."""
+
+    __slots__ = ("key", "position", "eligible")
+
+    def __init__(self, key: Hashable, position: Optional[LngLat], eligible: List[str]):
+        self.key = key
+        self.position = position
+        self.eligible = eligible
+
+
+def _components(classes: List[Tuple[Tuple[str, ...], Any]]) -> List[List[int]]:
+    """Group class indexes whose eligible agent sets overlap (union-find on agents)."""
+    parent: Dict[str, str] = {}
+
+    def find(x: str) -> str:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for agents, _ in classes:
+        for a in agents:
+            parent.setdefault(a, a)
+        for a in agents[1:]:
+            ra, rb = find(agents[0]), find(a)
+            if ra != rb:
+                parent[rb] = ra
+
+    groups: Dict[str, List[int]] = {}
+    for i, (agents, _) in enumerate(classes):
+        groups.setdefault(find(agents[0]), []).append(i)
+    return list(groups.values())
+
+
+class _ComponentFlow:
+    """
+    Min-cost flow for one component by successive shortest paths, adding one
+    unit of supply at a time: each request starts a Dijkstra (with potentials)
+    at its class node and stops as soon as the sink is settled, which usually
+    touches only a few agents. Paths may reassign earlier requests through
+    reverse arcs, so the result is the joint optimum, not a greedy one.
+
+    Nodes: 0..C-1 = classes, C..C+A-1 = agents, C+A = sink. Costs are integers.
+    class -> agent (unbounded), agent -> sink convex (k-th unit costs load + k),
+    agent -> class reverse arcs where flow > 0.
+    """
+
+    def __init__(self, supply: List[int], edges: List[List[Tuple[int, int]]], loads: List[int]):
+        self.n_cls, self.n_agents = len(supply), len(loads)
+        self.sink = self.n_cls + self.n_agents
+        self.supply = supply
+        self.edges = edges
+        self.edge_cost = [dict(row) for row in edges]
+        self.load_cost = round(COST_SCALE * LOAD_WEIGHT)
+        self.loads = loads
+        self.assigned = [0] * self.n_agents
+        self.flow: List[Dict[int, int]] = [{} for _ in range(self.n_cls)]
+        # reverse residual arcs agent -> class (only where flow > 0)
+        self.back: List[Dict[int, int]] = [{} for _ in range(self.n_agents)]
+        self.potential = [0] * (self.sink + 1)
+
+    def _shortest_path(self, start: int) -> Optional[List[int]]:
+        n_cls, sink, pot = self.n_cls, self.sink, self.potential
+        dist: Dict[int, int] = {start: 0}
+        prev: Dict[int, int] = {}
+        settled: List[int] = []
+        done = set()
+        heap: List[Tuple[int, int]] = [(0, start)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            done.add(u)
+            settled.append(u)
+            if u == sink:
+                break
+            if u < n_cls:
+                arcs = [(n_cls + a, cost) for a, cost in self.edges[u]]
+            else:
+                a = u - n_cls
+                arcs = [(c, -cost) for c, cost in self.back[a].items()]
+                arcs.append((sink, self.load_cost * (self.loads[a] + self.assigned[a])))
+            pu = pot[u]
+            for v, cost in arcs:
+                nd = d + cost + pu - pot[v]
+                if nd < dist.get(v, sys.maxsize):
+                    dist[v] = nd
+                    prev[v] = u
+                    heapq.heappush(heap, (nd, v))
+
+        if sink not in done:
+            return None
+        # settled nodes move by (d - d_sink); everything else keeps its potential
+        # (a uniform shift), which keeps every reduced cost >= 0
+        d_sink = dist[sink]
+        for v in settled:
+            pot[v] += dist[v] - d_sink
+
+        path = [sink]
+        while path[-1] != start:
+            path.append(prev[path[-1]])
+        path.reverse()
+        return path
+
+    def _augment(self, path: List[int]) -> None:
+        n_cls = self.n_cls
+        for u, v in zip(path, path[1:]):
+            if v == self.sink:
+                self.assigned[u - n_cls] += 1
+            elif u < n_cls:  # class -> agent
+                c, a = u, v - n_cls
+                self.flow[c][a] = self.flow[c].get(a, 0) + 1
+                self.back[a][c] = self.edge_cost[c][a]
+            else:  # agent -> class: undo one unit of that pairing
+                c, a = v, u - n_cls
+                self.flow[c][a] -= 1
+                if not self.flow[c][a]:
+                    del self.flow[c][a]
+                    del self.back[a][c]
+
+    def solve(self) -> List[Dict[int, int]]:
+        """Returns flow[c] = {agent index: units}."""
+        for c, units in enumerate(self.supply):
+            for _ in range(units):
+                path = self._shortest_path(c)
+                if path is None:
+                    break
+                self._augment(path)
+        return self.flow
+
+
+def solve_assignment(
+    tasks: List[MatchTask],
+    workloads: Dict[str, int],
+    anchors: Dict[str, Optional[LngLat]],
+) -> Dict[Hashable, Tuple[str, Optional[float]]]:
+    """
+    Jointly assign tasks to eligible agents, minimising
+        LOAD_WEIGHT * sum(load^2)/2 + DISTANCE_WEIGHT_PER_KM * total km
+    with an exact min-cost flow per independent group of agents.
+    Returns {task key: (agent id, distance km or None)}; tasks with no
+    eligible agent are left out.
+    """
+    # collapse interchangeable tasks into classes
+    class_index: Dict[Tuple[Tuple[str, ...], Any], int] = {}
+    classes: List[Tuple[Tuple[str, ...], Any]] = []
+    members: List[List[MatchTask]] = []
+    for t in tasks:
+        if not t.eligible:
+            continue
+        cell = None
+        if t.position is not None:
+            cell = (math.floor(t.position[0] / CLASS_CELL_DEG), math.floor(t.position[1] / CLASS_CELL_DEG))
+        key = (tuple(sorted(set(t.eligible))), cell)
+        if key not in class_index:
+            class_index[key] = len(classes)
+            classes.append(key)
+            members.append([])
+        members[class_index[key]].append(t)
+
+    def cell_center(cell: Any) -> Optional[LngLat]:
+        if cell is None:
+            return None
+        return (cell[0] + 0.5) * CLASS_CELL_DEG, (cell[1] + 0.5) * CLASS_CELL_DEG
+
+    result: Dict[Hashable, Tuple[str, Optional[float]]] = {}
+    for comp in _components(classes):
+        agent_ids = sorted({a for i in comp for a in classes[i][0]})
+        a_index = {a: j for j, a in enumerate(agent_ids)}
+
+        edges: List[List[Tuple[int, int]]] = []
+        for i in comp:
+            agents, cell = classes[i]
+            center = cell_center(cell)
+            row = []
+            for a in agents:
+                anchor = anchors.get(a)
+                km = haversine_km(center, anchor) if center and anchor else 0.0
+                row.append((a_index[a], round(COST_SCALE * DISTANCE_WEIGHT_PER_KM * km)))
+            edges.append(row)
+
+        flow = _ComponentFlow(
+            [len(members[i]) for i in comp],
+            edges,
+            [max(int(workloads.get(a, 0)), 0) for a in agent_ids],
+        ).solve()
+
+        # hand out each class's units to its members
+        for ci, i in enumerate(comp):
+            slots = [agent_ids[a] for a, units in sorted(flow[ci].items()) for _ in range(units)]
+            for t, agent in zip(members[i], slots):
+                anchor = anchors.get(agent)
+                km = haversine_km(t.position, anchor) if t.position and anchor else None
+                result[t.key] = (agent, km)
+
+    return result
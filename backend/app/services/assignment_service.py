@@ -1,10 +1,140 @@
-from typing import Optional, Dict, Any, List
-from datetime import datetime
+import logging
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, Iterable, List, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
+logger = logging.getLogger(__name__)
 
-def _agent_is_on_shift(agent_doc: Dict[str, Any]) -> bool:
-    # minimal stub: treat active agents as available
-    return bool(agent_doc.get("active", True))
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+DEFAULT_TIMEZONE = "Asia/Jerusalem"  # AgentSchedule default
+
+# Monday = 0, matching datetime.weekday()
+_DAYS = {
+    "mon": 0, "monday": 0,
+    "tue": 1, "tues": 1, "tuesday": 1,
+    "wed": 2, "wednesday": 2,
+    "thu": 3, "thur": 3, "thurs": 3, "thursday": 3,
+    "fri": 4, "friday": 4,
+    "sat": 5, "saturday": 5,
+    "sun": 6, "sunday": 6,
+}
+
+
+def _parse_hhmm(value: Any) -> Optional[int]:
+    """'08:30' -> 510 minutes; '24:00' is allowed as end of day."""
+    try:
+        hh, mm = str(value).strip().split(":")
+        minutes = int(hh) * 60 + int(mm)
+    except (ValueError, AttributeError):
+        return None
+    if not 0 <= minutes <= MINUTES_PER_DAY or not 0 <= int(mm) < 60:
+        return None
+    return minutes
+
+
+def _zone(name: Optional[str]) -> ZoneInfo:
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning("unknown agent timezone %r, using UTC", name)
+        return ZoneInfo("UTC")
+
+
+class ShiftBitmap:
+    """
+    One bit per minute of the week (Mon 00:00 = bit 0) in the agent's local
+    timezone, 1260 bytes per agent. Overnight shifts (end <= start) run into
+    the next day; Sunday night wraps to Monday.
+    """
+
+    __slots__ = ("tz", "bits", "always")
+
+    def __init__(self, tz: ZoneInfo, bits: bytearray, always: bool = False):
+        self.tz = tz
+        self.bits = bits
+        self.always = always
+
+    @classmethod
+    def from_schedule(cls, schedule: Optional[Dict[str, Any]]) -> "ShiftBitmap":
+        schedule = schedule or {}
+        tz = _zone(schedule.get("timezone"))
+        bits = bytearray(MINUTES_PER_WEEK // 8)
+        shifts = schedule.get("shifts") or []
+
+        for shift in shifts:
+            day = _DAYS.get(str((shift or {}).get("day", "")).strip().lower())
+            start = _parse_hhmm((shift or {}).get("start"))
+            end = _parse_hhmm((shift or {}).get("end"))
+            if day is None or start is None or end is None:
+                logger.warning("ignoring malformed shift %r", shift)
+                continue
+            if end <= start:
+                end += MINUTES_PER_DAY  # overnight
+            base = day * MINUTES_PER_DAY
+            for m in range(base + start, base + end):
+                m %= MINUTES_PER_WEEK
+                bits[m >> 3] |= 1 << (m & 7)
+
+        # no shifts configured (legacy agents) or on call: always available
+        always = not shifts or bool(schedule.get("on_call"))
+        return cls(tz, bits, always)
+
+    def minute_of_week(self, at: datetime) -> int:
+        local = at.astimezone(self.tz)
+        return local.weekday() * MINUTES_PER_DAY + local.hour * 60 + local.minute
+
+    def on_shift(self, at: datetime) -> bool:
+        if self.always:
+            return True
+        m = self.minute_of_week(at)
+        return bool(self.bits[m >> 3] >> (m & 7) & 1)
+
+
+class ShiftIndex:
+    """
+    Per-process cache of agent shift bitmaps keyed by agent id. A bitmap is
+    rebuilt when the agent's schedule_version (bumped by
+    AgentsRepository.update_schedule, so other processes notice too) differs
+    from the one it was built from, or after invalidate(). retain() drops the
+    agents that left the roster.
+    """
+
+    def __init__(self):
+        self._bitmaps: Dict[str, Tuple[int, ShiftBitmap]] = {}
+        self.builds = 0
+
+    def bitmap(self, agent: Dict[str, Any]) -> ShiftBitmap:
+        aid = str(agent.get("_id"))
+        version = int(agent.get("schedule_version") or 0)
+        cached = self._bitmaps.get(aid)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        bm = ShiftBitmap.from_schedule(agent.get("schedule"))
+        self._bitmaps[aid] = (version, bm)
+        self.builds += 1
+        return bm
+
+    def invalidate(self, agent_id: Optional[str] = None) -> None:
+        if agent_id is None:
+            self._bitmaps.clear()
+        else:
+            self._bitmaps.pop(str(agent_id), None)
+
+    def retain(self, agent_ids: Iterable[str]) -> None:
+        """Drop the bitmaps of agents not in agent_ids (the current roster)."""
+        keep = set(agent_ids)
+        for aid in [aid for aid in self._bitmaps if aid not in keep]:
+            del self._bitmaps[aid]
+
+
+shift_index = ShiftIndex()
+
+
+def _agent_is_on_shift(agent_doc: Dict[str, Any], at: Optional[datetime] = None) -> bool:
+    if not agent_doc.get("active", True):
+        return False
+    return shift_index.bitmap(agent_doc).on_shift(at or datetime.now(timezone.utc))
 
 
 def choose_agent(candidates: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
@@ -0,0 +1,159 @@
+# app/services/display_name_cache.py
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo.asynchronous.collection import AsyncCollection
+
+from app.core.app_config import settings
+
+ANONYMOUS_NAME = "Anonymous Citizen"
+DEFAULT_NAME = "Verified Citizen"
+
+NAME_PROJECTION = {"full_name": 1, "name": 1, "id": 1, "citizen_id": 1, "email": 1}
+
+
+def _citizen_name(doc: Dict[str, Any]) -> str:
+    return doc.get("full_name") or doc.get("name") or DEFAULT_NAME
+
+
+def _user_name(doc: Dict[str, Any]) -> str:
+    return doc.get("name") or doc.get("full_name") or DEFAULT_NAME
+
+
+def _first(docs: List[Dict[str, Any]], field: str, value: Any) -> Optional[Dict[str, Any]]:
+    return next((d for d in docs if d.get(field) == value), None)
+
+
+async def lookup_display_name(
+    citizens: AsyncCollection,
+    users: AsyncCollection,
+    citizen_id: str,
+) -> str:
+    """
+    Display name for a citizen/user id, uncached.
+
+    Priority (unchanged from the original sequential lookups):
+      1) citizens by _id, 2) users by _id,
+      3) citizens by id / citizen_id, 4) users by email / id.
+    Both collections are queried once each, concurrently, with an $or over
+    the indexed fields; the priority is applied to the returned documents.
+    """
+    if not citizen_id or citizen_id == "public-citizen":
+        return ANONYMOUS_NAME
+
+    oid = ObjectId(citizen_id) if ObjectId.is_valid(citizen_id) else None
+    citizen_or: List[Dict[str, Any]] = [{"id": citizen_id}, {"citizen_id": citizen_id}]
+    user_or: List[Dict[str, Any]] = [{"email": citizen_id}, {"id": citizen_id}]
+    if oid is not None:
+        citizen_or.insert(0, {"_id": oid})
+        user_or.insert(0, {"_id": oid})
+
+    c_docs, u_docs = await asyncio.gather(
+        citizens.find({"$or": citizen_or}, NAME_PROJECTION).limit(len(citizen_or)).to_list(length=None),
+        users.find({"$or": user_or}, NAME_PROJECTION).limit(len(user_or)).to_list(length=None),
+    )
+
+    if oid is not None:
+        c = _first(c_docs, "_id", oid)
+        if c:
+            return _citizen_name(c)
+        u = _first(u_docs, "_id", oid)
+        if u:
+            return _user_name(u)
+
+    c = _first(c_docs, "id", citizen_id) or _first(c_docs, "citizen_id", citizen_id)
+    if c:
+        return _citizen_name(c)
+    u = _first(u_docs, "email", citizen_id) or _first(u_docs, "id", citizen_id)
+    if u:
+        return _user_name(u)
+    return DEFAULT_NAME
+
+
+class DisplayNameCache:
+    """
+    In-process LRU + TTL cache of citizen/user id -> display name, used for
+    comment and rating events. Misses (DEFAULT_NAME) are cached too, so an
+    unknown id costs one lookup per TTL rather than one per event.
+
+    Local writes that can change a name call invalidate() (citizen profile
+    update, OTP verification, user creation); the TTL bounds staleness
+    across workers.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, name = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return name
+
+    def _put(self, key: str, name: str) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, name)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def display_name(
+        self,
+        citizens: AsyncCollection,
+        users: AsyncCollection,
+        citizen_id: str,
+    ) -> str:
+        if not citizen_id or citizen_id == "public-citizen":
+            return ANONYMOUS_NAME
+        name = self._get(citizen_id)
+        if name is not None:
+            self.hits += 1
+            return name
+        self.misses += 1
+        name = await lookup_display_name(citizens, users, citizen_id)
+        self._put(citizen_id, name)
+        return name
+
+    def invalidate(self, *keys: Optional[Any]) -> None:
+        """Drop the given ids (ObjectId, id, citizen_id or email); falsy keys are ignored."""
+        for key in keys:
+            if key and self._entries.pop(str(key), None) is not None:
+                self.invalidations += 1
+
+    def invalidate_doc(self, doc: Optional[Dict[str, Any]]) -> None:
+        """Drop every key a citizen/user document can be looked up by."""
+        if doc:
+            self.invalidate(*(doc.get(f) for f in ("_id", "id", "citizen_id", "email")))
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+display_name_cache = DisplayNameCache(
+    max_entries=settings.DISPLAY_NAME_CACHE_SIZE,
+    ttl_seconds=settings.DISPLAY_NAME_CACHE_TTL_SECONDS,
+)
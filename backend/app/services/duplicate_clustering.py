@@ -0,0 +1,170 @@
+# app/services/duplicate_clustering.py
+from __future__ import annotations
+
+import math
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.services.assignment_matching import as_lng_lat
+from app.services.duplicate_service import MINHASH_PERMUTATIONS, signature_similarity, stored_signature
+
+# LSH: the signature is cut into LSH_BANDS bands of LSH_ROWS rows; two
+# requests become candidates when any band is identical. With 16 x 4 the
+# S-curve threshold (1/b)^(1/r) is ~0.5.
+LSH_BANDS = 16
+LSH_ROWS = MINHASH_PERMUTATIONS // LSH_BANDS
+
+_EARTH_RADIUS_M = 6371008.8
+_M_PER_DEG = math.pi * _EARTH_RADIUS_M / 180.0
+
+
+# -------------------------
+# geohash
+# -------------------------
+def geohash_cell_deg(precision: int) -> Tuple[float, float]:
+    """(lat, lng) size in degrees of a geohash cell at precision."""
+    n = 5 * precision
+    return 180.0 / (1 << (n // 2)), 360.0 / (1 << (n - n // 2))
+
+
+def geohash_precision_for(radius_m: float, max_abs_lat: float = 0.0) -> int:
+    """
+    Finest precision whose cells are at least radius_m on each side at
+    max_abs_lat, so any pair within radius_m lies in the same or an adjacent cell.
+    """
+    cos_lat = max(math.cos(math.radians(min(max_abs_lat, 89.0))), 1e-6)
+    for precision in range(9, 0, -1):
+        dlat, dlng = geohash_cell_deg(precision)
+        if min(dlat * _M_PER_DEG, dlng * _M_PER_DEG * cos_lat) >= radius_m:
+            return precision
+    return 1
+
+
+def geohash_cell(lat: float, lng: float, precision: int) -> Tuple[int, int]:
+    """
+    The geohash cell containing the point at that precision, as its (lat, lng)
+    grid index (a geohash string interleaves the bits of these two indices),
+    which keeps neighbour arithmetic trivial.
+    """
+    dlat, dlng = geohash_cell_deg(precision)
+    rows, cols = int(round(180.0 / dlat)), int(round(360.0 / dlng))
+    return min(int((lat + 90.0) // dlat), rows - 1), min(int((lng + 180.0) // dlng), cols - 1)
+
+
+def geohash_neighborhood(cell: Tuple[int, int], precision: int) -> List[Tuple[int, int]]:
+    """The cell and its 8 neighbours (longitude wraps; fewer at the poles)."""
+    dlat, dlng = geohash_cell_deg(precision)
+    rows, cols = int(round(180.0 / dlat)), int(round(360.0 / dlng))
+    i, j = cell
+    return [
+        (i + di, (j + dj) % cols)
+        for di in (-1, 0, 1) if 0 <= i + di < rows
+        for dj in (-1, 0, 1)
+    ]
+
+
+def haversine_m(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    """Great-circle distance in metres between two (lng, lat) points."""
+    lng1, lat1, lng2, lat2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * _EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(h)))
+
+
+# -------------------------
+# LSH
+# -------------------------
+def lsh_band_keys(signature: List[int]) -> List[int]:
+    """One key per band, band index folded in (int tuples hash the same in every process)."""
+    return [hash((band, *signature[band * LSH_ROWS:(band + 1) * LSH_ROWS])) for band in range(LSH_BANDS)]
+
+
+# -------------------------
+# clustering
+# -------------------------
+class _Item:
+    __slots__ = ("oid", "category", "point", "created_at", "signature", "bands", "cell")
+
+    def __init__(self, oid, category, point, created_at, signature):
+        self.oid = oid
+        self.cell: Tuple[int, int] = (0, 0)
+        self.category = category
+        self.point = point
+        self.created_at = created_at
+        self.signature = signature
+        self.bands = lsh_band_keys(signature)
+
+
+def cluster_duplicates(
+    docs: Iterable[Dict[str, Any]],
+    radius_m: float,
+    window_days: float,
+    min_similarity: float,
+) -> Dict[Any, List[Any]]:
+    """
+    Greedy leader clustering of open requests into {master _id: [duplicate _ids]}.
+
+    Requests are visited oldest first (created_at, _id). Each one is compared
+    only against earlier masters of the same category that share an LSH band
+    in its geohash cell or a neighbouring one; it joins the most similar
+    master within radius_m and window_days whose estimated similarity is at
+    least min_similarity, or becomes a master itself. Every request is
+    checked against a bounded set of buckets, so the cost is near-linear.
+    The result is deterministic for a given input, and a master is always
+    the oldest request of its cluster. Only clusters with duplicates are
+    returned.
+    """
+    items: List[_Item] = []
+    for d in docs:
+        point = as_lng_lat((d.get("location") or {}).get("coordinates"))
+        signature = stored_signature(d)
+        created_at = (d.get("timestamps") or {}).get("created_at") or d.get("created_at")
+        if point is None or signature is None or created_at is None or len(signature) != MINHASH_PERMUTATIONS:
+            continue
+        items.append(_Item(d["_id"], d.get("category"), point, created_at, signature))
+    if not items:
+        return {}
+
+    items.sort(key=lambda it: (it.created_at, it.oid))
+    precision = geohash_precision_for(radius_m, max(abs(it.point[1]) for it in items))
+    window = timedelta(days=window_days)
+
+    # (category, geohash cell, band key) -> masters
+    buckets: Dict[Tuple[Any, Tuple[int, int], int], List[_Item]] = {}
+    clusters: Dict[Any, List[Any]] = {}
+    for it in items:
+        lng, lat = it.point
+        it.cell = geohash_cell(lat, lng, precision)
+        best: Optional[_Item] = None
+        best_score: Tuple[float, float] = (-1.0, 0.0)
+        seen = set()
+        for cell in geohash_neighborhood(it.cell, precision):
+            for band in it.bands:
+                for m in buckets.get((it.category, cell, band), ()):
+                    if id(m) in seen:
+                        continue
+                    seen.add(id(m))
+                    if it.created_at - m.created_at > window:
+                        continue
+                    distance = haversine_m(m.point, it.point)
+                    if distance > radius_m:
+                        continue
+                    similarity = signature_similarity(m.signature, it.signature)
+                    if similarity < min_similarity:
+                        continue
+                    score = (similarity, -distance)
+                    if score > best_score:
+                        best, best_score = m, score
+        if best is not None:
+            clusters.setdefault(best.oid, []).append(it.oid)
+            continue
+        for band in it.bands:
+            buckets.setdefault((it.category, it.cell, band), []).append(it)
+    return clusters
+
+
+def cluster_size_histogram(clusters: Dict[Any, List[Any]]) -> Dict[int, int]:
+    """{cluster size (master + duplicates): number of clusters}."""
+    sizes: Dict[int, int] = {}
+    for dups in clusters.values():
+        sizes[len(dups) + 1] = sizes.get(len(dups) + 1, 0) + 1
+    return dict(sorted(sizes.items()))
@@ -0,0 +1,193 @@
+# app/services/duplicate_service.py
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+import numpy as np
+from pymongo.asynchronous.collection import AsyncCollection
+
+from app.core.app_config import settings
+from app.services.assignment_matching import as_lng_lat
+from app.services.sla_service import SLA_TERMINAL_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# -------------------------
+# MinHash signatures
+# -------------------------
+# Bump MINHASH_VERSION whenever the shingling or the permutations change:
+# signatures of different versions are not comparable.
+MINHASH_VERSION = 1
+MINHASH_PERMUTATIONS = 64
+SHINGLE_SIZE = 4  # character shingles over the normalised description
+
+_PRIME = (1 << 31) - 1  # a * x + b stays below 2**62, so uint64 never overflows
+_rng = np.random.default_rng(20240601)  # fixed seed: signatures must match across processes
+_PERM_A = _rng.integers(1, _PRIME, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _rng.integers(0, _PRIME, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+_WORD = re.compile(r"\w+")
+
+
+def normalize_text(text: Optional[str]) -> str:
+    return " ".join(_WORD.findall((text or "").lower()))
+
+
+def shingles(text: Optional[str], size: int = SHINGLE_SIZE) -> Set[str]:
+    norm = normalize_text(text)
+    if not norm:
+        return set()
+    if len(norm) <= size:
+        return {norm}
+    return {norm[i:i + size] for i in range(len(norm) - size + 1)}
+
+
+def minhash_signature(text: Optional[str]) -> Optional[List[int]]:
+    """MINHASH_PERMUTATIONS minimum hashes of the description's shingles (None for empty text)."""
+    sh = shingles(text)
+    if not sh:
+        return None
+    # crc32, not hash(): str hashing is salted per process
+    x = np.fromiter((zlib.crc32(s.encode("utf-8")) % _PRIME for s in sh), dtype=np.uint64, count=len(sh))
+    hashed = (_PERM_A[:, None] * x[None, :] + _PERM_B[:, None]) % _PRIME
+    return hashed.min(axis=1).tolist()
+
+
+def signature_similarity(a: Optional[Sequence[int]], b: Optional[Sequence[int]]) -> float:
+    """Estimated Jaccard similarity: the share of permutations whose minimum agrees."""
+    if not a or not b or len(a) != len(b):
+        return 0.0
+    return float(np.mean(np.asarray(a, dtype=np.int64) == np.asarray(b, dtype=np.int64)))
+
+
+def build_dedup_fields(description: Optional[str]) -> Dict[str, Any]:
+    """The `dedup` sub-document stored on a request at creation."""
+    return {"v": MINHASH_VERSION, "minhash": minhash_signature(description)}
+
+
+def stored_signature(doc: Dict[str, Any]) -> Optional[List[int]]:
+    """The doc's signature, recomputed when it is missing or of another version."""
+    dedup = doc.get("dedup") or {}
+    if dedup.get("v") == MINHASH_VERSION and dedup.get("minhash"):
+        return dedup["minhash"]
+    return minhash_signature(doc.get("description"))
+
+
+# -------------------------
+# candidate search
+# -------------------------
+async def find_duplicate_candidates(
+    col: AsyncCollection,
+    doc: Dict[str, Any],
+    radius_m: Optional[float] = None,
+    window_days: Optional[float] = None,
+    min_similarity: Optional[float] = None,
+    limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Open master requests of the same category within radius_m of doc, created
+    in the last window_days, ranked by description similarity (then distance).
+    One $geoNear over the (category, location) index; similarity is scored in
+    Python from the stored MinHash signatures.
+    """
+    radius_m = settings.DEDUP_RADIUS_M if radius_m is None else radius_m
+    window_days = settings.DEDUP_WINDOW_DAYS if window_days is None else window_days
+    min_similarity = settings.DEDUP_MIN_SIMILARITY if min_similarity is None else min_similarity
+    limit = settings.DEDUP_MAX_SUGGESTIONS if limit is None else limit
+
+    point = as_lng_lat((doc.get("location") or {}).get("coordinates"))
+    signature = stored_signature(doc)
+    if point is None or signature is None or not doc.get("category"):
+        return []
+
+    created_at = (doc.get("timestamps") or {}).get("created_at") or datetime.utcnow()
+    cursor = await col.aggregate([
+        {"$geoNear": {
+            "near": {"type": "Point", "coordinates": list(point)},
+            "key": "location",
+            "distanceField": "distance_m",
+            "maxDistance": radius_m,
+            "spherical": True,
+            "query": {
+                "_id": {"$ne": doc.get("_id")},
+                "category": doc["category"],
+                "status": {"$nin": list(SLA_TERMINAL_STATUSES)},
+                "duplicates.is_master": {"$ne": False},
+                "timestamps.created_at": {"$gte": created_at - timedelta(days=window_days)},
+            },
+        }},
+        {"$limit": settings.DEDUP_CANDIDATE_LIMIT},
+        {"$project": {"description": 1, "dedup": 1, "distance_m": 1, "status": 1, "timestamps.created_at": 1}},
+    ])
+    nearby = await cursor.to_list(length=None)
+
+    matches = []
+    for c in nearby:
+        similarity = signature_similarity(signature, stored_signature(c))
+        if similarity < min_similarity:
+            continue
+        matches.append({
+            "request_id": str(c["_id"]),
+            "similarity": round(similarity, 3),
+            "distance_m": round(float(c.get("distance_m") or 0.0), 1),
+            "status": c.get("status"),
+            "created_at": (c.get("timestamps") or {}).get("created_at"),
+        })
+    matches.sort(key=lambda m: (-m["similarity"], m["distance_m"]))
+    return matches[:limit]
+
+
+async def suggest_duplicates(col: AsyncCollection, doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Find candidates for a newly created request and store them on duplicates.suggestions."""
+    suggestions = await find_duplicate_candidates(col, doc)
+    if suggestions:
+        await col.update_one(
+            {"_id": doc["_id"]},
+            {"$set": {
+                "duplicates.suggestions": suggestions,
+                "duplicates.suggested_at": datetime.utcnow(),
+            }},
+        )
+    return suggestions
+
+
+# -------------------------
+# background scheduling
+# -------------------------
+_pending: Set[asyncio.Task] = set()
+
+
+async def _suggest_logged(col: AsyncCollection, doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+    try:
+        return await suggest_duplicates(col, doc)
+    except Exception:
+        # suggestions are advisory; never fail or block the create
+        logger.exception("duplicate suggestion failed for request %s", doc.get("_id"))
+        return []
+
+
+async def attach_duplicate_suggestions(col: AsyncCollection, doc: Dict[str, Any]) -> None:
+    """
+    Run suggest_duplicates per DEDUP_MODE: "background" schedules it after the
+    insert (the create response does not wait), "inline" awaits it and puts
+    the suggestions on doc, "off" skips it.
+    """
+    if settings.DEDUP_MODE == "inline":
+        suggestions = await _suggest_logged(col, doc)
+        if suggestions:
+            doc["duplicates"]["suggestions"] = suggestions
+    elif settings.DEDUP_MODE == "background":
+        task = asyncio.create_task(_suggest_logged(col, doc))
+        _pending.add(task)
+        task.add_done_callback(_pending.discard)
+
+
+async def drain_duplicate_tasks(timeout_s: float = 5.0) -> None:
+    """Wait (bounded) for scheduled suggestion tasks at shutdown."""
+    if _pending:
+        await asyncio.wait(list(_pending), timeout=timeout_s)
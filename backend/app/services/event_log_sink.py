@@ -0,0 +1,206 @@
+# app/services/event_log_sink.py
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from app.core.app_config import settings
+from app.core.db import db
+from app.repositories.performance_logs_repo import PerformanceLogsRepository, set_event_sink
+
+logger = logging.getLogger(__name__)
+
+EVENT_LOG_MODES = ("durable-sync", "batched")
+
+# (request_id, event, computed_kpis)
+PendingEvent = Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]
+
+
+class BatchedEventSink:
+    """
+    Write-behind sink for performance log events.
+
+    Events are queued in-process and flushed by a single background task when
+    batch_size events are pending or every flush_interval seconds. A flush
+    reserves each request's seq range with one header $inc (concurrently,
+    one per distinct request) and writes all bucket pushes with one
+    bulk_write. Flushes never overlap and events keep queue order inside a
+    request, so per-request ordering is preserved. A full queue makes the
+    caller flush inline (backpressure). stop() drains everything.
+
+    Failed reservations are requeued; failed bucket writes are retried on the
+    next flush with their already-reserved seqs. After a connection error
+    with unknown outcome a retry may duplicate events (at-least-once).
+    """
+
+    def __init__(
+        self,
+        repo: PerformanceLogsRepository,
+        batch_size: int,
+        flush_interval_s: float,
+        max_queue: int,
+    ):
+        self.repo = repo
+        self.batch_size = max(batch_size, 1)
+        self.flush_interval_s = flush_interval_s
+        self.max_queue = max(max_queue, self.batch_size)
+        self._queue: Deque[PendingEvent] = deque()
+        self._retry_ops: List[UpdateOne] = []
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.flushed = 0
+        self.failures = 0
+
+    # -------------------------
+    # producer side
+    # -------------------------
+    async def enqueue(self, request_id: str, evt: Dict[str, Any], computed_kpis: Optional[Dict[str, Any]] = None) -> None:
+        if len(self._queue) >= self.max_queue:
+            await self.flush()
+        self._queue.append((request_id, evt, computed_kpis))
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+
+    # -------------------------
+    # flushing
+    # -------------------------
+    async def _reserve(self, request_id: str, entries: List[PendingEvent]) -> int:
+        kpis = None
+        for _, _, k in entries:
+            if k is not None:
+                kpis = k  # latest snapshot wins
+        return await self.repo.reserve_seqs(request_id, len(entries), entries[-1][1]["at"], kpis)
+
+    async def flush(self) -> int:
+        """Write everything queued so far; returns the number of events flushed."""
+        async with self._lock:
+            ops, self._retry_ops = self._retry_ops, []
+
+            batch: List[PendingEvent] = []
+            while self._queue:
+                batch.append(self._queue.popleft())
+
+            groups: Dict[str, List[PendingEvent]] = {}
+            for entry in batch:
+                groups.setdefault(entry[0], []).append(entry)
+
+            flushed = 0
+            if groups:
+                results = await asyncio.gather(
+                    *(self._reserve(rid, entries) for rid, entries in groups.items()),
+                    return_exceptions=True,
+                )
+                requeue: List[PendingEvent] = []
+                for (rid, entries), first_seq in zip(groups.items(), results):
+                    if isinstance(first_seq, BaseException):
+                        logger.warning("event log seq reservation failed for %s: %s", rid, first_seq)
+                        requeue.extend(entries)
+                        continue
+                    ops.extend(
+                        UpdateOne(f, u, upsert=True)
+                        for f, u in self.repo.build_bucket_updates(rid, first_seq, [e[1] for e in entries])
+                    )
+                    flushed += len(entries)
+                if requeue:
+                    self.failures += 1
+                    self._queue.extendleft(reversed(requeue))
+
+            if ops:
+                try:
+                    await self.repo.buckets.bulk_write(ops, ordered=False)
+                except BulkWriteError as e:
+                    self.failures += 1
+                    failed = {err["index"] for err in e.details.get("writeErrors", [])}
+                    self._retry_ops = [op for i, op in enumerate(ops) if i in failed]
+                    logger.warning("event log bulk_write: %d of %d ops failed, retrying", len(failed), len(ops))
+                except PyMongoError as e:
+                    self.failures += 1
+                    self._retry_ops = ops
+                    logger.warning("event log bulk_write failed, retrying %d ops: %s", len(ops), e)
+
+            self.flushed += flushed
+            return flushed
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("event log flush failed")
+
+    # -------------------------
+    # lifecycle
+    # -------------------------
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, max_attempts: int = 3) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        for _ in range(max_attempts):
+            if not self._queue and not self._retry_ops:
+                break
+            await self.flush()
+        if self._queue or self._retry_ops:
+            logger.error(
+                "event log sink stopped with %d queued events and %d unwritten bucket ops",
+                len(self._queue), len(self._retry_ops),
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": len(self._queue),
+            "pending_retry_ops": len(self._retry_ops),
+            "flushed": self.flushed,
+            "failures": self.failures,
+        }
+
+
+_sink: Optional[BatchedEventSink] = None
+
+
+async def start_event_sink() -> None:
+    """Install the write-behind sink when EVENT_LOG_MODE=batched."""
+    global _sink
+    mode = settings.EVENT_LOG_MODE
+    if mode not in EVENT_LOG_MODES:
+        raise ValueError(f"EVENT_LOG_MODE must be one of {EVENT_LOG_MODES}, got {mode!r}")
+    if mode != "batched":
+        return
+
+    _sink = BatchedEventSink(
+        PerformanceLogsRepository(db.performance_logs, sink=None),
+        batch_size=settings.EVENT_LOG_BATCH_SIZE,
+        flush_interval_s=settings.EVENT_LOG_FLUSH_INTERVAL_MS / 1000.0,
+        max_queue=settings.EVENT_LOG_MAX_QUEUE,
+    )
+    _sink.start()
+    set_event_sink(_sink)
+
+
+async def stop_event_sink() -> None:
+    """Stop accepting events and drain the queue."""
+    global _sink
+    if _sink is None:
+        return
+    set_event_sink(None)
+    await _sink.stop()
+    _sink = None
@@ -0,0 +1,123 @@
+# app/services/heatmap_service.py
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from pymongo.asynchronous.collection import AsyncCollection
+
+from app.services.sla_service import heatmap_weight_expr
+
+DEFAULT_ZOOM = 14
+MAX_ZOOM = 20
+# grid cells per 256px map tile edge (16px cells)
+CELLS_PER_TILE = 16
+
+BBox = Tuple[float, float, float, float]  # (min_lng, min_lat, max_lng, max_lat)
+
+
+def zoom_to_cell_deg(zoom: int) -> float:
+    """Cell edge in degrees for a web-mercator zoom level."""
+    zoom = min(max(int(zoom), 0), MAX_ZOOM)
+    return 360.0 / (2 ** zoom) / CELLS_PER_TILE
+
+
+def parse_bbox(bbox: str) -> Optional[BBox]:
+    """ "min_lng,min_lat,max_lng,max_lat" -> tuple (or None when empty). """
+    if not bbox:
+        return None
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be min_lng,min_lat,max_lng,max_lat")
+    if min_lng >= max_lng or min_lat >= max_lat:
+        raise HTTPException(status_code=400, detail="Invalid bbox")
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def parse_status_in(status_in: str) -> List[str]:
+    return [s.strip() for s in (status_in or "").split(",") if s.strip()]
+
+
+def bbox_filter(bbox: BBox) -> Dict[str, Any]:
+    min_lng, min_lat, max_lng, max_lat = bbox
+    return {
+        "location": {
+            "$geoWithin": {
+                "$geometry": {
+                    "type": "Polygon",
+                    "coordinates": [[
+                        [min_lng, min_lat], [max_lng, min_lat], [max_lng, max_lat],
+                        [min_lng, max_lat], [min_lng, min_lat],
+                    ]],
+                }
+            }
+        }
+    }
+
+
+def build_heatmap_match(statuses: List[str], bbox: Optional[BBox]) -> Dict[str, Any]:
+    match: Dict[str, Any] = {"location.coordinates": {"$size": 2}}
+    if statuses:
+        match["status"] = {"$in": statuses}
+    if bbox:
+        match.update(bbox_filter(bbox))
+    return match
+
+
+Cell = Tuple[int, int, float]  # (cell x, cell y, summed weight)
+CellWindow = Tuple[int, int, int, int]  # (x_min, x_max, y_min, y_max), max exclusive
+
+
+async def aggregate_cells(
+    col: AsyncCollection,
+    cell_deg: float,
+    statuses: List[str],
+    bbox: Optional[BBox] = None,
+    cell_window: Optional[CellWindow] = None,
+    now: Optional[datetime] = None,
+) -> List[Cell]:
+    """
+    Bin requests into a cell_deg x cell_deg grid inside Mongo. cell_window, when
+    given, keeps only cells in that index range (exact tile boundaries; bbox is
+    then just an index-backed pre-filter).
+    """
+    pipeline: List[Dict[str, Any]] = [
+        {"$match": build_heatmap_match(statuses, bbox)},
+        {"$project": {
+            "_id": 0,
+            "x": {"$floor": {"$divide": [{"$arrayElemAt": ["$location.coordinates", 0]}, cell_deg]}},
+            "y": {"$floor": {"$divide": [{"$arrayElemAt": ["$location.coordinates", 1]}, cell_deg]}},
+            "w": heatmap_weight_expr(now),
+        }},
+    ]
+    if cell_window:
+        x_min, x_max, y_min, y_max = cell_window
+        pipeline.append({"$match": {"x": {"$gte": x_min, "$lt": x_max}, "y": {"$gte": y_min, "$lt": y_max}}})
+    pipeline.append({"$group": {"_id": {"x": "$x", "y": "$y"}, "weight": {"$sum": "$w"}}})
+
+    cursor = await col.aggregate(pipeline)
+    return [(int(c["_id"]["x"]), int(c["_id"]["y"]), float(c["weight"])) async for c in cursor]
+
+
+def cells_to_points(cells: List[Cell], cell_deg: float) -> List[List[float]]:
+    """[[lat, lng, weight], ...] at cell centres."""
+    return [
+        [round((y + 0.5) * cell_deg, 6), round((x + 0.5) * cell_deg, 6), round(w, 4)]
+        for x, y, w in cells
+    ]
+
+
+async def binned_heatmap(
+    col: AsyncCollection,
+    cell_deg: float,
+    statuses: List[str],
+    bbox: Optional[BBox] = None,
+    now: Optional[datetime] = None,
+) -> List[List[float]]:
+    """
+    [[lat, lng, weight], ...] per non-empty cell (cell centre, summed
+    weight_for_heatmap weights).
+    """
+    return cells_to_points(await aggregate_cells(col, cell_deg, statuses, bbox=bbox, now=now), cell_deg)
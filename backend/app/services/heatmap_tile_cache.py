@@ -0,0 +1,251 @@
+# app/services/heatmap_tile_cache.py
+from __future__ import annotations
+
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo.asynchronous.collection import AsyncCollection
+
+from app.core.app_config import settings
+from app.services.heatmap_service import (
+    BBox,
+    CELLS_PER_TILE,
+    Cell,
+    aggregate_cells,
+    cells_to_points,
+    zoom_to_cell_deg,
+)
+
+# Tiles are a regular lng/lat grid of CELLS_PER_TILE x CELLS_PER_TILE heatmap
+# cells, so cached tiles line up exactly with the binning grid.
+TileId = Tuple[int, int, int]  # (zoom, tile x, tile y)
+TileKey = Tuple[int, int, int, Tuple[str, ...]]  # (zoom, x, y, sorted statuses)
+
+# geodesic polygon edges drift from constant-latitude lines on wide windows;
+# above this span the pre-filter is skipped and only the exact cell window applies
+MAX_PREFILTER_SPAN_DEG = 10.0
+PREFILTER_MARGIN_RATIO = 0.05
+
+# bboxes covering more tiles than this are binned directly, uncached
+MAX_TILES_PER_REQUEST = 256
+
+
+def tile_deg(zoom: int) -> float:
+    return zoom_to_cell_deg(zoom) * CELLS_PER_TILE
+
+
+def tile_of(zoom: int, lng: float, lat: float) -> Tuple[int, int]:
+    size = tile_deg(zoom)
+    return int(math.floor(lng / size)), int(math.floor(lat / size))
+
+
+def tile_count(zoom: int, bbox: BBox) -> int:
+    """Number of tiles tiles_for_bbox would return, without building them."""
+    min_lng, min_lat, max_lng, max_lat = bbox
+    x0, y0 = tile_of(zoom, min_lng, min_lat)
+    x1, y1 = tile_of(zoom, max_lng, max_lat)
+    return (x1 - x0 + 1) * (y1 - y0 + 1)
+
+
+def tiles_for_bbox(zoom: int, bbox: BBox) -> List[Tuple[int, int]]:
+    min_lng, min_lat, max_lng, max_lat = bbox
+    x0, y0 = tile_of(zoom, min_lng, min_lat)
+    x1, y1 = tile_of(zoom, max_lng, max_lat)
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+class HeatmapTileCache:
+    """
+    In-process LRU + TTL cache of binned heatmap tiles keyed by
+    (zoom, tile x, tile y, status filter).
+
+    Entries are dropped when a request inside the tile is created or changes
+    status/priority (RequestsRepository write paths call invalidate_point).
+    Invalidation is per process; the TTL bounds staleness across workers and
+    the slow drift of age-based weights. Tiles being computed are tracked
+    with a generation counter: an invalidation that lands while their
+    aggregation is in flight bumps it, and the stale result is not cached.
+    """
+
+    def __init__(self, max_tiles: int, ttl_seconds: float):
+        self.max_tiles = max_tiles
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[TileKey, Tuple[float, List[Cell]]]" = OrderedDict()
+        self._by_tile: Dict[TileId, Set[TileKey]] = {}
+        # tiles with an aggregation in flight: tile -> [readers, generation]
+        self._inflight: Dict[TileId, List[int]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # -------------------------
+    # LRU bookkeeping
+    # -------------------------
+    def _drop(self, key: TileKey) -> None:
+        self._entries.pop(key, None)
+        tile = key[:3]
+        keys = self._by_tile.get(tile)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_tile[tile]
+
+    def get(self, key: TileKey) -> Optional[List[Cell]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, cells = entry
+        if expires_at < time.monotonic():
+            self._drop(key)
+            self.evictions += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return cells
+
+    def put(self, key: TileKey, cells: List[Cell]) -> None:
+        if self.max_tiles <= 0:
+            return
+        self._drop(key)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, cells)
+        self._by_tile.setdefault(key[:3], set()).add(key)
+        while len(self._entries) > self.max_tiles:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    # -------------------------
+    # invalidation
+    # -------------------------
+    def invalidate_point(self, coordinates: Optional[Iterable[float]]) -> None:
+        """Drop every cached tile (any zoom, any status filter) containing [lng, lat]."""
+        try:
+            lng, lat = (float(v) for v in coordinates)  # type: ignore[union-attr]
+        except (TypeError, ValueError):
+            return
+        zooms = {tile[0] for tile in self._by_tile} | {tile[0] for tile in self._inflight}
+        for zoom in zooms:
+            x, y = tile_of(zoom, lng, lat)
+            pending = self._inflight.get((zoom, x, y))
+            if pending is not None:
+                pending[1] += 1
+            for key in list(self._by_tile.get((zoom, x, y), ())):
+                self._drop(key)
+                self.invalidations += 1
+
+    def invalidate_request(self, doc: Optional[Dict[str, Any]]) -> None:
+        loc = (doc or {}).get("location") or {}
+        self.invalidate_point(loc.get("coordinates"))
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_tile.clear()
+        for pending in self._inflight.values():
+            pending[1] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "tiles": len(self._entries),
+            "max_tiles": self.max_tiles,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    # -------------------------
+    # read-through
+    # -------------------------
+    async def heatmap(
+        self,
+        col: AsyncCollection,
+        zoom: int,
+        statuses: List[str],
+        bbox: BBox,
+    ) -> List[List[float]]:
+        """
+        [[lat, lng, weight], ...] for bbox at zoom, served from cached tiles.
+        Missing tiles are computed with one aggregation over their bounding
+        window and cached individually (empty tiles included).
+        """
+        cell_deg = zoom_to_cell_deg(zoom)
+        status_key = tuple(sorted(set(statuses)))
+
+        cells: List[Cell] = []
+        missing: List[Tuple[int, int]] = []
+        for x, y in tiles_for_bbox(zoom, bbox):
+            cached = self.get((zoom, x, y, status_key))
+            if cached is None:
+                missing.append((x, y))
+            else:
+                cells.extend(cached)
+
+        if missing:
+            tx0 = min(x for x, _ in missing)
+            tx1 = max(x for x, _ in missing) + 1
+            ty0 = min(y for _, y in missing)
+            ty1 = max(y for _, y in missing) + 1
+            size = tile_deg(zoom)
+
+            prefilter: Optional[BBox] = None
+            span = max((tx1 - tx0), (ty1 - ty0)) * size
+            if span <= MAX_PREFILTER_SPAN_DEG:
+                m = span * PREFILTER_MARGIN_RATIO
+                prefilter = (
+                    max(tx0 * size - m, -180.0), max(ty0 * size - m, -90.0),
+                    min(tx1 * size + m, 180.0), min(ty1 * size + m, 90.0),
+                )
+
+            # generations before the await: tiles invalidated meanwhile are not cached
+            generations: Dict[TileId, int] = {}
+            for x, y in missing:
+                pending = self._inflight.setdefault((zoom, x, y), [0, 0])
+                pending[0] += 1
+                generations[(zoom, x, y)] = pending[1]
+            try:
+                window_cells = await aggregate_cells(
+                    col,
+                    cell_deg,
+                    list(status_key),
+                    bbox=prefilter,
+                    cell_window=(
+                        tx0 * CELLS_PER_TILE, tx1 * CELLS_PER_TILE,
+                        ty0 * CELLS_PER_TILE, ty1 * CELLS_PER_TILE,
+                    ),
+                )
+            finally:
+                fresh = set()
+                for tile, generation in generations.items():
+                    pending = self._inflight[tile]
+                    if pending[1] == generation:
+                        fresh.add(tile)
+                    pending[0] -= 1
+                    if pending[0] == 0:
+                        del self._inflight[tile]
+
+            by_tile: Dict[Tuple[int, int], List[Cell]] = {t: [] for t in missing}
+            for cell in window_cells:
+                t = (cell[0] // CELLS_PER_TILE, cell[1] // CELLS_PER_TILE)
+                if t in by_tile:
+                    by_tile[t].append(cell)
+
+            for (x, y), tile_cells in by_tile.items():
+                if (zoom, x, y) in fresh:
+                    self.put((zoom, x, y, status_key), tile_cells)
+                cells.extend(tile_cells)
+
+        return cells_to_points(cells, cell_deg)
+
+
+heatmap_tile_cache = HeatmapTileCache(
+    max_tiles=settings.HEATMAP_CACHE_MAX_TILES,
+    ttl_seconds=settings.HEATMAP_CACHE_TTL_SECONDS,
+)
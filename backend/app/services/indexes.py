@@ -1,29 +1,92 @@
+import logging
+from itertools import combinations
+
+from pymongo.errors import OperationFailure
+
 from app.core.db import db
 
-def ensure_indexes():
+logger = logging.getLogger(__name__)
+
+LIST_FILTER_FIELDS = ("status", "category", "priority")
+LIST_FILTER_COMBINATIONS = [
+    c for n in range(len(LIST_FILTER_FIELDS) + 1) for c in combinations(LIST_FILTER_FIELDS, n)
+]
+
+async def ensure_indexes():
     col = db.service_requests
 
     # Geo index for location (GeoJSON Point)
-    col.create_index([("location", "2dsphere")])
+    await col.create_index([("location", "2dsphere")])
+    # Heatmap: status_in + bbox
+    await col.create_index([("status", 1), ("location", "2dsphere")])
+    # Near-duplicate finder: same category within a radius
+    await col.create_index([("category", 1), ("location", "2dsphere")])
 
     # Common filters
-    col.create_index("status")
-    col.create_index("category")
-    col.create_index("priority")
+    await col.create_index("status")
+    await col.create_index("category")
+    await col.create_index("priority")
 
     # Timestamps (new structure)
-    col.create_index("timestamps.created_at")
+    await col.create_index("timestamps.created_at")
 
     # Legacy compatibility
-    col.create_index("created_at")
+    await col.create_index("created_at")
 
     # Optional compound indexes
-    col.create_index([("status", 1), ("priority", 1)])
-    col.create_index([("category", 1), ("status", 1)])
+    await col.create_index([("status", 1), ("priority", 1)])
+    await col.create_index([("category", 1), ("status", 1)])
+
+    # Keyset pagination for GET /requests: one index per filter combination,
+    # equality fields first, then the (created_at, _id) sort key.
+    for filters in LIST_FILTER_COMBINATIONS:
+        await col.create_index([(f, 1) for f in filters] + [("created_at", -1), ("_id", -1)])
+
+    # GET /requests/me: keyset pages per citizen (also serves the idempotency lookup)
+    await col.create_index([("citizen_id", 1), ("created_at", -1), ("_id", -1)])
+
+    # Agent workload: open requests per assigned agent
+    await col.create_index([("assignment.assigned_agent_id", 1), ("status", 1)])
+
+    # Duplicate clustering job: duplicates linked by one run
+    await col.create_index("duplicates.merged_by_run", sparse=True)
+
+    # SLA sweeper: open requests whose next SLA boundary has passed
+    await col.create_index("sla_next_check_at", sparse=True)
+
+    # Batch writes (auto-assign, SLA sweep): per-batch KPI deltas read back by id
+    await col.create_index("kpi_batch.id", sparse=True)
 
     # ---- Remove idempotency unique index (compatibility) ----
     # Some MongoDB deployments don't support partialFilterExpression well.
     try:
-        col.drop_index("idempotency.key_1_citizen_id_1")
+        await col.drop_index("idempotency.key_1_citizen_id_1")
     except Exception:
         pass
+
+    # Agents: geo-aware assignment ($geoNear on the coverage fence)
+    try:
+        await db.service_agents.create_index([("coverage.geo_fence", "2dsphere")])
+    except OperationFailure as e:
+        # an existing agent with an invalid GeoJSON fence blocks the index
+        logger.warning("service_agents.coverage.geo_fence 2dsphere index not created: %s", e)
+
+    # SLA policy table: one policy per id and per match key (unset fields are null)
+    await db.sla_policies.create_index("policy_id", unique=True)
+    await db.sla_policies.create_index([("category", 1), ("zone_id", 1), ("priority", 1)], unique=True)
+
+    # Users (staff login)
+    await db.users.create_index("email", unique=True)
+
+    # Display-name fallback lookups (legacy string ids on citizens/users)
+    await db.citizens.create_index("id", sparse=True)
+    await db.citizens.create_index("citizen_id", sparse=True)
+    await db.users.create_index("id", sparse=True)
+
+    # Performance logs: one header per request + fixed-size event buckets
+    try:
+        await db.performance_logs.create_index("request_id", unique=True)
+    except OperationFailure as e:
+        # legacy duplicate headers: python -m app.jobs.migrate_performance_logs merges them
+        logger.warning("performance_logs.request_id unique index not created: %s", e)
+    await db.performance_log_buckets.create_index([("request_id", 1), ("bucket", 1)], unique=True)
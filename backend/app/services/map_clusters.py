@@ -0,0 +1,127 @@
+# app/services/map_clusters.py
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, List, Optional
+
+from pymongo.asynchronous.collection import AsyncCollection
+
+from app.services.heatmap_service import MAX_ZOOM, BBox, build_heatmap_match
+from app.services.heatmap_tile_cache import MAX_PREFILTER_SPAN_DEG, PREFILTER_MARGIN_RATIO
+
+# grid cells per 256px map tile edge (64px cells: one marker per cell)
+CLUSTER_CELLS_PER_TILE = 4
+
+# fields of a single point returned below the density threshold (the "map" view)
+POINT_FIELDS = ("category", "status", "priority", "description")
+
+
+def cluster_cell_deg(zoom: int) -> float:
+    zoom = min(max(int(zoom), 0), MAX_ZOOM)
+    return 360.0 / (2 ** zoom) / CLUSTER_CELLS_PER_TILE
+
+
+def cells_in_bbox(bbox: BBox, cell_deg: float) -> int:
+    min_lng, min_lat, max_lng, max_lat = bbox
+    nx = math.floor(max_lng / cell_deg) - math.floor(min_lng / cell_deg) + 1
+    ny = math.floor(max_lat / cell_deg) - math.floor(min_lat / cell_deg) + 1
+    return nx * ny
+
+
+def effective_zoom(bbox: BBox, zoom: int, max_cells: int) -> int:
+    """zoom, lowered until the bbox spans at most max_cells grid cells (bounds the payload)."""
+    zoom = min(max(int(zoom), 0), MAX_ZOOM)
+    while zoom > 0 and cells_in_bbox(bbox, cluster_cell_deg(zoom)) > max_cells:
+        zoom -= 1
+    return zoom
+
+
+def bbox_match(bbox: BBox, statuses: List[str]) -> List[Dict[str, Any]]:
+    """
+    $match stages for requests inside bbox: an index-backed $geoWithin with a
+    margin (skipped on wide windows, where geodesic edges drift), then the
+    exact planar bounds on the coordinates.
+    """
+    min_lng, min_lat, max_lng, max_lat = bbox
+    span = max(max_lng - min_lng, max_lat - min_lat)
+    prefilter: Optional[BBox] = None
+    if span <= MAX_PREFILTER_SPAN_DEG:
+        m = span * PREFILTER_MARGIN_RATIO
+        prefilter = (max(min_lng - m, -180.0), max(min_lat - m, -90.0), min(max_lng + m, 180.0), min(max_lat + m, 90.0))
+    return [
+        {"$match": build_heatmap_match(statuses, prefilter)},
+        {"$match": {
+            "location.coordinates.0": {"$gte": min_lng, "$lte": max_lng},
+            "location.coordinates.1": {"$gte": min_lat, "$lte": max_lat},
+        }},
+    ]
+
+
+async def cluster_requests(
+    col: AsyncCollection,
+    bbox: BBox,
+    zoom: int,
+    statuses: Optional[List[str]] = None,
+    point_threshold: int = 5,
+    max_cells: int = 1024,
+) -> Dict[str, Any]:
+    """
+    Grid clustering of every request inside bbox, in one aggregation:
+    bbox_match, then $group per grid cell with the count, the centroid and
+    the first point_threshold points ($firstN, MongoDB 5.2+). Cells holding
+    at most point_threshold requests come back as individual points, denser
+    ones as {lat, lng, count} clusters, so every request is accounted for at
+    any zoom. The zoom is lowered when the bbox would span more than
+    max_cells cells.
+    """
+    zoom = effective_zoom(bbox, zoom, max_cells)
+    cell_deg = cluster_cell_deg(zoom)
+    lng = {"$arrayElemAt": ["$location.coordinates", 0]}
+    lat = {"$arrayElemAt": ["$location.coordinates", 1]}
+
+    cursor = await col.aggregate(bbox_match(bbox, statuses or []) + [
+        {"$group": {
+            "_id": {"x": {"$floor": {"$divide": [lng, cell_deg]}}, "y": {"$floor": {"$divide": [lat, cell_deg]}}},
+            "count": {"$sum": 1},
+            "lng": {"$avg": lng},
+            "lat": {"$avg": lat},
+            "points": {"$firstN": {
+                "n": max(point_threshold, 1),
+                "input": {
+                    "_id": "$_id",
+                    "location": {"coordinates": "$location.coordinates"},
+                    **{f: f"${f}" for f in POINT_FIELDS},
+                },
+            }},
+        }},
+    ])
+
+    clusters: List[Dict[str, Any]] = []
+    items: List[Dict[str, Any]] = []
+    total = 0
+    async for cell in cursor:
+        count = int(cell["count"])
+        total += count
+        if count <= point_threshold:
+            items.extend(cell["points"])
+            continue
+        x, y = int(cell["_id"]["x"]), int(cell["_id"]["y"])
+        clusters.append({
+            "lat": round(cell["lat"], 6),
+            "lng": round(cell["lng"], 6),
+            "count": count,
+            # cell bounds: zooming the map to them splits the cluster
+            "bbox": [
+                round(x * cell_deg, 6), round(y * cell_deg, 6),
+                round((x + 1) * cell_deg, 6), round((y + 1) * cell_deg, 6),
+            ],
+        })
+    clusters.sort(key=lambda c: -c["count"])
+
+    return {
+        "zoom": zoom,
+        "cell_deg": cell_deg,
+        "total": total,
+        "clusters": clusters,
+        "items": items,
+    }
@@ -0,0 +1,187 @@
+# app/services/sla_analytics.py
+from __future__ import annotations
+
+import math
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from fastapi import HTTPException
+from pymongo.asynchronous.collection import AsyncCollection
+
+from app.services.sla_calendar import BusinessCalendar
+from app.services.sla_service import (
+    DEFAULT_SLA_HOURS,
+    SLA_AT_RISK,
+    SLA_BREACHED,
+    SLA_ON_TIME,
+    compute_sla_states_batch,
+    epoch_seconds,
+    naive_utc,
+)
+
+# group_by value -> request field
+COMPLIANCE_GROUPS = {
+    "category": "category",
+    "zone": "location.zone_id",
+    "priority": "priority",
+}
+
+# documents per vectorised chunk (bounds memory on large ranges)
+COMPLIANCE_CHUNK = 10000
+
+COMPLIANCE_PROJECTION = {
+    "_id": 0,
+    "category": 1,
+    "priority": 1,
+    "location.zone_id": 1,
+    "timestamps.created_at": 1,
+    "timestamps.resolved_at": 1,
+    "sla_policy.target_hours": 1,
+    "sla_policy.breach_threshold_hours": 1,
+    "sla_policy.calendar": 1,
+}
+
+
+def _group_key(doc: Dict[str, Any], group_by: str) -> str:
+    if group_by == "zone":
+        value = (doc.get("location") or {}).get("zone_id")
+    else:
+        value = doc.get(group_by)
+    return str(value) if value not in (None, "") else "unknown"
+
+
+class _ComplianceTotals:
+    """Per-group accumulators, updated one chunk (numpy arrays) at a time."""
+
+    def __init__(self):
+        self.keys: Dict[str, int] = {}
+        self.columns = ("total", "resolved", "resolved_on_time", "on_time", "at_risk", "breached")
+        self.counts = np.zeros((0, len(self.columns)), dtype=np.int64)
+        self.elapsed_sum = np.zeros(0, dtype=np.float64)
+        self.resolution_sum = np.zeros(0, dtype=np.float64)
+
+    def code(self, key: str) -> int:
+        code = self.keys.get(key)
+        if code is None:
+            code = self.keys[key] = len(self.keys)
+        return code
+
+    def add(self, groups: np.ndarray, result: Dict[str, np.ndarray]) -> None:
+        n = len(self.keys)
+        if self.counts.shape[0] < n:
+            grow = n - self.counts.shape[0]
+            self.counts = np.vstack([self.counts, np.zeros((grow, len(self.columns)), dtype=np.int64)])
+            self.elapsed_sum = np.concatenate([self.elapsed_sum, np.zeros(grow)])
+            self.resolution_sum = np.concatenate([self.resolution_sum, np.zeros(grow)])
+
+        state, resolved, elapsed = result["state"], result["resolved"], result["elapsed_hours"]
+        for col, mask in enumerate((
+            np.ones(len(groups), dtype=bool),
+            resolved,
+            resolved & (state == SLA_ON_TIME),
+            state == SLA_ON_TIME,
+            state == SLA_AT_RISK,
+            state == SLA_BREACHED,
+        )):
+            self.counts[:, col] += np.bincount(groups[mask], minlength=n)[:n]
+        self.elapsed_sum += np.bincount(groups, weights=elapsed, minlength=n)[:n]
+        self.resolution_sum += np.bincount(groups[resolved], weights=elapsed[resolved], minlength=n)[:n]
+
+    def rows(self) -> List[Dict[str, Any]]:
+        rows = []
+        for key, code in self.keys.items():
+            c = dict(zip(self.columns, (int(v) for v in self.counts[code])))
+            rows.append({
+                "_id": key,
+                **c,
+                # resolved within target / all resolved
+                "compliance_rate": round(c["resolved_on_time"] / c["resolved"], 4) if c["resolved"] else None,
+                "breach_rate": round(c["breached"] / c["total"], 4) if c["total"] else None,
+                "avg_elapsed_hours": round(float(self.elapsed_sum[code]) / c["total"], 2) if c["total"] else None,
+                "avg_resolution_hours": (
+                    round(float(self.resolution_sum[code]) / c["resolved"], 2) if c["resolved"] else None
+                ),
+            })
+        rows.sort(key=lambda r: (-r["total"], r["_id"]))
+        return rows
+
+
+async def sla_compliance(
+    col: AsyncCollection,
+    start: datetime,
+    end: datetime,
+    group_by: str = "category",
+    now: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """
+    SLA compliance of requests created in [start, end), grouped by category,
+    zone or priority. Documents are streamed with a narrow projection into
+    columnar arrays and evaluated COMPLIANCE_CHUNK at a time with
+    compute_sla_states_batch. Requests on a business-hours policy enter the
+    arrays on their calendar's clock (business seconds).
+    """
+    if group_by not in COMPLIANCE_GROUPS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {', '.join(COMPLIANCE_GROUPS)}")
+    start, end = naive_utc(start), naive_utc(end)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    now = now or datetime.utcnow()
+    now_epoch = epoch_seconds(now)
+
+    totals = _ComplianceTotals()
+    created_s = np.empty(COMPLIANCE_CHUNK, dtype=np.float64)
+    resolved_s = np.empty(COMPLIANCE_CHUNK, dtype=np.float64)
+    target = np.empty(COMPLIANCE_CHUNK, dtype=np.float64)
+    breach = np.empty(COMPLIANCE_CHUNK, dtype=np.float64)
+    now_s = np.empty(COMPLIANCE_CHUNK, dtype=np.float64)
+    groups = np.empty(COMPLIANCE_CHUNK, dtype=np.int64)
+
+    def flush(n: int) -> None:
+        if n:
+            totals.add(groups[:n], compute_sla_states_batch(
+                created_s[:n], resolved_s[:n], target[:n], breach[:n], now_s=now_s[:n],
+            ))
+
+    n = 0
+    cursor = col.find(
+        {"timestamps.created_at": {"$gte": start, "$lt": end}},
+        COMPLIANCE_PROJECTION,
+        batch_size=COMPLIANCE_CHUNK,
+    )
+    async for doc in cursor:
+        ts = doc.get("timestamps") or {}
+        policy = doc.get("sla_policy") or {}
+        resolved_at = ts.get("resolved_at")
+        t = policy.get("target_hours") or DEFAULT_SLA_HOURS.get(doc.get("priority"), 72)
+        b = policy.get("breach_threshold_hours")
+
+        business = BusinessCalendar.from_policy(policy.get("calendar"))
+        if business is not None:
+            created_s[n] = business.minutes_at(ts["created_at"]) * 60.0
+            resolved_s[n] = business.minutes_at(resolved_at) * 60.0 if resolved_at else math.nan
+            now_s[n] = business.minutes_at(now) * 60.0
+        else:
+            created_s[n] = epoch_seconds(ts["created_at"])
+            resolved_s[n] = epoch_seconds(resolved_at) if resolved_at else math.nan
+            now_s[n] = now_epoch
+        target[n] = t
+        breach[n] = b if b is not None else math.nan
+        groups[n] = totals.code(_group_key(doc, group_by))
+        n += 1
+        if n == COMPLIANCE_CHUNK:
+            flush(n)
+            n = 0
+    flush(n)
+
+    rows = totals.rows()
+    resolved = sum(r["resolved"] for r in rows)
+    resolved_on_time = sum(r["resolved_on_time"] for r in rows)
+    return {
+        "group_by": group_by,
+        "start": start,
+        "end": end,
+        "total_requests": sum(r["total"] for r in rows),
+        "compliance_rate": round(resolved_on_time / resolved, 4) if resolved else None,
+        "groups": rows,
+    }
@@ -0,0 +1,134 @@
+# app/services/sla_calendar.py
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from app.services.assignment_service import _DAYS, _parse_hhmm
+
+# Business-hours calendar of an SLA policy, as stored on sla_policies and
+# copied into each request's sla_policy:
+#   {"timezone": "Asia/Jerusalem",
+#    "hours": [{"day": "Sun", "start": "08:00", "end": "17:00"}, ...],
+#    "start_min": [7 ints], "open_min": [7 ints]}      (Monday first)
+# start_min/open_min are compiled from hours by compile_calendar and are what
+# both the Python and the aggregation-pipeline evaluation read.
+
+# week 0 starts on this Monday (local date)
+_ANCHOR_MONDAY = date(1970, 1, 5)
+_ANCHOR_UTC = datetime(1970, 1, 5)
+
+
+def compile_calendar(calendar: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate hours (one window per day, start < end) and add start_min/open_min."""
+    tz_name = calendar.get("timezone") or "UTC"
+    try:
+        ZoneInfo(tz_name)
+    except (KeyError, ValueError):
+        raise ValueError(f"unknown timezone {tz_name!r}")
+
+    start_min = [0] * 7
+    open_min = [0] * 7
+    seen = set()
+    for window in calendar.get("hours") or []:
+        day = _DAYS.get(str(window.get("day", "")).strip().lower())
+        start = _parse_hhmm(window.get("start"))
+        end = _parse_hhmm(window.get("end"))
+        if day is None or start is None or end is None or end <= start:
+            raise ValueError(f"invalid business hours window {window!r}")
+        if day in seen:
+            raise ValueError(f"more than one business hours window on {window.get('day')}")
+        seen.add(day)
+        start_min[day], open_min[day] = start, end - start
+    if not any(open_min):
+        raise ValueError("business hours calendar has no open hours")
+
+    return {**calendar, "timezone": tz_name, "start_min": start_min, "open_min": open_min}
+
+
+class BusinessCalendar:
+    """
+    Business minutes as a monotonic clock: minutes_at(t) counts open minutes
+    from a fixed local Monday to t, so the business time between two
+    instants is a subtraction. Weekly prefix sums make both directions O(1).
+    """
+
+    __slots__ = ("tz", "start", "open", "cum", "week")
+
+    def __init__(self, tz_name: str, start_min: List[int], open_min: List[int]):
+        self.tz = ZoneInfo(tz_name)
+        self.start = list(start_min)
+        self.open = list(open_min)
+        self.cum = [sum(self.open[:d]) for d in range(7)]
+        self.week = sum(self.open)
+
+    @staticmethod
+    def from_policy(calendar: Optional[Dict[str, Any]]) -> Optional["BusinessCalendar"]:
+        if not calendar or not calendar.get("open_min"):
+            return None
+        return _cached(calendar.get("timezone") or "UTC", tuple(calendar["start_min"]), tuple(calendar["open_min"]))
+
+    def minutes_at(self, at: datetime) -> float:
+        if at.tzinfo is None:
+            at = at.replace(tzinfo=timezone.utc)
+        local = at.astimezone(self.tz)
+        days = (local.date() - _ANCHOR_MONDAY).days
+        weeks, d = divmod(days, 7)
+        minute = local.hour * 60 + local.minute + (local.second + local.microsecond / 1e6) / 60.0
+        return weeks * self.week + self.cum[d] + min(max(minute - self.start[d], 0), self.open[d])
+
+    def hours_between(self, start: datetime, end: datetime) -> float:
+        return (self.minutes_at(end) - self.minutes_at(start)) / 60.0
+
+    def add_hours(self, start: datetime, hours: float) -> datetime:
+        """First instant (naive UTC) at which `hours` business hours have passed since start."""
+        target = self.minutes_at(start) + hours * 60.0
+        weeks, rem = divmod(target, self.week)
+        d = next(d for d in range(7) if self.open[d] and self.cum[d] + self.open[d] >= rem)
+        minute = self.start[d] + max(rem - self.cum[d], 0.0)
+        local_date = _ANCHOR_MONDAY + timedelta(days=int(weeks) * 7 + d)
+        local = datetime(local_date.year, local_date.month, local_date.day, tzinfo=self.tz) + timedelta(minutes=minute)
+        return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+@lru_cache(maxsize=256)
+def _cached(tz_name: str, start_min: Tuple[int, ...], open_min: Tuple[int, ...]) -> BusinessCalendar:
+    return BusinessCalendar(tz_name, list(start_min), list(open_min))
+
+
+def business_minutes_expr(date_expr: Any, calendar_path: str = "$sla_policy.calendar") -> Dict[str, Any]:
+    """Aggregation expression equivalent of BusinessCalendar.minutes_at for the calendar at calendar_path."""
+    tz = f"{calendar_path}.timezone"
+    start_min = f"{calendar_path}.start_min"
+    open_min = f"{calendar_path}.open_min"
+    return {
+        "$let": {
+            "vars": {
+                "d": {"$subtract": [{"$isoDayOfWeek": {"date": date_expr, "timezone": tz}}, 1]},
+                "m": {"$add": [
+                    {"$multiply": [{"$hour": {"date": date_expr, "timezone": tz}}, 60]},
+                    {"$minute": {"date": date_expr, "timezone": tz}},
+                    {"$divide": [{"$second": {"date": date_expr, "timezone": tz}}, 60.0]},
+                    {"$divide": [{"$millisecond": {"date": date_expr, "timezone": tz}}, 60000.0]},
+                ]},
+                "w": {"$dateDiff": {
+                    "startDate": _ANCHOR_UTC, "endDate": date_expr,
+                    "unit": "week", "timezone": tz, "startOfWeek": "monday",
+                }},
+            },
+            "in": {"$add": [
+                {"$multiply": ["$$w", {"$sum": open_min}]},
+                {"$reduce": {
+                    "input": {"$range": [0, "$$d"]},
+                    "initialValue": 0,
+                    "in": {"$add": ["$$value", {"$arrayElemAt": [open_min, "$$this"]}]},
+                }},
+                {"$min": [
+                    {"$max": [{"$subtract": ["$$m", {"$arrayElemAt": [start_min, "$$d"]}]}, 0]},
+                    {"$arrayElemAt": [open_min, "$$d"]},
+                ]},
+            ]},
+        }
+    }
@@ -0,0 +1,180 @@
+# app/services/sla_policy_cache.py
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from itertools import combinations
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo.asynchronous.collection import AsyncCollection
+
+from app.core.app_config import settings
+from app.services.sla_service import builtin_policy_expr, select_sla_policy
+
+# single document in sla_policy_meta holding the table version
+META_COLLECTION = "sla_policy_meta"
+META_ID = "version"
+
+# match fields, most significant first: a zone override beats a category
+# override, which beats a priority-only rule (see CompiledSlaPolicies)
+MATCH_FIELDS = ("zone_id", "category", "priority")
+
+MatchKey = Tuple[Optional[str], Optional[str], Optional[str]]  # (zone_id, category, priority)
+
+
+def _weight(fields: Tuple[str, ...]) -> int:
+    return sum(1 << (len(MATCH_FIELDS) - 1 - MATCH_FIELDS.index(f)) for f in fields)
+
+
+# every subset of MATCH_FIELDS, most specific first
+_LOOKUP_ORDER: List[Tuple[str, ...]] = sorted(
+    (c for n in range(len(MATCH_FIELDS) + 1) for c in combinations(MATCH_FIELDS, n)),
+    key=_weight,
+    reverse=True,
+)
+
+
+def _match_key(zone_id: Optional[str], category: Optional[str], priority: Optional[str]) -> MatchKey:
+    return zone_id or None, category or None, priority or None
+
+
+def _specificity(key: MatchKey) -> int:
+    return _weight(tuple(f for f, v in zip(MATCH_FIELDS, key) if v is not None))
+
+
+def _policy_body(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """The request-independent part of a resolved policy, defaults filled in."""
+    target = int(doc["target_hours"])
+    breach = doc.get("breach_threshold_hours")
+    breach = int(breach) if breach is not None else int(math.ceil(target * 1.25))
+    steps = doc.get("escalation_steps") or [
+        {"after_hours": target, "action": "notify_dispatcher"},
+        {"after_hours": breach, "action": "notify_manager"},
+    ]
+    body = {
+        "policy_id": doc["policy_id"],
+        "target_hours": target,
+        "breach_threshold_hours": breach,
+        "escalation_steps": [dict(s) for s in steps],
+    }
+    if doc.get("calendar"):
+        body["calendar"] = doc["calendar"]
+    return body
+
+
+class CompiledSlaPolicies:
+    """
+    Immutable snapshot of the active sla_policies at one version.
+
+    A policy matches on any of zone_id / category / priority (unset = any);
+    the most specific match wins, ranked by the bitmask of set fields with
+    zone > category > priority. resolve() probes the 8 possible keys in that
+    order (dict lookups, no scan) and falls back to select_sla_policy.
+    policy_expr() is the same resolution as an aggregation $switch, for
+    pipeline updates. Resolved policies carry `version` so stale ones can be
+    found after the table changes.
+    """
+
+    def __init__(self, version: int, docs: List[Dict[str, Any]]):
+        self.version = version
+        self._by_key: Dict[MatchKey, Dict[str, Any]] = {}
+        for doc in docs:
+            key = _match_key(doc.get("zone_id"), doc.get("category"), doc.get("priority"))
+            self._by_key[key] = _policy_body(doc)
+        self._expr: Optional[Dict[str, Any]] = None
+
+    def __len__(self) -> int:
+        return len(self._by_key)
+
+    def resolve(self, category: str, priority: str, zone_id: Optional[str] = None) -> Dict[str, Any]:
+        values = {"zone_id": zone_id or None, "category": category or None, "priority": priority or None}
+        for fields in _LOOKUP_ORDER:
+            if any(values[f] is None for f in fields):
+                continue
+            body = self._by_key.get(tuple(values[f] if f in fields else None for f in MATCH_FIELDS))
+            if body is not None:
+                return {
+                    **body,
+                    "escalation_steps": [dict(s) for s in body["escalation_steps"]],
+                    "zone_id": zone_id,
+                    "category": category,
+                    "priority": priority,
+                    "version": self.version,
+                }
+        return {**select_sla_policy(category=category, priority=priority, zone_id=zone_id), "version": self.version}
+
+    def policy_expr(self) -> Dict[str, Any]:
+        if self._expr is not None:
+            return self._expr
+
+        fields = {
+            "zone_id": {"$ifNull": ["$location.zone_id", None]},
+            "category": {"$ifNull": ["$category", "general"]},
+            "priority": {"$ifNull": ["$priority", "P2"]},
+        }
+        branches = []
+        for key in sorted(self._by_key, key=_specificity, reverse=True):
+            conds = [{"$eq": [fields[f], v]} for f, v in zip(MATCH_FIELDS, key) if v is not None]
+            branches.append({
+                "case": {"$and": conds} if conds else True,
+                "then": {"$mergeObjects": [{"$literal": self._by_key[key]}, fields, {"version": self.version}]},
+            })
+        default = {"$mergeObjects": [builtin_policy_expr(), {"version": self.version}]}
+        self._expr = {"$switch": {"branches": branches, "default": default}} if branches else default
+        return self._expr
+
+
+class SlaPolicyCache:
+    """
+    Process-local compiled sla_policies. The table version (sla_policy_meta)
+    is checked at most every refresh_seconds and the policies are reloaded
+    only when it moved; SlaPoliciesRepository writes bump the version and
+    call invalidate() so the writing process reloads immediately.
+    """
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._compiled: Optional[CompiledSlaPolicies] = None
+        self._check_at = 0.0
+        self._lock = asyncio.Lock()
+        self.loads = 0
+        self.checks = 0
+        self.hits = 0
+
+    def invalidate(self) -> None:
+        self._check_at = 0.0
+
+    async def policies(self, col: AsyncCollection) -> CompiledSlaPolicies:
+        compiled = self._compiled
+        if compiled is not None and self._check_at > time.monotonic():
+            self.hits += 1
+            return compiled
+
+        async with self._lock:
+            # another caller may have checked while we waited
+            if self._compiled is not None and self._check_at > time.monotonic():
+                self.hits += 1
+                return self._compiled
+            meta = await col.database[META_COLLECTION].find_one({"_id": META_ID})
+            version = int((meta or {}).get("version", 0))
+            self.checks += 1
+            if self._compiled is None or self._compiled.version != version:
+                docs = await col.find({"active": True}).to_list(length=None)
+                self._compiled = CompiledSlaPolicies(version, docs)
+                self.loads += 1
+            self._check_at = time.monotonic() + self.refresh_seconds
+            return self._compiled
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self._compiled.version if self._compiled is not None else None,
+            "policies": len(self._compiled) if self._compiled is not None else None,
+            "refresh_seconds": self.refresh_seconds,
+            "loads": self.loads,
+            "checks": self.checks,
+            "hits": self.hits,
+        }
+
+
+sla_policy_cache = SlaPolicyCache(refresh_seconds=settings.SLA_POLICY_REFRESH_SECONDS)
@@ -1,25 +1,39 @@
 # app/services/sla_service.py
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Dict, Optional, Any
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Any, List
 import math
 
-# Simple SLA policy table (extend later)
+import numpy as np
+
+from app.services.sla_calendar import BusinessCalendar, business_minutes_expr
+
+# Built-in targets, used when no sla_policies entry matches (see sla_policy_cache)
 DEFAULT_SLA_HOURS = {
     "P1": 48,
     "P2": 72,
     "P3": 120,
 }
 
+# share of target_hours after which an open request is "at_risk"
+AT_RISK_RATIO = 0.8
+
+# no further SLA boundaries once a request reaches one of these
+SLA_TERMINAL_STATUSES = ("resolved", "closed")
+
+# state codes returned by compute_sla_states_batch (index = code)
+SLA_STATES = ("on_time", "at_risk", "breached")
+SLA_ON_TIME, SLA_AT_RISK, SLA_BREACHED = range(len(SLA_STATES))
+
 # Used for heatmap weights
 PRIORITY_WEIGHT = {"P1": 1.0, "P2": 0.7, "P3": 0.4}
 
 
 def select_sla_policy(category: str, priority: str, zone_id: Optional[str] = None) -> Dict[str, Any]:
     """
-    Minimal SLA policy generator to match the guideline schema.
-    You can later extend per category/zone.
+    Built-in SLA policy by priority, in the guideline schema. Per category /
+    zone overrides live in sla_policies (CompiledSlaPolicies.resolve).
     """
     target_hours = int(DEFAULT_SLA_HOURS.get(priority, 72))
     breach_threshold_hours = int(math.ceil(target_hours * 1.25))
@@ -45,18 +59,25 @@ def compute_sla_state(
     resolved_at: Optional[datetime],
     target_hours: int,
     breach_threshold_hours: Optional[int] = None,
+    now: Optional[datetime] = None,
+    calendar: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
     """
-    Compute SLA state using created_at -> resolved_at (or now).
+    Compute SLA state using created_at -> resolved_at (or now), counting only
+    open hours when the policy has a business-hours calendar.
     State:
       - on_time
       - at_risk  (>= 80% of target and not resolved)
       - breached (if resolved late OR if now beyond breach_threshold)
     """
-    now = datetime.utcnow()
+    now = now or datetime.utcnow()
     end = resolved_at or now
 
-    elapsed_hours = (end - created_at).total_seconds() / 3600.0
+    business = BusinessCalendar.from_policy(calendar)
+    if business is not None:
+        elapsed_hours = business.hours_between(created_at, end)
+    else:
+        elapsed_hours = (end - created_at).total_seconds() / 3600.0
     elapsed_hours = max(elapsed_hours, 0.0)
 
     breach_threshold = breach_threshold_hours if breach_threshold_hours is not None else int(math.ceil(target_hours * 1.25))
@@ -68,7 +89,7 @@ def compute_sla_state(
         if elapsed_hours >= breach_threshold:
             state = "breached"
             breach_reason = "overdue_open"
-        elif elapsed_hours >= (0.8 * target_hours):
+        elif elapsed_hours >= (AT_RISK_RATIO * target_hours):
             state = "at_risk"
             breach_reason = None
         else:
@@ -90,9 +111,77 @@ def compute_sla_state(
     }
 
 
-def build_sla_fields_from_request(request_doc: Dict[str, Any]) -> Dict[str, Any]:
+def compute_sla_states_batch(
+    created_s: np.ndarray,
+    resolved_s: np.ndarray,
+    target_hours: np.ndarray,
+    breach_threshold_hours: Optional[np.ndarray] = None,
+    now: Optional[datetime] = None,
+    now_s: Optional[np.ndarray] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    compute_sla_state over columns, one element per request:
+      - created_s / resolved_s: epoch seconds (resolved_s NaN while open)
+      - target_hours / breach_threshold_hours: per request (NaN thresholds
+        default to ceil(target * 1.25), like compute_sla_state)
+      - now_s: per-request "now" on the same clock, overriding now (requests
+        on a business calendar pass BusinessCalendar.minutes_at * 60 for all three)
+    Returns {"elapsed_hours": float64, "state": int8 codes into SLA_STATES,
+    "resolved": bool}.
+    """
+    if now_s is None:
+        now_s = epoch_seconds(now or datetime.utcnow())
+    created_s = np.asarray(created_s, dtype=np.float64)
+    resolved_s = np.asarray(resolved_s, dtype=np.float64)
+    target = np.asarray(target_hours, dtype=np.float64)
+    default_breach = np.ceil(target * 1.25)
+    if breach_threshold_hours is None:
+        breach = default_breach
+    else:
+        breach = np.asarray(breach_threshold_hours, dtype=np.float64)
+        breach = np.where(np.isnan(breach), default_breach, breach)
+
+    resolved = ~np.isnan(resolved_s)
+    end = np.where(resolved, resolved_s, now_s)
+    elapsed = np.maximum((end - created_s) / 3600.0, 0.0)
+
+    state = np.full(elapsed.shape, SLA_ON_TIME, dtype=np.int8)
+    state[~resolved & (elapsed >= AT_RISK_RATIO * target)] = SLA_AT_RISK
+    state[~resolved & (elapsed >= breach)] = SLA_BREACHED
+    state[resolved & (elapsed > target)] = SLA_BREACHED
+
+    return {"elapsed_hours": elapsed, "state": state, "resolved": resolved}
+
+
+def naive_utc(dt: datetime) -> datetime:
+    """dt as a naive UTC datetime (the form pymongo stores and utcnow returns)."""
+    if dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def utcnow_ms() -> datetime:
+    """utcnow truncated to milliseconds, the precision MongoDB stores."""
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+def epoch_seconds(dt: datetime) -> float:
+    """Epoch seconds of a datetime; naive values are UTC (as stored by pymongo)."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def build_sla_fields_from_request(
+    request_doc: Dict[str, Any],
+    now: Optional[datetime] = None,
+    policies: Any = None,
+) -> Dict[str, Any]:
     """
     Given a request document, build SLA policy + computed SLA state fields.
+    The stored sla_policy is kept unless it is missing or, when the compiled
+    policy table (policies, see sla_policy_cache) is given, from another version.
     Expects request_doc fields:
       - category, priority
       - location.zone_id (optional)
@@ -109,12 +198,17 @@ def build_sla_fields_from_request(request_doc: Dict[str, Any]) -> Dict[str, Any]
     zone_id = loc.get("zone_id")
 
     ts = request_doc.get("timestamps") or {}
-    created_at = ts.get("created_at") or datetime.utcnow()
+    created_at = ts.get("created_at") or request_doc.get("created_at") or now or datetime.utcnow()
     triaged_at = ts.get("triaged_at")
     assigned_at = ts.get("assigned_at")
     resolved_at = ts.get("resolved_at")
 
-    sla_policy = request_doc.get("sla_policy") or select_sla_policy(category=category, priority=priority, zone_id=zone_id)
+    sla_policy = request_doc.get("sla_policy")
+    if not sla_policy or (policies is not None and sla_policy.get("version") != policies.version):
+        if policies is not None:
+            sla_policy = policies.resolve(category=category, priority=priority, zone_id=zone_id)
+        else:
+            sla_policy = select_sla_policy(category=category, priority=priority, zone_id=zone_id)
 
     computed = compute_sla_state(
         created_at=created_at,
@@ -123,6 +217,8 @@ def build_sla_fields_from_request(request_doc: Dict[str, Any]) -> Dict[str, Any]
         resolved_at=resolved_at,
         target_hours=int(sla_policy.get("target_hours", DEFAULT_SLA_HOURS.get(priority, 72))),
         breach_threshold_hours=int(sla_policy.get("breach_threshold_hours", int(math.ceil(DEFAULT_SLA_HOURS.get(priority, 72) * 1.25)))),
+        now=now,
+        calendar=sla_policy.get("calendar"),
     )
 
     return {
@@ -131,5 +227,312 @@ def build_sla_fields_from_request(request_doc: Dict[str, Any]) -> Dict[str, Any]
     }
 
 
+def policy_hours(policy: Dict[str, Any]) -> tuple:
+    """(target_hours, breach_threshold_hours) of a policy, defaults filled in."""
+    target = float(policy.get("target_hours") or 72)
+    breach = policy.get("breach_threshold_hours")
+    breach = float(breach) if breach is not None else float(math.ceil(target * 1.25))
+    return target, breach
+
+
+def escalation_steps(policy: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The policy's escalation steps ordered by after_hours (malformed steps dropped)."""
+    steps = [s for s in policy.get("escalation_steps") or [] if isinstance(s, dict) and s.get("after_hours") is not None]
+    return sorted(steps, key=lambda s: float(s["after_hours"]))
+
+
+def sla_boundaries_hours(policy: Dict[str, Any]) -> List[float]:
+    """Elapsed hours at which the SLA state or escalation level can change."""
+    target, breach = policy_hours(policy)
+    hours = {AT_RISK_RATIO * target, target, breach}
+    hours.update(float(s["after_hours"]) for s in escalation_steps(policy))
+    return sorted(hours)
+
+
+def policy_elapsed_hours(policy: Dict[str, Any], start: datetime, end: datetime) -> float:
+    """Hours from start to end on the policy's clock (business hours with a calendar), >= 0."""
+    business = BusinessCalendar.from_policy(policy.get("calendar"))
+    if business is not None:
+        return max(business.hours_between(start, end), 0.0)
+    return max((end - start).total_seconds() / 3600.0, 0.0)
+
+
+def next_sla_check_at(
+    policy: Dict[str, Any],
+    created_at: datetime,
+    status: Optional[str],
+    resolved_at: Optional[datetime] = None,
+    escalation_level: int = 0,
+    now: Optional[datetime] = None,
+) -> Optional[datetime]:
+    """
+    When the SLA sweeper should next look at a request: the first boundary
+    still ahead, now if an escalation step is due but not emitted yet, None
+    once the request is resolved/closed or every boundary has passed.
+    Mirrors the sla_next_check_at stage of build_sla_update_stages.
+    """
+    if resolved_at is not None or status in SLA_TERMINAL_STATUSES:
+        return None
+    now = now or datetime.utcnow()
+    elapsed = policy_elapsed_hours(policy, created_at, now)
+    due = sum(1 for s in escalation_steps(policy) if float(s["after_hours"]) <= elapsed)
+    if due > escalation_level:
+        return now
+    ahead = [h for h in sla_boundaries_hours(policy) if h > elapsed]
+    if not ahead:
+        return None
+    business = BusinessCalendar.from_policy(policy.get("calendar"))
+    if business is not None:
+        return business.add_hours(created_at, ahead[0])
+    return created_at + timedelta(hours=ahead[0])
+
+
+def _default_target_hours_expr() -> Dict[str, Any]:
+    return {
+        "$switch": {
+            "branches": [
+                {"case": {"$eq": ["$priority", p]}, "then": h}
+                for p, h in DEFAULT_SLA_HOURS.items()
+            ],
+            "default": 72,
+        }
+    }
+
+
+def builtin_policy_expr() -> Dict[str, Any]:
+    """Aggregation expression equivalent of select_sla_policy for the document's category/priority/zone."""
+    category = {"$ifNull": ["$category", "general"]}
+    priority = {"$ifNull": ["$priority", "P2"]}
+    target = _default_target_hours_expr()
+    breach = {"$toInt": {"$ceil": {"$multiply": [target, 1.25]}}}
+
+    return {
+        "policy_id": {"$concat": ["SLA-", {"$toUpper": category}, "-", priority]},
+        "target_hours": target,
+        "breach_threshold_hours": breach,
+        "escalation_steps": [
+            {"after_hours": target, "action": "notify_dispatcher"},
+            {"after_hours": breach, "action": "notify_manager"},
+        ],
+        "zone_id": {"$ifNull": ["$location.zone_id", None]},
+        "category": category,
+        "priority": priority,
+    }
+
+
+def _elapsed_hours_expr(start: Any, end: Any) -> Dict[str, Any]:
+    """Hours from start to end on the sla_policy clock: business hours with a calendar, else wall-clock."""
+    return {
+        "$cond": [
+            {"$eq": [{"$type": "$sla_policy.calendar.open_min"}, "array"]},
+            {"$divide": [{"$subtract": [business_minutes_expr(end), business_minutes_expr(start)]}, 60.0]},
+            {"$divide": [{"$subtract": [end, start]}, 3600000.0]},
+        ]
+    }
+
+
+def build_sla_update_stages(
+    now: Optional[datetime] = None,
+    policies: Any = None,
+    reresolve: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Aggregation-pipeline update stages that recompute sla_policy (if missing,
+    or always with reresolve=True), sla_computed, sla_state and
+    sla_next_check_at server-side, so a write can refresh SLA fields in the
+    same round trip instead of re-reading the document. policies (the compiled
+    sla_policies table) resolves the policy in the pipeline; without it the
+    built-in priority defaults apply.
+    Mirrors build_sla_fields_from_request / compute_sla_state; keep them in sync.
+    """
+    now = now or datetime.utcnow()
+
+    policy_expr = policies.policy_expr() if policies is not None else builtin_policy_expr()
+    sla_policy = policy_expr if reresolve else {"$ifNull": ["$sla_policy", policy_expr]}
+
+    is_resolved = {"$eq": [{"$type": "$timestamps.resolved_at"}, "date"]}
+
+    state = {
+        "$switch": {
+            "branches": [
+                {"case": {"$and": [is_resolved, {"$gt": ["$$elapsed", "$$target"]}]}, "then": "breached"},
+                {"case": is_resolved, "then": "on_time"},
+                {"case": {"$gte": ["$$elapsed", "$$breach"]}, "then": "breached"},
+                {"case": {"$gte": ["$$elapsed", {"$multiply": [AT_RISK_RATIO, "$$target"]}]}, "then": "at_risk"},
+            ],
+            "default": "on_time",
+        }
+    }
+
+    breach_reason = {
+        "$switch": {
+            "branches": [
+                {"case": {"$and": [is_resolved, {"$gt": ["$$elapsed", "$$target"]}]}, "then": "late_resolution"},
+                {"case": is_resolved, "then": None},
+                {"case": {"$gte": ["$$elapsed", "$$breach"]}, "then": "overdue_open"},
+            ],
+            "default": None,
+        }
+    }
+
+    computed = {
+        "$let": {
+            "vars": {
+                "created": {"$ifNull": ["$timestamps.created_at", {"$ifNull": ["$created_at", now]}]},
+                "target": "$sla_policy.target_hours",
+                "breach": {
+                    "$ifNull": [
+                        "$sla_policy.breach_threshold_hours",
+                        {"$toInt": {"$ceil": {"$multiply": ["$sla_policy.target_hours", 1.25]}}},
+                    ]
+                },
+            },
+            "in": {
+                "$let": {
+                    "vars": {
+                        "elapsed": {
+                            "$max": [
+                                0.0,
+                                _elapsed_hours_expr("$$created", {"$ifNull": ["$timestamps.resolved_at", now]}),
+                            ]
+                        },
+                    },
+                    "in": {
+                        "sla_target_hours": {"$toInt": "$$target"},
+                        "breach_threshold_hours": {"$toInt": "$$breach"},
+                        "elapsed_hours": {"$round": ["$$elapsed", 2]},
+                        "sla_state": state,
+                        "breach_reason": breach_reason,
+                        "milestones": {
+                            "created_at": "$$created",
+                            "triaged_at": {"$ifNull": ["$timestamps.triaged_at", None]},
+                            "assigned_at": {"$ifNull": ["$timestamps.assigned_at", None]},
+                            "resolved_at": {"$ifNull": ["$timestamps.resolved_at", None]},
+                        },
+                    },
+                }
+            },
+        }
+    }
+
+    # next boundary for the SLA sweeper, see next_sla_check_at. Exact on the
+    # wall clock; with a business calendar now + remaining business hours is
+    # an early bound (business time never runs faster) that the sweeper refines.
+    step_hours = {"$ifNull": ["$sla_policy.escalation_steps.after_hours", []]}
+    next_check = {
+        "$let": {
+            "vars": {
+                "target": "$sla_computed.sla_target_hours",
+                "elapsed": {"$max": [0.0, _elapsed_hours_expr("$sla_computed.milestones.created_at", now)]},
+            },
+            "in": {
+                "$let": {
+                    "vars": {
+                        "ahead": {"$min": {"$filter": {
+                            "input": {"$concatArrays": [
+                                [{"$multiply": [AT_RISK_RATIO, "$$target"]}, "$$target", "$sla_computed.breach_threshold_hours"],
+                                step_hours,
+                            ]},
+                            "cond": {"$gt": ["$$this", "$$elapsed"]},
+                        }}},
+                        "due": {"$size": {"$filter": {"input": step_hours, "cond": {"$lte": ["$$this", "$$elapsed"]}}}},
+                    },
+                    "in": {
+                        "$switch": {
+                            "branches": [
+                                {"case": {"$or": [is_resolved, {"$in": ["$status", list(SLA_TERMINAL_STATUSES)]}]}, "then": "$$REMOVE"},
+                                {"case": {"$gt": ["$$due", {"$ifNull": ["$sla_escalation_level", 0]}]}, "then": now},
+                                {"case": {"$eq": [{"$ifNull": ["$$ahead", None]}, None]}, "then": "$$REMOVE"},
+                            ],
+                            "default": {"$add": [now, {"$multiply": [{"$subtract": ["$$ahead", "$$elapsed"]}, 3600000.0]}]},
+                        }
+                    },
+                }
+            },
+        }
+    }
+
+    return [
+        {"$set": {"sla_policy": sla_policy}},
+        {"$set": {"sla_computed": computed}},
+        {"$set": {"sla_state": "$sla_computed.sla_state", "sla_next_check_at": next_check}},
+    ]
+
+
+def apply_sla_update(
+    doc: Dict[str, Any],
+    now: datetime,
+    policies: Any = None,
+    reresolve: bool = False,
+) -> Dict[str, Any]:
+    """
+    What build_sla_update_stages(now, policies, reresolve) writes, computed in
+    Python on doc (updated in place and returned): a write can return its
+    pre-image (ReturnDocument.BEFORE) and still build the post-image without
+    another round trip. Pass a millisecond-precision now (utcnow_ms).
+    """
+    sla_policy = doc.get("sla_policy")
+    if reresolve or not sla_policy:
+        category = doc.get("category") if doc.get("category") is not None else "general"
+        priority = doc.get("priority") if doc.get("priority") is not None else "P2"
+        zone_id = (doc.get("location") or {}).get("zone_id")
+        if policies is not None:
+            sla_policy = policies.resolve(category=category, priority=priority, zone_id=zone_id)
+        else:
+            sla_policy = select_sla_policy(category=category, priority=priority, zone_id=zone_id)
+
+    ts = doc.get("timestamps") or {}
+    created_at = ts.get("created_at") or doc.get("created_at") or now
+    resolved_at = ts.get("resolved_at") if isinstance(ts.get("resolved_at"), datetime) else None
+    target, breach = policy_hours(sla_policy)
+    computed = compute_sla_state(
+        created_at=created_at,
+        triaged_at=ts.get("triaged_at"),
+        assigned_at=ts.get("assigned_at"),
+        resolved_at=resolved_at,
+        target_hours=int(target),
+        breach_threshold_hours=int(breach),
+        now=now,
+        calendar=sla_policy.get("calendar"),
+    )
+
+    # the stage's sla_next_check_at: now + remaining hours on the policy clock
+    next_check: Optional[datetime] = None
+    if resolved_at is None and doc.get("status") not in SLA_TERMINAL_STATUSES:
+        elapsed = policy_elapsed_hours(sla_policy, created_at, now)
+        steps = [float(s["after_hours"]) for s in escalation_steps(sla_policy)]
+        ahead = [h for h in [AT_RISK_RATIO * int(target), int(target), int(breach)] + steps if h > elapsed]
+        if sum(1 for h in steps if h <= elapsed) > int(doc.get("sla_escalation_level") or 0):
+            next_check = now
+        elif ahead:
+            next_check = now + timedelta(hours=min(ahead) - elapsed)
+
+    doc["sla_policy"] = sla_policy
+    doc["sla_computed"] = computed
+    doc["sla_state"] = computed["sla_state"]
+    if next_check is not None:
+        doc["sla_next_check_at"] = next_check
+    else:
+        doc.pop("sla_next_check_at", None)
+    return doc
+
+
 def weight_for_heatmap(priority: str, age_hours: float) -> float:
     return float(PRIORITY_WEIGHT.get(priority, 0.5) * math.log1p(max(age_hours, 0.0)))
+
+
+def heatmap_weight_expr(now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Aggregation expression equivalent of weight_for_heatmap(priority, age_hours),
+    with age measured from the request's creation time to now.
+    """
+    now = now or datetime.utcnow()
+    created = {"$ifNull": ["$timestamps.created_at", {"$ifNull": ["$created_at", now]}]}
+    age_hours = {"$max": [0.0, {"$divide": [{"$subtract": [now, created]}, 3600000.0]}]}
+    priority_weight = {
+        "$switch": {
+            "branches": [{"case": {"$eq": ["$priority", p]}, "then": w} for p, w in PRIORITY_WEIGHT.items()],
+            "default": 0.5,
+        }
+    }
+    return {"$multiply": [priority_weight, {"$ln": {"$add": [1.0, age_hours]}}]}
@@ -0,0 +1,403 @@
+# app/services/sla_sweeper.py
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from pymongo.asynchronous.collection import AsyncCollection
+
+from app.core.app_config import settings
+from app.core.db import db
+from app.repositories.kpi_counters_repo import (
+    KpiCountersRepository,
+    build_kpi_batch_stages,
+    build_kpi_snapshot_stage,
+    take_kpi_batch,
+)
+from app.repositories.performance_logs_repo import PerformanceLogsRepository
+from app.services.sla_policy_cache import META_COLLECTION, META_ID, CompiledSlaPolicies, sla_policy_cache
+from app.services.sla_calendar import BusinessCalendar
+from app.services.sla_service import (
+    SLA_BREACHED,
+    SLA_STATES,
+    SLA_TERMINAL_STATUSES,
+    compute_sla_states_batch,
+    epoch_seconds,
+    escalation_steps,
+    policy_hours,
+    select_sla_policy,
+    sla_boundaries_hours,
+)
+from app.services.workflow_service import ALLOWED_TRANSITIONS
+
+logger = logging.getLogger(__name__)
+
+# open statuses as an $in list, so the policy-change remark is bounded by the
+# status index (None: legacy documents without a status count as "new")
+SLA_OPEN_STATUSES = [s for s in ALLOWED_TRANSITIONS if s not in SLA_TERMINAL_STATUSES] + [None]
+
+SWEEP_PROJECTION = {
+    "category": 1,
+    "priority": 1,
+    "status": 1,
+    "location.zone_id": 1,
+    "timestamps": 1,
+    "created_at": 1,
+    "sla_policy": 1,
+    "sla_state": 1,
+    "sla_escalation_level": 1,
+    "sla_next_check_at": 1,
+}
+
+
+class SlaSweeper:
+    """
+    Recomputes sla_state for requests whose sla_next_check_at (the next 80% /
+    target / breach / escalation boundary, kept by every SLA write) has passed,
+    so an untouched request still turns at_risk/breached on time.
+
+    Each batch is one indexed find, one compute_sla_states_batch pass over
+    the whole batch, then one bulk_write of updates guarded on the values that
+    were read, so a concurrent transition (or another worker sweeping the same
+    request) wins and the stale update is dropped. Requests whose sla_state or
+    escalation level moved get a pipeline update that feeds the KPI counters
+    their exact deltas through kpi_batch (stale entries from a crashed batch
+    are recovered at the start of every sweep) and emit one sla_escalation
+    event per step; the rest only get their SLA fields and next check set.
+
+    When the sla_policies version moves, open requests resolved under another
+    version are marked due once per version (whichever process claims it on
+    sla_policy_meta), and the sweep re-resolves their policy.
+    """
+
+    def __init__(
+        self,
+        requests_col: AsyncCollection,
+        counters: Optional[KpiCountersRepository] = None,
+        logs: Optional[PerformanceLogsRepository] = None,
+        batch_size: int = 500,
+        interval_s: float = 60.0,
+    ):
+        self.requests = requests_col
+        self.counters = counters
+        self.logs = logs
+        self.batch_size = max(batch_size, 1)
+        self.interval_s = interval_s
+        self._task: Optional[asyncio.Task] = None
+        self._policy_version: Optional[int] = None
+
+    # -------------------------
+    # sweeping
+    # -------------------------
+    @staticmethod
+    def _resolve_policies(
+        docs: List[Dict[str, Any]],
+        policies: Optional[CompiledSlaPolicies],
+    ) -> List[Dict[str, Any]]:
+        """Each doc's sla_policy, re-resolved (once per category/priority/zone) when missing or from another version."""
+        resolved: Dict[Tuple[Any, Any, Any], Dict[str, Any]] = {}
+        out = []
+        for d in docs:
+            policy = d.get("sla_policy")
+            if not policy or (policies is not None and policy.get("version") != policies.version):
+                key = (d.get("category", "general"), d.get("priority", "P2"), (d.get("location") or {}).get("zone_id"))
+                if key not in resolved:
+                    if policies is not None:
+                        resolved[key] = policies.resolve(category=key[0], priority=key[1], zone_id=key[2])
+                    else:
+                        resolved[key] = select_sla_policy(category=key[0], priority=key[1], zone_id=key[2])
+                policy = resolved[key]
+            out.append(policy)
+        return out
+
+    @classmethod
+    def _plan(
+        cls,
+        docs: List[Dict[str, Any]],
+        now: datetime,
+        policies: Optional[CompiledSlaPolicies] = None,
+    ) -> List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        """
+        (SLA fields to $set, escalation steps that became due) per doc, in
+        order. States and elapsed hours come from one compute_sla_states_batch
+        pass; boundaries and escalation steps are worked out once per policy
+        (policy_id + version) and matched with searchsorted.
+        Same results as build_sla_fields_from_request + next_sla_check_at.
+        """
+        n = len(docs)
+        doc_policies = cls._resolve_policies(docs, policies)
+        now_epoch = epoch_seconds(now)
+
+        created_s = np.empty(n, dtype=np.float64)
+        resolved_s = np.empty(n, dtype=np.float64)
+        now_s = np.empty(n, dtype=np.float64)
+        target = np.empty(n, dtype=np.float64)
+        breach = np.empty(n, dtype=np.float64)
+        group_of = np.empty(n, dtype=np.int64)
+        groups: Dict[Tuple[Any, Any], int] = {}
+        group_policies: List[Dict[str, Any]] = []
+        group_hours: List[Tuple[float, float]] = []
+        milestones: List[Dict[str, Any]] = []
+
+        for i, (d, policy) in enumerate(zip(docs, doc_policies)):
+            ts = d.get("timestamps") or {}
+            created = ts.get("created_at") or d.get("created_at") or now
+            resolved_at = ts.get("resolved_at")
+            milestones.append({
+                "created_at": created,
+                "triaged_at": ts.get("triaged_at"),
+                "assigned_at": ts.get("assigned_at"),
+                "resolved_at": resolved_at,
+            })
+            business = BusinessCalendar.from_policy(policy.get("calendar"))
+            if business is not None:
+                created_s[i] = business.minutes_at(created) * 60.0
+                resolved_s[i] = business.minutes_at(resolved_at) * 60.0 if resolved_at else math.nan
+                now_s[i] = business.minutes_at(now) * 60.0
+            else:
+                created_s[i] = epoch_seconds(created)
+                resolved_s[i] = epoch_seconds(resolved_at) if resolved_at else math.nan
+                now_s[i] = now_epoch
+            # the same policy_id + version is the same policy body
+            key = (policy.get("policy_id"), policy.get("version"))
+            if key not in groups:
+                groups[key] = len(group_policies)
+                group_policies.append(policy)
+                group_hours.append(policy_hours(policy))
+            group_of[i] = groups[key]
+            target[i], breach[i] = group_hours[group_of[i]]
+
+        batch = compute_sla_states_batch(created_s, resolved_s, target, breach, now_s=now_s)
+        elapsed, states, resolved = batch["elapsed_hours"], batch["state"], batch["resolved"]
+
+        due = np.zeros(n, dtype=np.int64)
+        ahead = np.full(n, np.nan)
+        group_steps: List[List[Dict[str, Any]]] = []
+        for g, policy in enumerate(group_policies):
+            idx = np.flatnonzero(group_of == g)
+            steps = escalation_steps(policy)
+            group_steps.append(steps)
+            step_hours = np.array([float(s["after_hours"]) for s in steps], dtype=np.float64)
+            due[idx] = np.searchsorted(step_hours, elapsed[idx], side="right")
+            bounds = np.array(sla_boundaries_hours(policy) + [np.nan], dtype=np.float64)
+            ahead[idx] = bounds[np.searchsorted(bounds[:-1], elapsed[idx], side="right")]
+
+        plans: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]] = []
+        for i, d in enumerate(docs):
+            policy = doc_policies[i]
+            state = SLA_STATES[states[i]]
+            breach_reason = None
+            if states[i] == SLA_BREACHED:
+                breach_reason = "late_resolution" if resolved[i] else "overdue_open"
+            computed = {
+                "sla_target_hours": int(target[i]),
+                "breach_threshold_hours": int(breach[i]),
+                "elapsed_hours": round(float(elapsed[i]), 2),
+                "sla_state": state,
+                "breach_reason": breach_reason,
+                "milestones": milestones[i],
+            }
+
+            level = int(d.get("sla_escalation_level") or 0)
+            next_check = None
+            new_steps: List[Dict[str, Any]] = []
+            if d.get("status") not in SLA_TERMINAL_STATUSES and not resolved[i]:
+                new_steps = group_steps[group_of[i]][level:int(due[i])]
+                if not math.isnan(ahead[i]):
+                    created = milestones[i]["created_at"]
+                    business = BusinessCalendar.from_policy(policy.get("calendar"))
+                    if business is not None:
+                        next_check = business.add_hours(created, float(ahead[i]))
+                    else:
+                        next_check = created + timedelta(hours=float(ahead[i]))
+
+            plans.append(({
+                "sla_policy": policy,
+                "sla_computed": computed,
+                "sla_state": state,
+                "sla_escalation_level": level + len(new_steps),
+                "sla_next_check_at": next_check,
+            }, new_steps))
+        return plans
+
+    async def _claim_remark(self, version: int) -> bool:
+        """Record version as remarked on sla_policy_meta; False if some process already did."""
+        meta = self.requests.database[META_COLLECTION]
+        try:
+            res = await meta.update_one(
+                {"_id": META_ID, "$or": [{"remarked_version": {"$exists": False}}, {"remarked_version": {"$lt": version}}]},
+                {"$set": {"remarked_version": version}, "$setOnInsert": {"version": version}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False  # the meta document exists and is already at this version
+        return bool(res.modified_count or res.upserted_id is not None)
+
+    async def _policies(self, now: datetime) -> CompiledSlaPolicies:
+        policies = await sla_policy_cache.policies(self.requests.database.sla_policies)
+        if policies.version != self._policy_version:
+            if await self._claim_remark(policies.version):
+                try:
+                    res = await self.requests.update_many(
+                        {"status": {"$in": SLA_OPEN_STATUSES}, "sla_policy.version": {"$ne": policies.version}},
+                        {"$set": {"sla_next_check_at": now}},
+                    )
+                except Exception:
+                    # release the claim so the next sweep retries the remark
+                    await self.requests.database[META_COLLECTION].update_one(
+                        {"_id": META_ID, "remarked_version": policies.version},
+                        {"$set": {"remarked_version": policies.version - 1}},
+                    )
+                    raise
+                if res.modified_count:
+                    logger.info("sla policies v%d: %d open requests to re-resolve", policies.version, res.modified_count)
+            self._policy_version = policies.version
+        return policies
+
+    async def sweep_batch(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """One batch of due requests; returns {"due", "updated", "escalations"}."""
+        now = now or datetime.utcnow()
+        policies = await self._policies(now)
+        docs = await self.requests.find(
+            {"sla_next_check_at": {"$lte": now}}, SWEEP_PROJECTION,
+        ).sort("sla_next_check_at", 1).limit(self.batch_size).to_list(length=None)
+        if not docs:
+            return {"due": 0, "updated": 0, "escalations": 0}
+
+        batch_id = str(ObjectId())
+        ops = []
+        plans: Dict[ObjectId, Tuple[Dict[str, Any], List[Dict[str, Any]]]] = {}
+        kpi_batched = False
+        for d, (fields, new_steps) in zip(docs, self._plan(docs, now, policies)):
+            plans[d["_id"]] = (fields, new_steps)
+            guard = {
+                "_id": d["_id"],
+                "sla_next_check_at": d["sla_next_check_at"],
+                "status": d.get("status"),
+                "sla_escalation_level": d.get("sla_escalation_level"),
+            }
+            if fields["sla_state"] == d.get("sla_state") and not new_steps:
+                # nothing the KPI counters or the event log track moved
+                update: Dict[str, Any] = {"$set": {k: v for k, v in fields.items() if v is not None}}
+                if fields["sla_next_check_at"] is None:
+                    update["$unset"] = {"sla_next_check_at": ""}
+                ops.append(UpdateOne(guard, update))
+                continue
+            kpi_batched = True
+            stage = {
+                "sla_policy": {"$literal": fields["sla_policy"]},
+                "sla_computed": {"$literal": fields["sla_computed"]},
+                "sla_state": fields["sla_state"],
+                "sla_escalation_level": fields["sla_escalation_level"],
+                "sla_next_check_at": fields["sla_next_check_at"] if fields["sla_next_check_at"] is not None else "$$REMOVE",
+            }
+            ops.append(UpdateOne(
+                guard, [build_kpi_snapshot_stage(), {"$set": stage}] + build_kpi_batch_stages(batch_id),
+            ))
+        res = await self.requests.bulk_write(ops, ordered=False)
+
+        written = await take_kpi_batch(self.requests, batch_id) if kpi_batched else []
+        if written and self.counters is not None:
+            await self.counters.record_batch(written)
+
+        events = []
+        by_oid = {d["_id"]: d for d in docs}
+        for w in written:
+            fields, new_steps = plans[w["_id"]]
+            d = by_oid[w["_id"]]
+            first = int(d.get("sla_escalation_level") or 0)
+            for i, step in enumerate(new_steps):
+                events.append((str(w["_id"]), PerformanceLogsRepository.build_event(
+                    "sla_escalation", "system", "sla_sweeper",
+                    {
+                        "step": first + i + 1,
+                        "action": step.get("action"),
+                        "after_hours": step.get("after_hours"),
+                        "policy_id": fields["sla_policy"].get("policy_id"),
+                        "sla_state": fields["sla_state"],
+                        "elapsed_hours": fields["sla_computed"]["elapsed_hours"],
+                    },
+                    at=now,
+                )))
+        if self.logs is not None and events:
+            await self.logs.append_events(events)
+
+        return {"due": len(docs), "updated": res.modified_count, "escalations": len(events)}
+
+    async def sweep_once(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Sweep batches until nothing due is left (or a batch makes no progress)."""
+        now = now or datetime.utcnow()
+        if self.counters is not None:
+            recovered = await self.counters.recover_batches(self.requests)
+            if recovered:
+                logger.warning("kpi counters: applied %d stale kpi_batch deltas", recovered)
+        totals = {"due": 0, "updated": 0, "escalations": 0}
+        while True:
+            stats = await self.sweep_batch(now)
+            for k, v in stats.items():
+                totals[k] += v
+            if stats["due"] < self.batch_size or not stats["updated"]:
+                return totals
+
+    # -------------------------
+    # lifecycle
+    # -------------------------
+    async def run(self) -> None:
+        """Sweep every interval_s until cancelled."""
+        while True:
+            try:
+                stats = await self.sweep_once()
+                if stats["due"]:
+                    logger.info("sla sweep: %s", stats)
+            except Exception:
+                logger.exception("sla sweep failed")
+            await asyncio.sleep(self.interval_s)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def build_sla_sweeper() -> SlaSweeper:
+    return SlaSweeper(
+        db.service_requests,
+        counters=KpiCountersRepository(db.kpi_counters),
+        logs=PerformanceLogsRepository(db.performance_logs),
+        batch_size=settings.SLA_SWEEP_BATCH_SIZE,
+        interval_s=settings.SLA_SWEEP_INTERVAL_SECONDS,
+    )
+
+
+_sweeper: Optional[SlaSweeper] = None
+
+
+def start_sla_sweeper() -> None:
+    """Start the background sweeper when SLA_SWEEP_ENABLED."""
+    global _sweeper
+    if not settings.SLA_SWEEP_ENABLED:
+        return
+    _sweeper = build_sla_sweeper()
+    _sweeper.start()
+
+
+async def stop_sla_sweeper() -> None:
+    global _sweeper
+    if _sweeper is not None:
+        await _sweeper.stop()
+        _sweeper = None
@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from fastapi import HTTPException
 
 
@@ -34,33 +34,58 @@ def validate_transition(current_status: str, next_status: str) -> None:
         )
 
 
-def build_transition_update(current_status: str, next_status: str) -> Dict[str, Any]:
+def allowed_sources(next_status: str) -> List[Optional[str]]:
     """
-    Returns a MongoDB update dict to apply a workflow transition:
-      - updates status
-      - sets timestamps.timestamps.<field> when applicable
-      - updates timestamps.timestamps.updated_at always
-    Assumes your request document has:
-      timestamps: { created_at, triaged_at, assigned_at, resolved_at, closed_at, updated_at, ... }
+    Statuses from which next_status may be entered. A missing status is treated
+    as "new" (legacy documents), so None is included whenever "new" is.
     """
-    validate_transition(current_status, next_status)
+    sources: List[Optional[str]] = [s for s, nexts in ALLOWED_TRANSITIONS.items() if next_status in nexts]
+    if "new" in sources:
+        sources.append(None)
+    return sources
 
-    now = datetime.utcnow()
+
+def build_transition_pipeline(next_status: str, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    Returns MongoDB aggregation-pipeline update stages to apply a workflow transition:
+      - remembers the previous status in workflow.previous_state
+      - updates status / workflow.current_state / workflow.allowed_next
+      - sets timestamps.<field> for the entered state only if not already set
+      - updates timestamps.updated_at always
+    The caller is expected to guard the filter with status in allowed_sources(next_status),
+    so validation and the write happen atomically in one round trip. Pass the
+    same now to build_sla_update_stages so timestamps and sla_computed agree.
+    """
+    now = now or datetime.utcnow()
 
     set_fields: Dict[str, Any] = {
+        "workflow.previous_state": {"$ifNull": ["$status", "new"]},
         "status": next_status,
         "workflow.current_state": next_status,
+        "workflow.allowed_next": {"$literal": ALLOWED_TRANSITIONS.get(next_status, [])},
         "timestamps.updated_at": now,
+        "updated_at": now,
     }
 
-    # Set the "entering-state" timestamp if exists and not already set
     ts_field = STATUS_TIMESTAMP_FIELD.get(next_status)
     if ts_field:
-        # Use $set only; repository can conditionally set if null.
-        # Here we provide it as a separate field so repo can use $set if missing.
-        set_fields[f"timestamps.{ts_field}"] = now
+        set_fields[f"timestamps.{ts_field}"] = {"$ifNull": [f"$timestamps.{ts_field}", now]}
 
-    # Also update allowed_next for convenience (optional)
-    set_fields["workflow.allowed_next"] = ALLOWED_TRANSITIONS.get(next_status, [])
+    return [{"$set": set_fields}]
 
-    return {"$set": set_fields}
+
+def transition_fields(doc: Dict[str, Any], next_status: str, now: datetime) -> Dict[str, Any]:
+    """The values build_transition_pipeline(next_status, now) sets on doc, as a literal $set."""
+    ts = doc.get("timestamps") or {}
+    fields: Dict[str, Any] = {
+        "workflow.previous_state": doc.get("status") if doc.get("status") is not None else "new",
+        "status": next_status,
+        "workflow.current_state": next_status,
+        "workflow.allowed_next": list(ALLOWED_TRANSITIONS.get(next_status, [])),
+        "timestamps.updated_at": now,
+        "updated_at": now,
+    }
+    ts_field = STATUS_TIMESTAMP_FIELD.get(next_status)
+    if ts_field:
+        fields[f"timestamps.{ts_field}"] = ts.get(ts_field) if ts.get(ts_field) is not None else now
+    return fields
@@ -0,0 +1,85 @@
+import dataclasses
+import functools
+import inspect
+from decimal import Decimal
+from typing import Any, Callable
+
+import orjson
+from bson import Decimal128, ObjectId
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def bson_default(obj: Any) -> Any:
+    """orjson fallback for BSON types (datetime/date are native to orjson)."""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        return str(obj.to_decimal())
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode("utf-8", errors="replace")
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=bson_default, option=_ORJSON_OPTIONS)
+
+
+class MongoJSONResponse(JSONResponse):
+    """
+    JSON response that serializes raw Mongo documents directly: ObjectId
+    (at any depth) becomes its hex string, datetimes use ISO 8601 like
+    datetime.isoformat().
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class MongoJSONRoute(APIRoute):
+    """
+    Route class for routers returning Mongo documents. Endpoints without a
+    response_model have their return value wrapped in MongoJSONResponse
+    directly, so FastAPI skips the recursive jsonable_encoder pass (which
+    cannot encode ObjectId). Routes with a response_model keep the normal
+    validate + serialize path.
+    """
+
+    def get_route_handler(self) -> Callable:
+        if self.response_field is not None:
+            return super().get_route_handler()
+
+        dependant = self.dependant
+        self.dependant = dataclasses.replace(dependant, call=self._wrap_endpoint(dependant.call))
+        try:
+            return super().get_route_handler()
+        finally:
+            self.dependant = dependant
+
+    def _wrap_endpoint(self, call: Callable) -> Callable:
+        status_code = self.status_code or 200
+        is_async = inspect.iscoroutinefunction(call)
+
+        @functools.wraps(call)
+        async def endpoint(*args: Any, **kwargs: Any) -> Any:
+            if is_async:
+                result = await call(*args, **kwargs)
+            else:
+                result = await run_in_threadpool(call, *args, **kwargs)
+            if isinstance(result, Response):
+                return result
+            return MongoJSONResponse(result, status_code=status_code)
+
+        return endpoint
@@ -0,0 +1,26 @@
+import copy
+from typing import Any, Dict
+
+
+def get_path(doc: Dict[str, Any], path: str) -> Any:
+    """Value at a dotted path (None when any part is missing)."""
+    cur: Any = doc
+    for part in path.split("."):
+        if not isinstance(cur, dict):
+            return None
+        cur = cur.get(part)
+    return cur
+
+
+def apply_set(doc: Dict[str, Any], fields: Dict[str, Any]) -> Dict[str, Any]:
+    """A copy of doc with {dotted path: value} set, like a literal $set."""
+    out = copy.deepcopy(doc)
+    for path, value in fields.items():
+        parts = path.split(".")
+        cur = out
+        for part in parts[:-1]:
+            if not isinstance(cur.get(part), dict):
+                cur[part] = {}
+            cur = cur[part]
+        cur[parts[-1]] = value
+    return out
@@ -1,5 +1,55 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+
 def get_pagination(page: int = 1, page_size: int = 10):
     page = max(page, 1)
     page_size = min(max(page_size, 1), 100)
     skip = (page - 1) * page_size
     return skip, page_size
+
+
+# -------------------------
+# keyset (cursor) pagination on (created_at, _id)
+# -------------------------
+def encode_cursor(doc: Dict[str, Any]) -> str:
+    """
+    Opaque cursor pointing just after doc in a (created_at desc, _id desc) ordering.
+    """
+    created_at = doc.get("created_at")
+    payload = {
+        "c": created_at.isoformat() if isinstance(created_at, datetime) else None,
+        "i": str(doc["_id"]),
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[Optional[datetime], ObjectId]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        created_at = datetime.fromisoformat(payload["c"]) if payload.get("c") else None
+        return created_at, ObjectId(payload["i"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_filter(token: str) -> Dict[str, Any]:
+    """
+    Mongo filter selecting documents strictly after the cursor in
+    (created_at desc, _id desc) order.
+    """
+    created_at, oid = decode_cursor(token)
+    if created_at is None:
+        return {"created_at": None, "_id": {"$lt": oid}}
+    return {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "_id": {"$lt": oid}},
+        {"created_at": None},  # legacy docs without created_at sort last
+    ]}
@@ -0,0 +1,92 @@
+# benchmarks/json_response.py
+"""
+Serialization time for a page of service_requests documents:
+  - before: str() every _id, FastAPI jsonable_encoder, starlette JSONResponse
+  - after:  MongoJSONResponse (orjson with a BSON default), raw documents
+
+    python -m benchmarks.json_response [--items 100] [--rounds 500]
+"""
+import argparse
+import copy
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.services.sla_service import build_sla_fields_from_request
+from app.utils.bson_json import MongoJSONResponse
+
+
+def make_request_doc(i: int) -> Dict[str, Any]:
+    created = datetime(2025, 1, 1) + timedelta(minutes=37 * i)
+    doc: Dict[str, Any] = {
+        "_id": ObjectId(),
+        "citizen_id": str(ObjectId()),
+        "category": ["pothole", "lighting", "waste", "water"][i % 4],
+        "priority": ["P1", "P2", "P3"][i % 3],
+        "description": f"Synthetic request {i} " + "x" * 120,
+        "status": "assigned",
+        "location": {"type": "Point", "coordinates": [35.2 + i * 1e-4, 31.9 + i * 1e-4], "zone_id": f"Z{i % 12}"},
+        "timestamps": {
+            "created_at": created,
+            "triaged_at": created + timedelta(hours=1),
+            "assigned_at": created + timedelta(hours=3),
+            "resolved_at": None,
+            "closed_at": None,
+            "updated_at": created + timedelta(hours=3),
+        },
+        "workflow": {"current_state": "assigned", "allowed_next": ["in_progress"], "transition_rules_version": "v1"},
+        "duplicates": {"is_master": True, "master_request_id": None, "linked_duplicates": [ObjectId(), ObjectId()]},
+        "assignment": {"assigned_agent_id": str(ObjectId()), "assigned_at": created + timedelta(hours=3), "method": "auto"},
+        "created_at": created,
+    }
+    sla = build_sla_fields_from_request(doc)
+    doc["sla_policy"] = sla["sla_policy"]
+    doc["sla_state"] = sla["computed_kpis"]["sla_state"]
+    doc["sla_computed"] = sla["computed_kpis"]
+    doc["request_id"] = str(doc["_id"])
+    return doc
+
+
+def render_before(items: List[Dict[str, Any]]) -> bytes:
+    # old repository loop + FastAPI's default path (nested ObjectIds pre-stringified,
+    # jsonable_encoder cannot handle them)
+    for r in items:
+        r["_id"] = str(r["_id"])
+        r["duplicates"]["linked_duplicates"] = [str(x) for x in r["duplicates"]["linked_duplicates"]]
+    return JSONResponse(jsonable_encoder({"items": items, "page": 1, "page_size": len(items)})).body
+
+
+def render_after(items: List[Dict[str, Any]]) -> bytes:
+    return MongoJSONResponse({"items": items, "page": 1, "page_size": len(items)}).body
+
+
+def bench(name: str, fn: Callable[[List[Dict[str, Any]]], bytes], page: List[Dict[str, Any]], rounds: int) -> float:
+    pages = [copy.deepcopy(page) for _ in range(rounds)]  # fn may mutate its input
+    size = 0
+    started = time.perf_counter()
+    for p in pages:
+        size = len(fn(p))
+    per_page_ms = (time.perf_counter() - started) * 1000 / rounds
+    print(f"{name:<8} {per_page_ms:8.3f} ms/page   {size} bytes")
+    return per_page_ms
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=500)
+    args = parser.parse_args()
+
+    page = [make_request_doc(i) for i in range(args.items)]
+    print(f"{args.items} items/page, {args.rounds} rounds")
+    before = bench("before", render_before, page, args.rounds)
+    after = bench("after", render_after, page, args.rounds)
+    print(f"speedup  {before / after:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+import asyncio
+
 from app.core.db import db
 from app.repositories.requests_repo import RequestsRepository
 from app.models.request_models import CreateServiceRequest
@@ -10,5 +12,5 @@ req = CreateServiceRequest(
     location={"type": "Point", "coordinates": [35.2, 31.9]}
 )
 
-result = repo.create_request(req)
+result = asyncio.run(repo.create_request(req))
 print(result)
@@ -0,0 +1,97 @@
+"""Min-cost matching for batch auto-assignment, against brute force on small instances."""
+import itertools
+import math
+import random
+
+import pytest
+
+from app.services.assignment_matching import (
+    CLASS_CELL_DEG,
+    COST_SCALE,
+    DISTANCE_WEIGHT_PER_KM,
+    LOAD_WEIGHT,
+    MatchTask,
+    agent_anchor,
+    haversine_km,
+    solve_assignment,
+)
+
+
+def _cell_center(position):
+    if position is None:
+        return None
+    return tuple((math.floor(v / CLASS_CELL_DEG) + 0.5) * CLASS_CELL_DEG for v in position)
+
+
+def _cost(plan, tasks, workloads, anchors):
+    """The solver's objective in its integer units (distance measured from the task's cell)."""
+    extra = {}
+    total = 0
+    for t in tasks:
+        agent = plan[t.key]
+        center, anchor = _cell_center(t.position), anchors.get(agent)
+        km = haversine_km(center, anchor) if center and anchor else 0.0
+        total += round(COST_SCALE * DISTANCE_WEIGHT_PER_KM * km)
+        total += round(COST_SCALE * LOAD_WEIGHT) * (workloads.get(agent, 0) + extra.get(agent, 0))
+        extra[agent] = extra.get(agent, 0) + 1
+    return total
+
+
+def _brute_force(tasks, workloads, anchors):
+    best = None
+    for choice in itertools.product(*(t.eligible for t in tasks)):
+        plan = {t.key: a for t, a in zip(tasks, choice)}
+        cost = _cost(plan, tasks, workloads, anchors)
+        best = cost if best is None else min(best, cost)
+    return best
+
+
+def test_spreads_load_evenly():
+    tasks = [MatchTask(i, None, ["a", "b", "c"]) for i in range(6)]
+    plan = solve_assignment(tasks, {"a": 0, "b": 0, "c": 3}, {})
+    per_agent = {}
+    for agent, km in plan.values():
+        assert km is None
+        per_agent[agent] = per_agent.get(agent, 0) + 1
+    # final loads a=3, b=3, c=3
+    assert per_agent == {"a": 3, "b": 3}
+
+
+def test_prefers_nearby_agent_and_reports_km():
+    anchors = {"near": (35.20, 31.90), "far": (35.60, 32.30)}
+    plan = solve_assignment([MatchTask("r", (35.201, 31.901), ["near", "far"])], {}, anchors)
+    agent, km = plan["r"]
+    assert agent == "near"
+    assert km == pytest.approx(haversine_km((35.201, 31.901), anchors["near"]))
+
+
+def test_skips_tasks_without_eligible_agents():
+    plan = solve_assignment([MatchTask("x", None, []), MatchTask("y", None, ["a"])], {}, {})
+    assert plan == {"y": ("a", None)}
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_matches_brute_force_optimum(seed):
+    rnd = random.Random(seed)
+    agents = ["a", "b", "c", "d"][: rnd.randint(2, 4)]
+    anchors = {a: (35.0 + rnd.random() * 0.3, 31.8 + rnd.random() * 0.3) for a in agents if rnd.random() < 0.8}
+    workloads = {a: rnd.randint(0, 4) for a in agents}
+    tasks = []
+    for i in range(rnd.randint(1, 6)):
+        eligible = rnd.sample(agents, rnd.randint(1, len(agents)))
+        position = (35.0 + rnd.random() * 0.3, 31.8 + rnd.random() * 0.3) if rnd.random() < 0.8 else None
+        tasks.append(MatchTask(i, position, eligible))
+
+    result = solve_assignment(tasks, workloads, anchors)
+    assert set(result) == {t.key for t in tasks}
+    for t in tasks:
+        assert result[t.key][0] in t.eligible
+    plan = {k: agent for k, (agent, _) in result.items()}
+    assert _cost(plan, tasks, workloads, anchors) == _brute_force(tasks, workloads, anchors)
+
+
+def test_agent_anchor_is_ring_centroid():
+    square = [[35.0, 31.0], [35.2, 31.0], [35.2, 31.2], [35.0, 31.2]]
+    assert agent_anchor({"coverage": {"geo_fence": {"type": "Polygon", "coordinates": [square]}}}) == pytest.approx((35.1, 31.1))
+    assert agent_anchor({"coverage": {"geo_fence": {"type": "MultiPolygon", "coordinates": [[square]]}}}) == pytest.approx((35.1, 31.1))
+    assert agent_anchor({"coverage": {}}) is None
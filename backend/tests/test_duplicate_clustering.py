@@ -0,0 +1,123 @@
+"""Greedy leader clustering of duplicate requests with geohash cells and LSH bands."""
+import math
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.duplicate_clustering import (
+    cluster_duplicates,
+    cluster_size_histogram,
+    geohash_cell,
+    geohash_cell_deg,
+    geohash_neighborhood,
+    geohash_precision_for,
+    haversine_m,
+)
+
+T0 = datetime(2026, 3, 1, 8, 0)
+POTHOLE = "Large pothole on Herzl street next to the bus stop, cars swerving around it"
+LIGHT = "Streetlight out on Jaffa road since last week, the whole block is dark"
+M_PER_DEG_LAT = 111_195.0
+
+
+def _doc(oid, text, lng, lat, minutes=0, category="roads"):
+    return {
+        "_id": oid,
+        "category": category,
+        "description": text,
+        "location": {"type": "Point", "coordinates": [lng, lat]},
+        "timestamps": {"created_at": T0 + timedelta(minutes=minutes)},
+    }
+
+
+def _cluster(docs, radius_m=100.0, window_days=7.0, min_similarity=0.6):
+    return cluster_duplicates(docs, radius_m, window_days, min_similarity)
+
+
+def test_near_duplicates_join_the_oldest_request():
+    docs = [
+        _doc(3, POTHOLE + "!", 35.2001, 31.9001, minutes=30),
+        _doc(1, POTHOLE, 35.2000, 31.9000, minutes=0),
+        _doc(2, POTHOLE.replace("Large", "Big"), 35.2002, 31.9000, minutes=10),
+        _doc(4, LIGHT, 35.2000, 31.9000, minutes=20),  # same place, other text
+    ]
+    assert _cluster(docs) == {1: [2, 3]}
+
+
+@pytest.mark.parametrize("other", [
+    _doc(2, POTHOLE, 35.2000, 31.9000 + 300 / M_PER_DEG_LAT, minutes=5),  # 300 m away
+    _doc(2, POTHOLE, 35.2000, 31.9000, minutes=8 * 24 * 60),  # outside the window
+    _doc(2, POTHOLE, 35.2000, 31.9000, minutes=5, category="lights"),
+    {"_id": 2, "category": "roads", "description": POTHOLE, "timestamps": {"created_at": T0}},  # no location
+])
+def test_not_duplicates(other):
+    assert _cluster([_doc(1, POTHOLE, 35.2000, 31.9000), other]) == {}
+
+
+def test_joins_the_most_similar_master():
+    drain = POTHOLE + " and the drain beside it is blocked"
+    docs = [
+        _doc(1, POTHOLE, 35.2000, 31.9000, minutes=0),
+        # too far from 1 at 0.6 (~0.53), so a master of its own
+        _doc(2, drain + " with leaves again", 35.2003, 31.9000, minutes=1),
+        # close enough to both (~0.70 and ~0.78); 2 is the closer match
+        _doc(3, drain, 35.2001, 31.9000, minutes=2),
+    ]
+    assert _cluster(docs) == {2: [3]}
+
+
+def test_pairs_across_a_cell_boundary():
+    precision = geohash_precision_for(100.0, 31.9)
+    dlat, _ = geohash_cell_deg(precision)
+    edge = math.floor((31.9 + 90) / dlat) * dlat - 90  # a cell boundary near 31.9
+    a = _doc(1, POTHOLE, 35.2, edge - 20 / M_PER_DEG_LAT)
+    b = _doc(2, POTHOLE, 35.2, edge + 20 / M_PER_DEG_LAT, minutes=1)
+    assert geohash_cell(edge - 20 / M_PER_DEG_LAT, 35.2, precision) != geohash_cell(edge + 20 / M_PER_DEG_LAT, 35.2, precision)
+    assert _cluster([a, b]) == {1: [2]}
+
+
+def test_deterministic_for_any_input_order():
+    rnd = random.Random(5)
+    docs = []
+    for i in range(60):
+        text = (POTHOLE, LIGHT)[i % 2] + (" please" * rnd.randint(0, 2))
+        docs.append(_doc(i, text, 35.2 + rnd.random() * 0.002, 31.9 + rnd.random() * 0.002, minutes=rnd.randint(0, 600)))
+    expected = _cluster(docs)
+    assert expected
+    rnd.shuffle(docs)
+    assert _cluster(docs) == expected
+    by_id = {d["_id"]: d for d in docs}
+    for master, dups in expected.items():
+        for dup in dups:
+            assert by_id[master]["timestamps"]["created_at"] <= by_id[dup]["timestamps"]["created_at"]
+
+
+def test_histogram():
+    assert cluster_size_histogram({1: [2, 3], 4: [5], 6: [7]}) == {2: 2, 3: 1}
+    assert cluster_size_histogram({}) == {}
+
+
+@pytest.mark.parametrize("radius_m,lat", [(50, 0), (100, 31.9), (500, 60), (5000, 10)])
+def test_precision_cells_cover_the_radius(radius_m, lat):
+    precision = geohash_precision_for(radius_m, lat)
+    dlat, dlng = geohash_cell_deg(precision)
+    assert dlat * M_PER_DEG_LAT >= radius_m * 0.999
+    assert dlng * M_PER_DEG_LAT * math.cos(math.radians(lat)) >= radius_m * 0.999
+    if precision < 9:  # the next precision would be too fine
+        finer_lat, finer_lng = geohash_cell_deg(precision + 1)
+        assert min(finer_lat * M_PER_DEG_LAT, finer_lng * M_PER_DEG_LAT * math.cos(math.radians(lat))) < radius_m
+
+
+def test_neighborhood_wraps_longitude():
+    precision = 3
+    cell = geohash_cell(0.0, 179.99, precision)
+    cols = round(360.0 / geohash_cell_deg(precision)[1])
+    assert cell[1] == cols - 1
+    assert (cell[0], 0) in geohash_neighborhood(cell, precision)
+    assert len(geohash_neighborhood(geohash_cell(89.99, 0.0, precision), precision)) == 6  # pole row
+
+
+def test_haversine():
+    assert haversine_m((35.2, 31.9), (35.2, 31.9)) == 0
+    assert haversine_m((0, 0), (0, 1)) == pytest.approx(111_195, rel=1e-3)
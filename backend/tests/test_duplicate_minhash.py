@@ -0,0 +1,61 @@
+"""MinHash signatures for near-duplicate request descriptions."""
+import pytest
+
+from app.services.duplicate_service import (
+    MINHASH_PERMUTATIONS,
+    MINHASH_VERSION,
+    build_dedup_fields,
+    minhash_signature,
+    shingles,
+    signature_similarity,
+    stored_signature,
+)
+
+TEXT = "Large pothole on Herzl street next to the bus stop, cars swerving around it"
+
+
+def _jaccard(a: str, b: str) -> float:
+    sa, sb = shingles(a), shingles(b)
+    return len(sa & sb) / len(sa | sb)
+
+
+def test_signature_shape_and_determinism():
+    sig = minhash_signature(TEXT)
+    assert len(sig) == MINHASH_PERMUTATIONS
+    assert sig == minhash_signature(TEXT)
+    assert all(isinstance(v, int) for v in sig)
+
+
+def test_normalisation():
+    assert minhash_signature("  POTHOLE!!  on   herzl st. ") == minhash_signature("pothole on herzl st")
+    assert shingles("abc") == {"abc"}
+    assert minhash_signature("") is None
+    assert minhash_signature("?!") is None
+
+
+@pytest.mark.parametrize("other", [
+    "Large pothole on Herzl street near the bus stop, cars swerving around it",
+    "Huge pothole on Herzl street next to the bus stop",
+    "Streetlight out on Jaffa road since last week",
+])
+def test_similarity_estimates_jaccard(other):
+    estimate = signature_similarity(minhash_signature(TEXT), minhash_signature(other))
+    # 64 permutations: standard error <= 0.0625
+    assert estimate == pytest.approx(_jaccard(TEXT, other), abs=0.2)
+
+
+def test_similarity_edge_cases():
+    sig = minhash_signature(TEXT)
+    assert signature_similarity(sig, sig) == 1.0
+    assert signature_similarity(sig, None) == 0.0
+    assert signature_similarity(sig, sig[:10]) == 0.0
+
+
+def test_stored_signature_recomputed_for_other_versions():
+    doc = {"description": TEXT, "dedup": build_dedup_fields(TEXT)}
+    assert doc["dedup"]["v"] == MINHASH_VERSION
+    assert stored_signature(doc) is doc["dedup"]["minhash"]
+
+    stale = {"description": TEXT, "dedup": {"v": MINHASH_VERSION - 1, "minhash": [0] * MINHASH_PERMUTATIONS}}
+    assert stored_signature(stale) == minhash_signature(TEXT)
+    assert stored_signature({"description": TEXT}) == minhash_signature(TEXT)
@@ -0,0 +1,162 @@
+"""BatchedEventSink: grouped seq reservation, requeue on failure, bulk retries and drain."""
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Set
+
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from app.repositories.performance_logs_repo import EVENTS_PER_BUCKET, PerformanceLogsRepository
+from app.services.event_log_sink import BatchedEventSink
+
+
+class _Buckets:
+    def __init__(self):
+        self.calls: List[list] = []
+        self.fail_next: List[Exception] = []
+
+    async def bulk_write(self, ops, ordered=True):
+        self.calls.append(list(ops))
+        if self.fail_next:
+            raise self.fail_next.pop(0)
+
+
+class _Repo:
+    """reserve_seqs over an in-memory counter; bucket writes are recorded."""
+
+    build_bucket_updates = staticmethod(PerformanceLogsRepository.build_bucket_updates)
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+        self.failing: Set[str] = set()
+        self.reservations: List[tuple] = []
+        self.buckets = _Buckets()
+
+    async def reserve_seqs(self, request_id, count, at=None, computed_kpis=None):
+        if request_id in self.failing:
+            raise AutoReconnect("header write failed")
+        first = self.counts.get(request_id, 0)
+        self.counts[request_id] = first + count
+        self.reservations.append((request_id, count, computed_kpis))
+        return first
+
+
+def _evt(n: int) -> dict:
+    return PerformanceLogsRepository.build_event(f"e{n}", "system", "test", at=datetime(2026, 3, 1, 0, n))
+
+
+def _pushed(ops) -> Dict[str, List[str]]:
+    """request_id -> event types in seq order, from recorded UpdateOne ops."""
+    out: Dict[str, list] = {}
+    for op in ops:
+        f, u = op._filter, op._doc
+        out.setdefault(f["request_id"], []).extend(u["$push"]["events"]["$each"])
+    return {rid: [e["type"] for e in sorted(evts, key=lambda e: e["seq"])] for rid, evts in out.items()}
+
+
+def _sink(repo, batch_size=100, max_queue=1000) -> BatchedEventSink:
+    return BatchedEventSink(repo, batch_size=batch_size, flush_interval_s=60, max_queue=max_queue)
+
+
+def test_flush_reserves_once_per_request_and_writes_one_bulk():
+    async def run():
+        repo = _Repo()
+        sink = _sink(repo)
+        for n, rid in enumerate(["a", "b", "a", "a", "b"]):
+            await sink.enqueue(rid, _evt(n), computed_kpis={"n": n} if rid == "a" else None)
+        assert await sink.flush() == 5
+        return repo, sink
+
+    repo, sink = asyncio.run(run())
+    assert sorted(repo.reservations) == [("a", 3, {"n": 3}), ("b", 2, None)]  # latest KPI snapshot wins
+    assert len(repo.buckets.calls) == 1
+    assert _pushed(repo.buckets.calls[0]) == {"a": ["e0", "e2", "e3"], "b": ["e1", "e4"]}
+    assert sink.stats()["queued"] == 0
+
+
+def test_bucket_boundary_splits_ops():
+    async def run():
+        repo = _Repo()
+        repo.counts["a"] = EVENTS_PER_BUCKET - 1
+        sink = _sink(repo)
+        await sink.enqueue("a", _evt(0))
+        await sink.enqueue("a", _evt(1))
+        await sink.flush()
+        return repo
+
+    ops = asyncio.run(run()).buckets.calls[0]
+    assert [op._filter["bucket"] for op in ops] == [0, 1]
+
+
+def test_failed_reservation_is_requeued_in_order():
+    async def run():
+        repo = _Repo()
+        repo.failing.add("a")
+        sink = _sink(repo)
+        for n, rid in enumerate(["a", "b", "a"]):
+            await sink.enqueue(rid, _evt(n))
+        assert await sink.flush() == 1
+        assert sink.stats()["queued"] == 2
+        await sink.enqueue("a", _evt(3))
+        repo.failing.clear()
+        assert await sink.flush() == 3
+        return repo, sink
+
+    repo, sink = asyncio.run(run())
+    assert _pushed(repo.buckets.calls[-1]) == {"a": ["e0", "e2", "e3"]}
+    assert sink.failures == 1
+
+
+def test_bulk_write_errors_retry_failed_ops_with_their_seqs():
+    async def run():
+        repo = _Repo()
+        sink = _sink(repo)
+        for n, rid in enumerate(["a", "b", "c"]):
+            await sink.enqueue(rid, _evt(n))
+        repo.buckets.fail_next.append(BulkWriteError({"writeErrors": [{"index": 1, "code": 11000}]}))
+        await sink.flush()
+        assert sink.stats()["pending_retry_ops"] == 1
+        failed = repo.buckets.calls[0][1]
+
+        repo.buckets.fail_next.append(AutoReconnect("primary stepped down"))
+        await sink.flush()  # nothing new queued: the retry op alone, failing again
+        assert repo.buckets.calls[1] == [failed]
+        assert sink.stats()["pending_retry_ops"] == 1
+
+        await sink.enqueue("d", _evt(3))
+        await sink.flush()
+        return repo, sink, failed
+
+    repo, sink, failed = asyncio.run(run())
+    last = repo.buckets.calls[-1]
+    assert last[0] is failed  # retried first, same seqs, no new reservation
+    assert [r[0] for r in repo.reservations] == ["a", "b", "c", "d"]
+    assert sink.stats()["pending_retry_ops"] == 0
+    assert sink.failures == 2
+
+
+def test_full_queue_flushes_inline():
+    async def run():
+        repo = _Repo()
+        sink = _sink(repo, batch_size=2, max_queue=3)
+        for n in range(4):
+            await sink.enqueue("a", _evt(n))
+        return repo, sink
+
+    repo, sink = asyncio.run(run())
+    assert len(repo.buckets.calls) == 1 and sink.flushed == 3
+    assert sink.stats()["queued"] == 1
+
+
+def test_stop_drains_queue_and_retries():
+    async def run():
+        repo = _Repo()
+        sink = _sink(repo)
+        sink.start()
+        await sink.enqueue("a", _evt(0))
+        repo.buckets.fail_next.append(AutoReconnect("transient"))
+        await sink.stop()
+        return repo, sink
+
+    repo, sink = asyncio.run(run())
+    assert sink.stats() == {"queued": 0, "pending_retry_ops": 0, "flushed": 1, "failures": 1}
+    assert len(repo.buckets.calls) == 2
@@ -0,0 +1,111 @@
+"""HeatmapTileCache: LRU order, TTL expiry, point invalidation and in-flight generations."""
+import asyncio
+
+import pytest
+
+from app.services import heatmap_tile_cache as tile_cache_module
+from app.services.heatmap_tile_cache import CELLS_PER_TILE, HeatmapTileCache, tile_of
+
+ZOOM = 12
+STATUSES = ("new",)
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = _Clock()
+    monkeypatch.setattr(tile_cache_module.time, "monotonic", c)
+    return c
+
+
+def _key(x: int, y: int, statuses=STATUSES):
+    return (ZOOM, x, y, statuses)
+
+
+def test_lru_evicts_least_recently_used(clock):
+    cache = HeatmapTileCache(max_tiles=2, ttl_seconds=60)
+    cache.put(_key(0, 0), [(0, 0, 1.0)])
+    cache.put(_key(1, 0), [(16, 0, 1.0)])
+    assert cache.get(_key(0, 0)) is not None  # (0, 0) is now the most recent
+    cache.put(_key(2, 0), [])
+    assert cache.get(_key(1, 0)) is None
+    assert cache.get(_key(0, 0)) is not None
+    assert cache.get(_key(2, 0)) == []  # empty tiles are cached too
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = HeatmapTileCache(max_tiles=10, ttl_seconds=30)
+    cache.put(_key(0, 0), [(0, 0, 1.0)])
+    clock.now += 29
+    assert cache.get(_key(0, 0)) is not None
+    clock.now += 2
+    assert cache.get(_key(0, 0)) is None
+    assert cache.stats()["tiles"] == 0
+
+
+def test_disabled_cache_stores_nothing(clock):
+    cache = HeatmapTileCache(max_tiles=0, ttl_seconds=30)
+    cache.put(_key(0, 0), [])
+    assert cache.get(_key(0, 0)) is None
+
+
+def test_invalidate_point_drops_every_status_variant_of_its_tile(clock):
+    cache = HeatmapTileCache(max_tiles=10, ttl_seconds=60)
+    lng, lat = 35.2, 31.9
+    x, y = tile_of(ZOOM, lng, lat)
+    cache.put(_key(x, y), [])
+    cache.put(_key(x, y, ("assigned", "new")), [])
+    cache.put(_key(x + 1, y), [])
+    cache.put((ZOOM - 1, *tile_of(ZOOM - 1, lng, lat), STATUSES), [])
+
+    cache.invalidate_request({"location": {"coordinates": [lng, lat]}})
+    assert cache.get(_key(x, y)) is None
+    assert cache.get(_key(x, y, ("assigned", "new"))) is None
+    assert cache.get((ZOOM - 1, *tile_of(ZOOM - 1, lng, lat), STATUSES)) is None
+    assert cache.get(_key(x + 1, y)) is not None
+    cache.invalidate_point(None)  # requests without a location are ignored
+
+
+def _run_heatmap(cache, monkeypatch, during=None):
+    lng, lat = 35.2, 31.9
+    x, y = tile_of(ZOOM, lng, lat)
+    calls = []
+
+    async def aggregate_cells(col, cell_deg, statuses, bbox=None, cell_window=None):
+        calls.append(cell_window)
+        if during is not None:
+            during(lng, lat)
+        return [(x * CELLS_PER_TILE + 3, y * CELLS_PER_TILE + 4, 2.0)]
+
+    monkeypatch.setattr(tile_cache_module, "aggregate_cells", aggregate_cells)
+    size = 360.0 / 2 ** ZOOM
+    bbox = (x * size + size / 4, y * size + size / 4, x * size + size / 2, y * size + size / 2)
+    points = asyncio.run(cache.heatmap(None, ZOOM, list(STATUSES), bbox))
+    return points, calls, (x, y)
+
+
+def test_heatmap_reads_through_and_caches(clock, monkeypatch):
+    cache = HeatmapTileCache(max_tiles=10, ttl_seconds=60)
+    points, calls, (x, y) = _run_heatmap(cache, monkeypatch)
+    assert len(points) == 1 and points[0][2] == 2.0
+    assert len(calls) == 1
+    assert cache.get(_key(x, y)) is not None
+
+    again, calls, _ = _run_heatmap(cache, monkeypatch)
+    assert again == points and calls == []
+
+
+def test_tile_invalidated_during_aggregation_is_not_cached(clock, monkeypatch):
+    cache = HeatmapTileCache(max_tiles=10, ttl_seconds=60)
+    points, _, (x, y) = _run_heatmap(cache, monkeypatch, during=lambda lng, lat: cache.invalidate_point([lng, lat]))
+    assert len(points) == 1  # the caller still gets its result
+    assert cache.get(_key(x, y)) is None
+    assert not cache._inflight
@@ -0,0 +1,81 @@
+"""Login rate limiting: the sliding window, the per-email/IP limiter and client_ip behind proxies."""
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.core import rate_limit
+from app.core.rate_limit import LoginRateLimiter, SlidingWindowLimiter, client_ip
+
+
+def test_sliding_window():
+    limiter = SlidingWindowLimiter(limit=2, window_seconds=10)
+    limiter.hit("k", now=0)
+    assert limiter.retry_after("k", now=1) == 0
+    limiter.hit("k", now=4)
+    assert limiter.retry_after("k", now=5) == pytest.approx(5)  # the hit at 0 leaves the window at 10
+    assert limiter.retry_after("k", now=10) == 0
+    assert limiter.retry_after("other", now=5) == 0
+    limiter.reset("k")
+    assert limiter.retry_after("k", now=5) == 0
+
+
+def test_sliding_window_caps_keys():
+    limiter = SlidingWindowLimiter(limit=1, window_seconds=10, max_keys=2)
+    for i, key in enumerate(("a", "b", "c")):
+        limiter.hit(key, now=i)
+    assert list(limiter._hits) == ["b", "c"]  # least recently hit key dropped
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_login_limiter_per_email_and_ip(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    limiter = LoginRateLimiter(window_seconds=60, max_per_email=2, max_per_ip=3)
+
+    limiter.check("Staff@Example.com", "10.0.0.1")
+    limiter.check("staff@example.com ", "10.0.0.2")  # emails are normalised
+    with pytest.raises(HTTPException) as exc:
+        limiter.check("staff@example.com", "10.0.0.3")
+    assert exc.value.status_code == 429
+    assert exc.value.headers["Retry-After"] == "60"
+
+    limiter.succeeded("staff@example.com")
+    limiter.check("staff@example.com", "10.0.0.1")
+    limiter.check("other@example.com", "10.0.0.1")
+    with pytest.raises(HTTPException):
+        limiter.check("third@example.com", "10.0.0.1")  # the IP's 3 attempts are spent
+
+    clock.now += 61
+    limiter.check("third@example.com", "10.0.0.1")
+
+
+def test_login_limiter_without_ip_limit():
+    limiter = LoginRateLimiter(window_seconds=60, max_per_email=100, max_per_ip=0)
+    for i in range(50):
+        limiter.check(f"user{i}@example.com", "10.0.0.1")
+    assert limiter.stats()["ips"] is None
+
+
+def _request(peer: str, forwarded: str = None) -> Request:
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded is not None else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 5000)})
+
+
+@pytest.mark.parametrize("hops,forwarded,expected", [
+    (0, "1.1.1.1", "10.0.0.9"),  # no trusted proxies: the header is ignored
+    (1, None, "10.0.0.9"),  # did not come through the proxy
+    (1, "1.1.1.1", "1.1.1.1"),
+    (1, "6.6.6.6, 1.1.1.1", "1.1.1.1"),  # spoofed left-hand entries are skipped
+    (2, "6.6.6.6, 1.1.1.1, 172.16.0.2", "1.1.1.1"),
+    (2, "1.1.1.1", "10.0.0.9"),
+    (1, " , 1.1.1.1 ", "1.1.1.1"),
+])
+def test_client_ip(hops, forwarded, expected):
+    assert client_ip(_request("10.0.0.9", forwarded), hops) == expected
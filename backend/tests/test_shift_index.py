@@ -0,0 +1,78 @@
+"""ShiftBitmap minute-of-week bits and the ShiftIndex per-agent cache."""
+from datetime import datetime, timezone
+
+from app.services.assignment_service import ShiftBitmap, ShiftIndex
+
+UTC_WEEKDAY = {"timezone": "UTC", "shifts": [{"day": "Mon", "start": "08:00", "end": "16:00"}]}
+
+
+def _at(day: int, hh: int, mm: int = 0) -> datetime:
+    # 2026-03-02 is a Monday
+    return datetime(2026, 3, 2 + day, hh, mm, tzinfo=timezone.utc)
+
+
+def test_bitmap_shift_bounds():
+    bm = ShiftBitmap.from_schedule(UTC_WEEKDAY)
+    assert not bm.on_shift(_at(0, 7, 59))
+    assert bm.on_shift(_at(0, 8))
+    assert bm.on_shift(_at(0, 15, 59))
+    assert not bm.on_shift(_at(0, 16))  # end is exclusive
+    assert not bm.on_shift(_at(1, 9))
+
+
+def test_bitmap_overnight_wraps_into_monday():
+    bm = ShiftBitmap.from_schedule({"timezone": "UTC", "shifts": [{"day": "sunday", "start": "22:00", "end": "06:00"}]})
+    assert bm.on_shift(_at(6, 23))
+    assert bm.on_shift(_at(0, 5, 59))  # Sunday night runs into Monday morning
+    assert not bm.on_shift(_at(0, 6))
+    assert not bm.on_shift(_at(6, 21, 59))
+
+
+def test_bitmap_local_timezone():
+    bm = ShiftBitmap.from_schedule({"timezone": "Asia/Jerusalem", "shifts": [{"day": "Mon", "start": "08:00", "end": "09:00"}]})
+    # 08:30 in Jerusalem (UTC+2 in early March) is 06:30 UTC
+    assert bm.on_shift(_at(0, 6, 30))
+    assert not bm.on_shift(_at(0, 8, 30))
+
+
+def test_bitmap_always_available():
+    assert ShiftBitmap.from_schedule(None).always  # legacy agents without shifts
+    assert ShiftBitmap.from_schedule({**UTC_WEEKDAY, "on_call": True}).on_shift(_at(3, 3))
+
+
+def test_bitmap_skips_malformed_shifts():
+    bm = ShiftBitmap.from_schedule({"timezone": "UTC", "shifts": [
+        {"day": "Funday", "start": "08:00", "end": "09:00"},
+        {"day": "Tue", "start": "25:00", "end": "26:00"},
+        {"day": "Tue", "start": "10:00", "end": "11:00"},
+    ]})
+    assert not bm.always
+    assert bm.on_shift(_at(1, 10, 30))
+    assert not bm.on_shift(_at(1, 8, 30))
+
+
+def test_index_rebuilds_on_schedule_version():
+    index = ShiftIndex()
+    agent = {"_id": "a1", "schedule": UTC_WEEKDAY}
+    first = index.bitmap(agent)
+    assert index.bitmap(dict(agent)) is first
+    assert index.builds == 1
+
+    moved = {"timezone": "UTC", "shifts": [{"day": "Tue", "start": "08:00", "end": "16:00"}]}
+    second = index.bitmap({"_id": "a1", "schedule": moved, "schedule_version": 1})
+    assert second is not first and index.builds == 2
+    assert second.on_shift(_at(1, 9)) and not second.on_shift(_at(0, 9))
+
+
+def test_index_invalidate_and_retain():
+    index = ShiftIndex()
+    agents = [{"_id": f"a{i}", "schedule": UTC_WEEKDAY} for i in range(3)]
+    bitmaps = [index.bitmap(a) for a in agents]
+
+    index.invalidate("a0")
+    assert index.bitmap(agents[0]) is not bitmaps[0]
+
+    index.retain({"a1"})
+    assert index.bitmap(agents[1]) is bitmaps[1]
+    assert index.bitmap(agents[2]) is not bitmaps[2]  # pruned, rebuilt on demand
+    assert index.builds == 5
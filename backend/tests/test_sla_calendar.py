@@ -0,0 +1,84 @@
+"""Business-hours SLA clock: calendar compilation, hours_between and add_hours."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.sla_calendar import BusinessCalendar, compile_calendar
+
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri")
+LONDON = compile_calendar({
+    "timezone": "Europe/London",
+    "hours": [{"day": d, "start": "09:00", "end": "17:00"} for d in WEEKDAYS],
+})
+
+
+def _calendar(cal=LONDON) -> BusinessCalendar:
+    return BusinessCalendar.from_policy(cal)
+
+
+def test_compile_calendar_minutes():
+    assert LONDON["start_min"] == [540] * 5 + [0, 0]
+    assert LONDON["open_min"] == [480] * 5 + [0, 0]
+    assert compile_calendar({"hours": [{"day": "sun", "start": "00:00", "end": "24:00"}]})["timezone"] == "UTC"
+
+
+@pytest.mark.parametrize("calendar", [
+    {"timezone": "Mars/Olympus", "hours": [{"day": "Mon", "start": "09:00", "end": "17:00"}]},
+    {"hours": [{"day": "Mon", "start": "17:00", "end": "09:00"}]},
+    {"hours": [{"day": "Mon", "start": "09:00", "end": "12:00"}, {"day": "monday", "start": "13:00", "end": "17:00"}]},
+    {"hours": [{"day": "Someday", "start": "09:00", "end": "17:00"}]},
+    {"hours": []},
+])
+def test_compile_calendar_rejects(calendar):
+    with pytest.raises(ValueError):
+        compile_calendar(calendar)
+
+
+def test_from_policy_without_calendar():
+    assert BusinessCalendar.from_policy(None) is None
+    assert BusinessCalendar.from_policy({"timezone": "UTC"}) is None
+
+
+@pytest.mark.parametrize("start,end,hours", [
+    # winter: London is UTC+0
+    (datetime(2026, 3, 2, 9), datetime(2026, 3, 2, 17), 8.0),
+    (datetime(2026, 3, 2, 6), datetime(2026, 3, 2, 10, 30), 1.5),  # before opening counts from 09:00
+    (datetime(2026, 3, 2, 16), datetime(2026, 3, 3, 10), 2.0),  # overnight is closed
+    (datetime(2026, 3, 6, 16), datetime(2026, 3, 9, 10), 2.0),  # so is the weekend
+    (datetime(2026, 3, 2, 9), datetime(2026, 3, 9, 9), 40.0),
+    # the week the clocks go forward (Sun 29 March): still 40 local business hours
+    (datetime(2026, 3, 27, 9), datetime(2026, 4, 3, 8), 40.0),
+    (datetime(2026, 3, 30, 8), datetime(2026, 3, 30, 9), 1.0),  # 09:00-10:00 BST
+    (datetime(2026, 3, 7, 10), datetime(2026, 3, 7, 12), 0.0),  # Saturday
+])
+def test_hours_between(start, end, hours):
+    assert _calendar().hours_between(start, end) == pytest.approx(hours)
+
+
+def test_add_hours_inverts_hours_between():
+    cal = _calendar()
+    start = datetime(2026, 3, 5, 15, 20)
+    for hours in (0.5, 1.6666, 8, 13, 40, 41.25, 200):
+        end = cal.add_hours(start, hours)
+        assert cal.hours_between(start, end) == pytest.approx(hours, abs=1e-6)
+        # the first such instant: a minute earlier is short of it
+        assert cal.hours_between(start, end - timedelta(minutes=1)) < hours
+
+
+def test_add_hours_lands_in_open_hours():
+    cal = _calendar()
+    # 2h left at Friday 16:00 -> 1h Friday, 1h Monday: 10:00 local = 10:00 UTC
+    assert cal.add_hours(datetime(2026, 3, 6, 16), 2) == datetime(2026, 3, 9, 10)
+    # after the clocks change: 10:00 BST = 09:00 UTC
+    assert cal.add_hours(datetime(2026, 3, 27, 16), 2) == datetime(2026, 3, 30, 9)
+
+
+def test_minutes_at_is_monotonic():
+    cal = _calendar()
+    t = datetime(2026, 3, 25)
+    last = cal.minutes_at(t)
+    for _ in range(24 * 14):
+        t += timedelta(minutes=37)
+        now = cal.minutes_at(t)
+        assert now >= last
+        last = now
@@ -0,0 +1,196 @@
+"""
+Parity between the SLA pipeline stages (build_sla_update_stages) and their
+Python counterparts (select_sla_policy / CompiledSlaPolicies.resolve,
+compute_sla_state, next_sla_check_at, and apply_sla_update, which derives
+the post-image of a BEFORE-image write). The stages are evaluated on a real
+mongod: mongomock does not implement the operators they use ($type, $switch,
+$dateDiff, ...).
+
+    MONGO_TEST_URI=mongodb://localhost:27017 python -m pytest -q tests
+"""
+import copy
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+import pytest
+from bson import ObjectId
+from pymongo import MongoClient
+
+from app.services.sla_calendar import compile_calendar
+from app.services.sla_policy_cache import CompiledSlaPolicies
+from app.services.sla_service import (
+    DEFAULT_SLA_HOURS,
+    apply_sla_update,
+    build_sla_update_stages,
+    compute_sla_state,
+    next_sla_check_at,
+    select_sla_policy,
+)
+
+MONGO_TEST_URI = os.getenv("MONGO_TEST_URI")
+
+pytestmark = pytest.mark.skipif(not MONGO_TEST_URI, reason="MONGO_TEST_URI not set (needs a real mongod)")
+
+NOW = datetime(2026, 3, 4, 12, 0)  # a Wednesday
+
+CALENDAR = compile_calendar({
+    "timezone": "Asia/Jerusalem",
+    "hours": [{"day": d, "start": "08:00", "end": "17:00"} for d in ("Sun", "Mon", "Tue", "Wed", "Thu")],
+})
+
+POLICY_DOCS = [
+    {"policy_id": "ROADS-P1", "category": "roads", "priority": "P1", "target_hours": 24},
+    {
+        "policy_id": "LIGHTS-BUSINESS", "category": "lights", "target_hours": 18, "breach_threshold_hours": 27,
+        "escalation_steps": [{"after_hours": 9, "action": "notify_dispatcher"}, {"after_hours": 27, "action": "notify_manager"}],
+        "calendar": CALENDAR,
+    },
+    {"policy_id": "Z1", "zone_id": "Z1", "target_hours": 10},
+]
+
+# elapsed time as a share of the target: either side of every boundary
+RATIOS = (0.1, 0.79, 0.8, 0.95, 1.0, 1.1, 1.24, 1.25, 1.3, 3.0)
+
+
+@pytest.fixture(scope="module")
+def col():
+    client = MongoClient(MONGO_TEST_URI)
+    c = client["sla_parity_test"][f"requests_{ObjectId()}"]
+    yield c
+    c.drop()
+    client.close()
+
+
+def _apply(col, doc: Dict[str, Any], policies=None, reresolve: bool = False) -> Dict[str, Any]:
+    """Run the stages on doc in mongod; also check apply_sla_update derives the same fields."""
+    col.insert_one(doc)
+    col.update_one({"_id": doc["_id"]}, build_sla_update_stages(NOW, policies=policies, reresolve=reresolve))
+    stored = col.find_one({"_id": doc["_id"]})
+
+    mirrored = apply_sla_update(copy.deepcopy(doc), NOW, policies, reresolve)
+    assert stored["sla_policy"] == mirrored["sla_policy"]
+    assert stored["sla_state"] == mirrored["sla_state"]
+    computed, expected = dict(stored["sla_computed"]), dict(mirrored["sla_computed"])
+    assert computed.pop("elapsed_hours") == pytest.approx(expected.pop("elapsed_hours"), abs=0.011)
+    assert computed == expected
+    if mirrored.get("sla_next_check_at") is None:
+        assert stored.get("sla_next_check_at") is None
+    else:
+        assert abs(stored["sla_next_check_at"] - mirrored["sla_next_check_at"]) <= timedelta(milliseconds=1)
+    return stored
+
+
+def _request(
+    category: str,
+    priority: str,
+    created_at: datetime,
+    status: str = "new",
+    resolved_at: Optional[datetime] = None,
+    zone_id: Optional[str] = None,
+    level: int = 0,
+    sla_policy: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    doc: Dict[str, Any] = {
+        "_id": ObjectId(),
+        "category": category,
+        "priority": priority,
+        "status": status,
+        "location": {"type": "Point", "coordinates": [35.2, 31.9], "zone_id": zone_id},
+        "timestamps": {"created_at": created_at, "resolved_at": resolved_at},
+        "sla_escalation_level": level,
+    }
+    if sla_policy is not None:
+        doc["sla_policy"] = sla_policy
+    return doc
+
+
+def _assert_parity(stored: Dict[str, Any], policy: Dict[str, Any], exact_next_check: bool = True) -> None:
+    ts = stored["timestamps"]
+    expected = compute_sla_state(
+        created_at=ts["created_at"],
+        triaged_at=None,
+        assigned_at=None,
+        resolved_at=ts.get("resolved_at"),
+        target_hours=policy["target_hours"],
+        breach_threshold_hours=policy["breach_threshold_hours"],
+        now=NOW,
+        calendar=policy.get("calendar"),
+    )
+    computed = stored["sla_computed"]
+    for field in ("sla_state", "breach_reason", "sla_target_hours", "breach_threshold_hours"):
+        assert computed[field] == expected[field], field
+    assert computed["elapsed_hours"] == pytest.approx(expected["elapsed_hours"], abs=0.011)
+    assert stored["sla_state"] == expected["sla_state"]
+
+    expected_next = next_sla_check_at(
+        policy, ts["created_at"], stored["status"], ts.get("resolved_at"), stored["sla_escalation_level"], NOW,
+    )
+    next_check = stored.get("sla_next_check_at")
+    if expected_next is None:
+        assert next_check is None
+        return
+    assert next_check is not None
+    if exact_next_check:
+        assert abs(next_check - expected_next) <= timedelta(seconds=1)
+    else:
+        # business calendar: the pipeline stores an early bound the sweeper refines
+        assert NOW <= next_check <= expected_next + timedelta(seconds=1)
+
+
+@pytest.mark.parametrize("priority", sorted(DEFAULT_SLA_HOURS))
+@pytest.mark.parametrize("ratio", RATIOS)
+@pytest.mark.parametrize("level", (0, 1, 2))
+def test_builtin_policy_open(col, priority, ratio, level):
+    target = DEFAULT_SLA_HOURS[priority]
+    doc = _request("roads", priority, NOW - timedelta(hours=target * ratio), level=level)
+    stored = _apply(col, doc)
+
+    policy = select_sla_policy(category="roads", priority=priority, zone_id=None)
+    for field in ("policy_id", "target_hours", "breach_threshold_hours", "escalation_steps"):
+        assert stored["sla_policy"][field] == policy[field], field
+    _assert_parity(stored, policy)
+
+
+@pytest.mark.parametrize("ratio", (0.5, 1.0, 1.01, 2.0))
+@pytest.mark.parametrize("status", ("resolved", "closed"))
+def test_builtin_policy_resolved(col, ratio, status):
+    created = NOW - timedelta(hours=200)
+    doc = _request("roads", "P2", created, status=status, resolved_at=created + timedelta(hours=72 * ratio))
+    stored = _apply(col, doc)
+    _assert_parity(stored, select_sla_policy(category="roads", priority="P2"))
+
+
+@pytest.mark.parametrize("category,priority,zone_id", [
+    ("roads", "P1", None),
+    ("roads", "P3", None),
+    ("lights", "P2", None),
+    ("roads", "P1", "Z1"),
+    ("parks", "P3", None),
+])
+@pytest.mark.parametrize("ratio", RATIOS)
+def test_compiled_policies(col, category, priority, zone_id, ratio):
+    policies = CompiledSlaPolicies(7, POLICY_DOCS)
+    policy = policies.resolve(category=category, priority=priority, zone_id=zone_id)
+    created = NOW - timedelta(hours=policy["target_hours"] * ratio)
+    # a stale policy: reresolve replaces it with the table's match
+    doc = _request(category, priority, created, zone_id=zone_id, sla_policy={"policy_id": "OLD", "target_hours": 1})
+    stored = _apply(col, doc, policies=policies, reresolve=True)
+
+    assert stored["sla_policy"] == policy
+    _assert_parity(stored, policy, exact_next_check=policy.get("calendar") is None)
+
+
+@pytest.mark.parametrize("hours_ago", (1, 9, 30, 50, 80, 200))
+@pytest.mark.parametrize("resolved_after", (None, 5, 40))
+def test_business_calendar(col, hours_ago, resolved_after):
+    policy = CompiledSlaPolicies(1, POLICY_DOCS).resolve(category="lights", priority="P2")
+    created = NOW - timedelta(hours=hours_ago)
+    resolved = created + timedelta(hours=resolved_after) if resolved_after is not None else None
+    if resolved is not None and resolved > NOW:
+        resolved = NOW
+    doc = _request(
+        "lights", "P2", created, status="resolved" if resolved else "assigned", resolved_at=resolved, sla_policy=policy,
+    )
+    stored = _apply(col, doc)
+    _assert_parity(stored, policy, exact_next_check=False)
@@ -0,0 +1,62 @@
+"""CompiledSlaPolicies: most specific match wins, zone > category > priority."""
+import pytest
+
+from app.services.sla_policy_cache import _LOOKUP_ORDER, CompiledSlaPolicies
+
+POLICY_DOCS = [
+    {"policy_id": "ANY", "target_hours": 100},
+    {"policy_id": "P1", "priority": "P1", "target_hours": 10},
+    {"policy_id": "ROADS", "category": "roads", "target_hours": 20},
+    {"policy_id": "ROADS-P1", "category": "roads", "priority": "P1", "target_hours": 5},
+    {"policy_id": "Z1", "zone_id": "Z1", "target_hours": 30},
+    {"policy_id": "Z1-P1", "zone_id": "Z1", "priority": "P1", "target_hours": 3},
+    {"policy_id": "Z1-ROADS", "zone_id": "Z1", "category": "roads", "target_hours": 4},
+]
+
+
+def test_lookup_order_is_by_specificity():
+    assert _LOOKUP_ORDER == [
+        ("zone_id", "category", "priority"),
+        ("zone_id", "category"),
+        ("zone_id", "priority"),
+        ("zone_id",),
+        ("category", "priority"),
+        ("category",),
+        ("priority",),
+        (),
+    ]
+
+
+@pytest.mark.parametrize("category,priority,zone_id,expected", [
+    ("roads", "P1", "Z1", "Z1-ROADS"),  # zone+category beats zone+priority
+    ("parks", "P1", "Z1", "Z1-P1"),
+    ("parks", "P2", "Z1", "Z1"),  # a zone-only rule beats category+priority
+    ("roads", "P1", "Z2", "ROADS-P1"),
+    ("roads", "P2", None, "ROADS"),  # category beats priority
+    ("parks", "P1", None, "P1"),
+    ("parks", "P3", None, "ANY"),
+])
+def test_resolve_most_specific(category, priority, zone_id, expected):
+    policy = CompiledSlaPolicies(4, POLICY_DOCS).resolve(category=category, priority=priority, zone_id=zone_id)
+    assert policy["policy_id"] == expected
+    assert policy["version"] == 4
+    assert (policy["category"], policy["priority"], policy["zone_id"]) == (category, priority, zone_id)
+
+
+def test_resolve_falls_back_to_builtin_defaults():
+    policy = CompiledSlaPolicies(2, POLICY_DOCS[1:]).resolve(category="parks", priority="P3")
+    assert policy["policy_id"] == "SLA-PARKS-P3"
+    assert policy["target_hours"] == 120
+    assert policy["version"] == 2
+
+
+def test_policy_defaults_and_copies():
+    policies = CompiledSlaPolicies(1, [{"policy_id": "X", "target_hours": 10}])
+    first = policies.resolve(category="roads", priority="P2")
+    assert first["breach_threshold_hours"] == 13  # ceil(10 * 1.25)
+    assert first["escalation_steps"] == [
+        {"after_hours": 10, "action": "notify_dispatcher"},
+        {"after_hours": 13, "action": "notify_manager"},
+    ]
+    first["escalation_steps"][0]["after_hours"] = 0
+    assert policies.resolve(category="roads", priority="P2")["escalation_steps"][0]["after_hours"] == 10
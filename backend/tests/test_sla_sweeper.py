@@ -0,0 +1,117 @@
+"""
+SlaSweeper._plan (one compute_sla_states_batch pass per batch) against the
+per-document functions it replaces: build_sla_fields_from_request and
+next_sla_check_at.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import pytest
+from bson import ObjectId
+
+from app.services.sla_calendar import compile_calendar
+from app.services.sla_policy_cache import CompiledSlaPolicies
+from app.services.sla_service import build_sla_fields_from_request, escalation_steps, next_sla_check_at, policy_elapsed_hours
+from app.services.sla_sweeper import SlaSweeper
+
+NOW = datetime(2026, 3, 4, 12, 0)  # a Wednesday
+
+POLICY_DOCS = [
+    {"policy_id": "ROADS-P1", "category": "roads", "priority": "P1", "target_hours": 24},
+    {
+        "policy_id": "LIGHTS-BUSINESS", "category": "lights", "target_hours": 18, "breach_threshold_hours": 27,
+        "escalation_steps": [{"after_hours": 9, "action": "notify_dispatcher"}, {"after_hours": 27, "action": "notify_manager"}],
+        "calendar": compile_calendar({
+            "timezone": "Asia/Jerusalem",
+            "hours": [{"day": d, "start": "08:00", "end": "17:00"} for d in ("Sun", "Mon", "Tue", "Wed", "Thu")],
+        }),
+    },
+    {"policy_id": "Z1", "zone_id": "Z1", "target_hours": 10},
+]
+
+
+def _doc(
+    category: str,
+    priority: str,
+    hours_ago: float,
+    status: str = "assigned",
+    resolved_after: Optional[float] = None,
+    zone_id: Optional[str] = None,
+    level: int = 0,
+    sla_policy: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    created = NOW - timedelta(hours=hours_ago)
+    doc: Dict[str, Any] = {
+        "_id": ObjectId(),
+        "category": category,
+        "priority": priority,
+        "status": status,
+        "location": {"zone_id": zone_id},
+        "timestamps": {
+            "created_at": created,
+            "resolved_at": created + timedelta(hours=resolved_after) if resolved_after is not None else None,
+        },
+        "sla_escalation_level": level,
+    }
+    if sla_policy is not None:
+        doc["sla_policy"] = sla_policy
+    return doc
+
+
+def _expected(doc: Dict[str, Any], policies: CompiledSlaPolicies):
+    sla = build_sla_fields_from_request(doc, now=NOW, policies=policies)
+    policy, computed = sla["sla_policy"], sla["computed_kpis"]
+    created, resolved_at = computed["milestones"]["created_at"], computed["milestones"]["resolved_at"]
+    level = doc["sla_escalation_level"]
+    new_steps: List[Dict[str, Any]] = []
+    if doc["status"] not in ("resolved", "closed") and resolved_at is None:
+        elapsed = policy_elapsed_hours(policy, created, NOW)
+        new_steps = [s for s in escalation_steps(policy)[level:] if float(s["after_hours"]) <= elapsed]
+    next_check = next_sla_check_at(policy, created, doc["status"], resolved_at, level + len(new_steps), NOW)
+    return policy, computed, level + len(new_steps), new_steps, next_check
+
+
+def _batch() -> List[Dict[str, Any]]:
+    policies = CompiledSlaPolicies(3, [])
+    docs = []
+    for hours_ago in (1, 9, 19.2, 24, 30, 50, 200):
+        for level in (0, 1, 2):
+            docs.append(_doc("roads", "P1", hours_ago, level=level))
+            docs.append(_doc("roads", "P3", hours_ago * 3, level=level))
+            docs.append(_doc("lights", "P2", hours_ago, level=level))
+            docs.append(_doc("roads", "P2", hours_ago, zone_id="Z1", level=level))
+        docs.append(_doc("roads", "P1", hours_ago, status="resolved", resolved_after=hours_ago / 2))
+        docs.append(_doc("lights", "P2", hours_ago, status="closed"))
+        # a policy from the current version is kept, one from an older version is replaced
+        docs.append(_doc("parks", "P2", hours_ago, sla_policy={**policies.resolve("parks", "P1"), "version": 7}))
+        docs.append(_doc("parks", "P2", hours_ago, sla_policy={"policy_id": "OLD", "target_hours": 1, "version": 6}))
+    return docs
+
+
+@pytest.mark.parametrize("doc", _batch(), ids=lambda d: f"{d['category']}-{d['priority']}-{d['status']}")
+def test_plan_matches_per_document_functions(doc):
+    policies = CompiledSlaPolicies(7, POLICY_DOCS)
+    # planned inside a mixed batch, so the per-policy grouping is exercised
+    batch = [_doc("roads", "P1", 5), doc, _doc("lights", "P2", 40, level=1)]
+    fields, new_steps = SlaSweeper._plan(batch, NOW, policies)[1]
+    policy, computed, level, steps, next_check = _expected(doc, policies)
+
+    assert fields["sla_policy"] == policy
+    computed = dict(computed)
+    planned = dict(fields["sla_computed"])
+    assert planned.pop("elapsed_hours") == pytest.approx(computed.pop("elapsed_hours"), abs=0.01)
+    assert planned == computed
+    assert fields["sla_state"] == computed["sla_state"]
+    assert fields["sla_escalation_level"] == level
+    assert new_steps == steps
+    if next_check is None:
+        assert fields["sla_next_check_at"] is None
+    else:
+        assert abs(fields["sla_next_check_at"] - next_check) <= timedelta(milliseconds=1)
+
+
+def test_plan_resolves_each_policy_key_once():
+    policies = CompiledSlaPolicies(7, POLICY_DOCS)
+    plans = SlaSweeper._plan([_doc("roads", "P1", h) for h in (1, 2, 3)], NOW, policies)
+    assert plans[0][0]["sla_policy"] is plans[1][0]["sla_policy"] is plans[2][0]["sla_policy"]
+    assert SlaSweeper._plan([], NOW, policies) == []
@@ -0,0 +1,54 @@
+"""TokenCache: decoded JWT claims cached until the token's exp."""
+from datetime import timedelta
+
+import pytest
+
+from app.core import security
+from app.core.security import TokenCache, create_access_token
+
+
+class _Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = _Clock(security.time.time())
+    monkeypatch.setattr(security.time, "time", c)
+    return c
+
+
+def test_hit_until_exp(clock):
+    cache = TokenCache(max_size=8)
+    token = create_access_token({"sub": "u1", "role": "staff"}, timedelta(minutes=5))
+    claims = cache.decode(token)
+    assert claims["sub"] == "u1"
+    claims["role"] = "tampered"  # callers get copies
+    assert cache.decode(token)["role"] == "staff"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    clock.now += 6 * 60  # past exp: the entry is dropped and the token decoded again
+    cache.decode(token)
+    assert cache.misses == 2
+
+
+def test_invalid_and_expired_tokens_are_not_cached(clock):
+    cache = TokenCache(max_size=8)
+    assert cache.decode("not.a.jwt") is None
+    expired = create_access_token({"sub": "u1"}, timedelta(minutes=-1))
+    assert cache.decode(expired) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_lru_bound(clock):
+    cache = TokenCache(max_size=2)
+    tokens = [create_access_token({"sub": f"u{i}"}, timedelta(minutes=5)) for i in range(3)]
+    for t in tokens:
+        cache.decode(t)
+    assert cache.stats()["size"] == 2
+    cache.decode(tokens[0])  # evicted first
+    assert cache.misses == 4
@@ -11,10 +11,11 @@ export const createRequest = (data, idempotencyKey) =>
     },
   });
 
-export const getMyRequests = () =>
+export const getMyRequests = (params) =>
   apiRequest({
     url: "/requests/me",
     method: "GET",
+    params,
   });
 
 export const getRequestById = (id) =>
@@ -107,7 +108,8 @@ export const escalateRequest = (id) =>
 export const citizenCreateRequest = (data, idempotencyKey) =>
   createRequest(data, idempotencyKey);
 
-export const citizenMyRequests = () => getMyRequests();
+// list rows only need the "summary" projection; `after` is the previous page's next_cursor
+export const citizenMyRequests = (after) => getMyRequests({ view: "summary", ...(after ? { after } : {}) });
 
 export const citizenGetRequestById = (id) => getRequestById(id);
 
@@ -118,7 +120,7 @@ export const citizenAddComment = (id, payload) => addComment(id, payload);
 export const citizenAddRating = (id, payload) => addRating(id, payload);
 
 // Staff
-export const staffListRequests = (params) => listRequests(params);
+export const staffListRequests = (params) => listRequests({ view: "summary", ...params });
 
 export const staffGetRequestById = (id) => getRequestById(id);
 
@@ -16,6 +16,7 @@ function fmtDate(v) {
 
 export default function CitizenMyRequests() {
   const [data, setData] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   // UI filters
   const [q, setQ] = useState("");
@@ -29,6 +30,15 @@ export default function CitizenMyRequests() {
       .catch(() => setData({ items: [], _error: "Failed to load your requests." }));
   }, []);
 
+  const loadMore = () => {
+    if (!data?.next_cursor) return;
+    setLoadingMore(true);
+    citizenMyRequests(data.next_cursor)
+      .then((res) => setData((prev) => ({ ...res, items: [...(prev?.items || []), ...(res.items || [])] })))
+      .catch(() => {})
+      .finally(() => setLoadingMore(false));
+  };
+
   const items = useMemo(() => {
     const list = Array.isArray(data?.items) ? [...data.items] : [];
 
@@ -239,6 +249,14 @@ export default function CitizenMyRequests() {
               ))}
             </tbody>
           </table>
+
+          {data?.next_cursor && (
+            <div style={{ padding: 12, textAlign: "center" }}>
+              <button className="btn-ghost" onClick={loadMore} disabled={loadingMore}>
+                {loadingMore ? "Loading..." : "Load more"}
+              </button>
+            </div>
+          )}
         </div>
       )}
     </Card>
@@ -1,21 +1,71 @@
 import { useEffect, useState } from "react";
-import { MapContainer, TileLayer, Marker, Popup } from "react-leaflet";
+import { MapContainer, TileLayer, Marker, Popup, CircleMarker, Tooltip, useMap, useMapEvents } from "react-leaflet";
 
 const API_NEARBY = "http://localhost:8000/requests/nearby";
 
-export default function MapPage() {
-  const [items, setItems] = useState([]);
+// clustered mode: every request in the visible bbox, dense cells as counts
+function ClusteredRequests() {
+  const map = useMap();
+  const [data, setData] = useState({ clusters: [], items: [] });
+
+  const load = () => {
+    const b = map.getBounds();
+    const bbox = [
+      Math.max(b.getWest(), -180),
+      Math.max(b.getSouth(), -90),
+      Math.min(b.getEast(), 180),
+      Math.min(b.getNorth(), 90),
+    ].map((v) => v.toFixed(6)).join(",");
+    fetch(`${API_NEARBY}?bbox=${bbox}&zoom=${map.getZoom()}`)
+      .then((res) => res.json())
+      .then((d) => setData({ clusters: d.clusters || [], items: d.items || [] }))
+      .catch(() => setData({ clusters: [], items: [] }));
+  };
+
+  useMapEvents({ moveend: load });
+  useEffect(load, []);
+
+  return (
+    <>
+      {data.clusters.map((c) => (
+        <CircleMarker
+          key={c.bbox.join(",")}
+          center={[c.lat, c.lng]}
+          radius={Math.min(12 + Math.log2(c.count) * 3, 32)}
+          eventHandlers={{
+            // zoom to the cell: the cluster splits at the next level
+            click: () => map.fitBounds([[c.bbox[1], c.bbox[0]], [c.bbox[3], c.bbox[2]]]),
+          }}
+        >
+          <Tooltip direction="center" permanent>{c.count}</Tooltip>
+        </CircleMarker>
+      ))}
+
+      {data.items.map((r) => {
+        const coords = r.location?.coordinates;
+        if (!coords || coords.length !== 2) return null;
 
+        const [lng, lat] = coords;
+        return (
+          <Marker key={r._id} position={[lat, lng]}>
+            <Popup>
+              <div>
+                <b>{r.category}</b>
+                <div>Status: {r.status}</div>
+                <div style={{ marginTop: 6 }}>{r.description}</div>
+              </div>
+            </Popup>
+          </Marker>
+        );
+      })}
+    </>
+  );
+}
+
+export default function MapPage() {
   // مركز افتراضي (نفس اللي استخدمته في test: 35.2, 31.9)
   const center = { lng: 35.2, lat: 31.9 };
 
-  useEffect(() => {
-    fetch(`${API_NEARBY}?lng=${center.lng}&lat=${center.lat}&radius_m=5000`)
-      .then((res) => res.json())
-      .then((data) => setItems(data.items || []))
-      .catch(() => setItems([]));
-  }, []);
-
   return (
     <div style={{ padding: 20 }}>
       <h1>Requests Map</h1>
@@ -26,24 +76,7 @@ export default function MapPage() {
             attribution='&copy; OpenStreetMap contributors'
             url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png"
           />
-
-          {items.map((r) => {
-            const coords = r.location?.coordinates;
-            if (!coords || coords.length !== 2) return null;
-
-            const [lng, lat] = coords;
-            return (
-              <Marker key={r._id} position={[lat, lng]}>
-                <Popup>
-                  <div>
-                    <b>{r.category}</b>
-                    <div>Status: {r.status}</div>
-                    <div style={{ marginTop: 6 }}>{r.description}</div>
-                  </div>
-                </Popup>
-              </Marker>
-            );
-          })}
+          <ClusteredRequests />
         </MapContainer>
       </div>
     </div>